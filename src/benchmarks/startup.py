@@ -0,0 +1,62 @@
+"""Startup benchmark.
+
+Measures, in fresh interpreters, the time needed to import the parser and the
+time needed to parse a set of regexes for the first time.
+
+Usage::
+
+    python src/benchmarks/startup.py [--runs N]
+"""
+
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+REGEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "regex")
+
+REGEXES = [
+    r"connection refused",
+    r"^[a-z0-9]+$",
+    r"(GET|POST|PUT|DELETE|PATCH) /api/[a-z]+",
+    r"[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}",
+    r"(?<user>[a-zA-Z0-9._]+)@(?<domain>[a-z]+\.[a-z]{2,6})",
+    r"[^\s]+\s+(a+)+b",
+]
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import treeparser
+imported = time.perf_counter()
+parser = treeparser.Parser()
+for re in json.loads(sys.argv[1]):
+    parser.parse(re)
+parsed = time.perf_counter()
+print(json.dumps({"import": imported - start, "cold_parse": parsed - imported}))
+"""
+
+
+def run_once() -> dict:
+    env = dict(os.environ, PYTHONPATH=REGEX_PATH, PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run([sys.executable, "-c", CHILD, json.dumps(REGEXES)],
+                         env=env, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--runs", type=int, default=10)
+    args = argparser.parse_args()
+
+    results = [run_once() for _ in range(args.runs)]
+    report = {key: statistics.median(r[key] for r in results) for key in ("import", "cold_parse")}
+    print(json.dumps({"runs": args.runs, "median_seconds": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
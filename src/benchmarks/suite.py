@@ -0,0 +1,196 @@
+"""Benchmark suite.
+
+Times the lexer, the parser and both engines on a corpus of regexes covering
+literal search, character classes, alternations, nested quantifiers and
+pathological backtracking cases, and writes the results as JSON. Given the
+JSON of a previous run as baseline, the timings that got slower by more than
+the threshold are reported as regressions, and the exit status is 1. The peak
+memory allocated by a first match with each engine is reported, and compared
+with the baseline, too.
+
+With --passes, each case also reports the effect of the optimizer: the size
+of the AST and the times of both engines with no pass, and then with each
+pass of the optimizer added in turn.
+
+Usage::
+
+    python src/benchmarks/suite.py [--output FILE] [--baseline FILE]
+                                   [--threshold RATIO] [--repeat N] [--only TEXT]
+                                   [--passes]
+"""
+
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+import tracemalloc
+from collections import namedtuple
+from typing import Callable, Dict, List
+
+
+REGEX_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "regex")
+sys.path.insert(0, REGEX_PATH)
+
+from lexer import Lexer  # noqa: E402
+from treeparser import Parser  # noqa: E402
+from engine import RegexEngine, compile, BACKTRACKING, AUTOMATON  # noqa: E402
+from pattern import compile_pattern  # noqa: E402
+from optimizer import PASSES, size  # noqa: E402
+
+
+Case = namedtuple("Case", ["name", "category", "re", "string"])
+
+LOG = "\n".join(
+    "2023-04-{:02d} 12:{:02d}:07 host{} sshd[{}]: {} from 10.0.{}.{} port {}".format(
+        i % 28 + 1, i % 60, i % 7, 4000 + i,
+        ("Accepted password for admin", "Failed password for root", "Connection closed by user")[i % 3],
+        i % 256, (i * 7) % 256, 20000 + i)
+    for i in range(40)
+) + "\n2023-04-29 12:00:00 host1 kernel: connection refused"
+
+CASES = [
+    Case("literal", "literal", r"connection refused", LOG),
+    Case("literal_miss", "literal", r"segmentation fault", LOG),
+    Case("digits", "classes", r"[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+ port", LOG),
+    Case("word_class", "classes", r"[a-zA-Z_][a-zA-Z0-9_]*\[[0-9]+\]: Connection", LOG),
+    Case("negated_class", "classes", r"kernel: [^\n]+", LOG),
+    Case("http_verbs", "alternation", r"(GET|POST|PUT|DELETE|PATCH|HEAD|OPTIONS) /", "x" * 200 + " OPTIONS /index"),
+    Case("log_levels", "alternation", r"(Accepted|Failed|Rejected|Closed|refused) (password|key)", LOG),
+    Case("shared_prefixes", "alternation", r"(host[0-9]: Accepted|host[0-9]: Failed|host[0-9] kernel)", LOG),
+    Case("email", "nested quantifiers", r"([a-z0-9]+\.)*[a-z0-9]+@([a-z0-9]+\.)+[a-z]{2,6}", "contact: " + "a.b" * 30 + "@mail.example.com"),
+    Case("repeated_groups", "nested quantifiers", r"((ab)+c)+d", "abababcabcababc" * 8 + "d"),
+    Case("nested_plus", "pathological", r"(a+)+b", "a" * 24 + "!b"),
+    Case("overlapping_alternation", "pathological", r"(a|aa)*c", "a" * 24 + "bc"),
+    Case("star_of_stars", "pathological", r"(x+x+)+y", "x" * 24 + "!y"),
+    Case("long_class_run", "memory", r"[a-z]*[0-9]", "ab" * 20000),
+]
+
+METRICS = ("lex", "tokenize", "parse", "match_" + BACKTRACKING, "match_" + AUTOMATON)
+MEMORY_METRICS = ("peak_" + BACKTRACKING, "peak_" + AUTOMATON)
+
+
+def best_time(fnc: Callable[[], object], repeat: int) -> float:
+    """ Returns the best time, in seconds, of a single call of fnc."""
+    timer = timeit.Timer(fnc)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def peak_memory(fnc: Callable[[], object]) -> int:
+    """ Returns the peak memory, in bytes, allocated by a call of fnc."""
+    tracemalloc.start()
+    try:
+        fnc()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(case: Case, repeat: int) -> Dict[str, float]:
+    lexer, parser, reng = Lexer(), Parser(), RegexEngine()
+    # the memory kept by a pattern between matches is counted once, on a
+    # pattern of its own
+    peaks = {}
+    for engine in (BACKTRACKING, AUTOMATON):
+        fresh = compile_pattern(parser, case.re)
+        fresh.get_automaton()
+        peaks["peak_" + engine] = peak_memory(lambda: reng.match(fresh, case.string, engine=engine))
+    pattern = compile(case.re)
+    pattern.get_automaton()
+    return {
+        **peaks,
+        # lex keeps timing scan, so it stays comparable with older baselines
+        "lex": best_time(lambda: lexer.scan(case.re), repeat),
+        "tokenize": best_time(lambda: lexer.tokenize(case.re), repeat),
+        "parse": best_time(lambda: parser.parse(case.re), repeat),
+        "match_" + BACKTRACKING: best_time(lambda: reng.match(pattern, case.string, engine=BACKTRACKING), repeat),
+        "match_" + AUTOMATON: best_time(lambda: reng.match(pattern, case.string, engine=AUTOMATON), repeat),
+    }
+
+
+def run_passes(case: Case, repeat: int) -> List[dict]:
+    """ Returns the size of the AST and the match times of case with no
+    pass, and then with each pass of the optimizer added in turn."""
+    parser, reng = Parser(), RegexEngine()
+    steps = []
+    for i in range(len(PASSES) + 1):
+        pattern = compile_pattern(parser, case.re, passes=PASSES[:i])
+        pattern.get_automaton()
+        steps.append({
+            "pass": PASSES[i - 1].__name__ if i else None,
+            "nodes": size(pattern.ast),
+            "match_" + BACKTRACKING: best_time(lambda: reng.match(pattern, case.string, engine=BACKTRACKING), repeat),
+            "match_" + AUTOMATON: best_time(lambda: reng.match(pattern, case.string, engine=AUTOMATON), repeat),
+        })
+    return steps
+
+
+def run(cases: List[Case], repeat: int, passes: bool = False) -> dict:
+    results = {}
+    for case in cases:
+        results[case.name] = dict(category=case.category, re=case.re, **run_case(case, repeat))
+        if passes:
+            results[case.name]["passes"] = run_passes(case, repeat)
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "cases": results,
+    }
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> List[str]:
+    """ Returns a line for each timing of report slower, or each peak
+    memory larger, than the same one of baseline by more than threshold (0.2
+    is 20% slower)."""
+    regressions = []
+    for name, timings in report["cases"].items():
+        old = baseline.get("cases", {}).get(name)
+        if old is None:
+            continue
+        for metric in METRICS:
+            if metric in old and old[metric] > 0:
+                ratio = timings[metric] / old[metric]
+                if ratio > 1 + threshold:
+                    regressions.append("{} {}: {:.2f}x slower ({:.3g}s -> {:.3g}s)".format(
+                        name, metric, ratio, old[metric], timings[metric]))
+        for metric in MEMORY_METRICS:
+            if metric in old and old[metric] > 0:
+                ratio = timings[metric] / old[metric]
+                if ratio > 1 + threshold:
+                    regressions.append("{} {}: {:.2f}x larger ({} -> {} bytes)".format(
+                        name, metric, ratio, old[metric], timings[metric]))
+    return regressions
+
+
+def main() -> None:
+    argparser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    argparser.add_argument("--output", help="file where the JSON report is written, stdout if omitted")
+    argparser.add_argument("--baseline", help="JSON report of a previous run to compare with")
+    argparser.add_argument("--threshold", type=float, default=0.2, help="slowdown ratio flagged as regression")
+    argparser.add_argument("--repeat", type=int, default=5)
+    argparser.add_argument("--only", help="run only the cases whose name or category contains this text")
+    argparser.add_argument("--passes", action="store_true", help="report the effect of each optimizer pass")
+    args = argparser.parse_args()
+
+    cases = [case for case in CASES if not args.only or args.only in case.name or args.only in case.category]
+    report = run(cases, args.repeat, args.passes)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+"""Module containing the static analyzer of regexes.
+
+The analyzer walks the AST of a regex looking for the constructs that make a
+backtracking matcher take exponential time:
+
+- nested unbounded quantifiers, like (a+)+ or (a*b*)*, where the same string
+  can be split among the repetitions in exponentially many ways;
+- alternations repeated by an unbounded quantifier whose branches may start
+  with the same character, like (a|ab)*, where each repetition can take
+  either branch.
+
+It is meant to be run when a regex is received, so that the dangerous ones
+can be rejected before they are ever matched.
+
+Example:
+    Rejecting a dangerous regex::
+
+        report = check(r"([a-z]+)*@", refuse=True)  # raises PatternRejected
+"""
+
+
+import math
+from collections import namedtuple
+from typing import Dict, List, Set, Union
+from astree import RE, ASTNode, GroupNode, OrNode, Element, LiteralElement, WildcardElement, SpaceElement, RangeElement, StartElement, EndElement
+from prefilter import _Info, analyze_tree
+from pattern import Pattern
+from treeparser import Parser
+
+
+NESTED_QUANTIFIERS = "nested quantifiers"
+OVERLAPPING_ALTERNATION = "overlapping alternation"
+
+# characters escaped by render
+SPECIAL_CHARS = set("\\^$.|?*+()[]{}-")
+
+Risk = namedtuple("Risk", ["kind", "fragment", "message"])
+
+
+class RiskReport:
+    """ Risks found in a regex.
+
+    Attributes:
+        re (str): the regular expression analyzed
+        risks (List[Risk]): the risks found, each one with its kind, the
+            fragment of the regex causing it, and a description
+    """
+
+    def __init__(self, re: str, risks: List[Risk]) -> None:
+        self.re: str = re
+        self.risks: List[Risk] = risks
+
+    def is_safe(self) -> bool:
+        return len(self.risks) == 0
+
+    def __str__(self) -> str:
+        if self.is_safe():
+            return "{!r}: no risk found".format(self.re)
+        return "\n".join(["{!r}:".format(self.re)] + ["  {}: {}".format(risk.kind, risk.message) for risk in self.risks])
+
+
+class PatternRejected(Exception):
+    """ Raised by check when a regex is refused.
+
+    Attributes:
+        report (RiskReport): the risks found in the regex
+    """
+
+    def __init__(self, report: RiskReport) -> None:
+        super().__init__(str(report))
+        self.report: RiskReport = report
+
+
+def check(re: Union[str, Pattern], refuse: bool = False) -> RiskReport:
+    """ Looks for exponential backtracking risks in a regex.
+
+    Args:
+        re (Union[str, Pattern]): the regular expression to analyze
+        refuse (bool): if True PatternRejected is raised when a risk is
+            found (default is False)
+
+    Returns:
+        RiskReport: the risks found
+
+    Raises:
+        PatternRejected: if refuse is True and the regex is risky
+    """
+    # the regex is analyzed as written, not as optimized by compile
+    ignore_case = 0
+    if isinstance(re, Pattern):
+        re, ignore_case = re.re, re.ignore_case
+    report = RiskReport(re, find_risks(Parser().parse(re, ignore_case)))
+    if refuse and not report.is_safe():
+        raise PatternRejected(report)
+    return report
+
+
+def find_risks(ast: RE) -> List[Risk]:
+    """ Returns the risks found in the AST of a regex."""
+    risks = []
+    infos = analyze_tree(ast.child)
+    _visit(ast.child, infos, _unbounded_below(ast.child, infos), risks)
+    return risks
+
+
+def _children(node: ASTNode) -> List[ASTNode]:
+    if isinstance(node, RE):
+        return [node.child]
+    if isinstance(node, (GroupNode, OrNode)):
+        return list(node.children)
+    return []
+
+
+def _is_unbounded(node: ASTNode, infos: Dict[int, _Info]) -> bool:
+    """ Returns whether node has an unbounded quantifier and may repeat a
+    non-empty string."""
+    return node.max == math.inf and infos[id(node)].max_len > 0
+
+
+def _unbounded_below(root: ASTNode, infos: Dict[int, _Info]) -> Set[int]:
+    """ Returns the ids of the nodes that are unbounded, or have an
+    unbounded node below them, among root and the nodes below it."""
+    found = set()
+    # the nodes to check, and whether their children are checked already
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        children = _children(node)
+        if children and not expanded:
+            stack.append((node, True))
+            stack.extend((child, False) for child in children)
+        elif _is_unbounded(node, infos) or any(id(child) in found for child in children):
+            found.add(id(node))
+    return found
+
+
+def _overlapping(branches: List[ASTNode], infos: Dict[int, _Info]) -> bool:
+    """ Returns whether two of the branches may start with the same
+    character, stopping at the first branch that may start like one before
+    it."""
+    if len(branches) < 2:
+        return False
+    seen = set()
+    for branch in branches:
+        first = infos[id(branch)].first
+        if first is None or not seen.isdisjoint(first):
+            return True
+        seen.update(first)
+    return False
+
+
+def _visit(root: ASTNode, infos: Dict[int, _Info], unbounded_below: Set[int], risks: List[Risk]) -> None:
+    """ Looks for the risks in root and in the nodes below it.
+
+    Args:
+        root (ASTNode): the node to analyze
+        infos (Dict[int, _Info]): what is known about each node, see
+            prefilter.analyze_tree
+        unbounded_below (Set[int]): the nodes returned by _unbounded_below
+        risks (List[Risk]): the list the risks found are appended to
+    """
+    # the nodes to analyze, each one with whether an ancestor of it has an
+    # unbounded quantifier
+    stack = [(root, False)]
+    while stack:
+        node, repeated = stack.pop()
+        unbounded = _is_unbounded(node, infos)
+
+        if unbounded and isinstance(node, (GroupNode, OrNode)):
+            inner = next((child for child in _children(node) if id(child) in unbounded_below), None)
+            if inner is not None:
+                fragment = render(node)
+                risks.append(Risk(NESTED_QUANTIFIERS, fragment,
+                                  "{} repeats {}, which is repeated too".format(fragment, render(inner))))
+                # the nested nodes would report the same risk again
+                continue
+
+        if isinstance(node, OrNode) and (repeated or unbounded) and _overlapping(node.children, infos):
+            fragment = render(node)
+            risks.append(Risk(OVERLAPPING_ALTERNATION, fragment,
+                              "the branches of {} may start with the same character and are repeated".format(fragment)))
+
+        stack.extend((child, repeated or unbounded) for child in reversed(_children(node)))
+
+
+def _quantifier(node: ASTNode) -> str:
+    min_, max_ = node.min, node.max
+    if (min_, max_) == (1, 1):
+        return ''
+    if max_ == math.inf:
+        return {0: '*', 1: '+'}.get(min_, '{{{},}}'.format(min_))
+    if (min_, max_) == (0, 1):
+        return '?'
+    if min_ == max_:
+        return '{{{}}}'.format(min_)
+    return '{{{},{}}}'.format(min_, max_)
+
+
+def _render_char(cp: int) -> str:
+    ch = chr(cp)
+    return '\\' + ch if ch in SPECIAL_CHARS else ch
+
+
+def _open_group(node: GroupNode) -> str:
+    if not node.is_capturing():
+        return '(?:'
+    if node.group_name != "Group " + str(node.group_id):
+        return '(?<{}>'.format(node.group_name)
+    return '('
+
+
+def render(node: ASTNode) -> str:
+    """ Returns a regex matching the same strings as node.
+
+    The nodes are rendered bottom-up with an explicit stack, so the depth of
+    the nesting doesn't matter.
+    """
+    # the regexes of the nodes rendered, and the bodies of the groups among
+    # them, without parentheses and quantifier, until their parent is rendered
+    rendered = {}
+    bodies = {}
+    # the nodes to render, and whether their children are rendered already
+    stack = [(node, False)]
+    while stack:
+        curr, expanded = stack.pop()
+        children = _children(curr)
+        if children and not expanded:
+            stack.append((curr, True))
+            stack.extend((child, False) for child in children)
+            continue
+        rendered[id(curr)] = _render_node(curr, rendered, bodies)
+        for child in children:
+            del rendered[id(child)]
+            bodies.pop(id(child), None)
+    return rendered[id(node)]
+
+
+def _is_bare(node: ASTNode) -> bool:
+    """ Returns whether node is an alternation rendered without
+    parentheses."""
+    if not isinstance(node, OrNode) or _quantifier(node):
+        return False
+    first = node.children[0]
+    return not isinstance(first, GroupNode) or first.group_id == 0
+
+
+def _render_node(node: ASTNode, rendered: Dict[int, str], bodies: Dict[int, str]) -> str:
+    """ Returns the regex of node, given the ones of its children in
+    rendered, and the bodies of the groups among them in bodies."""
+    if isinstance(node, RE):
+        return rendered[id(node.child)]
+    quantifier = _quantifier(node)
+    if isinstance(node, OrNode):
+        branches = node.children
+        body = '|'.join(bodies[id(branch)] if isinstance(branch, GroupNode) else rendered[id(branch)] for branch in branches)
+        group = branches[0] if isinstance(branches[0], GroupNode) else None
+        if group is not None and group.group_id != 0:
+            return _open_group(group) + body + ')' + quantifier
+        return '(?:' + body + ')' + quantifier if quantifier else body
+    if isinstance(node, GroupNode):
+        # an alternation among other nodes, like the ones factor_prefixes
+        # leaves after a common prefix, needs its own parentheses
+        wrap = len(node.children) > 1
+        body = bodies[id(node)] = ''.join('(?:' + rendered[id(child)] + ')' if wrap and _is_bare(child) else rendered[id(child)]
+                                          for child in node.children)
+        if node.group_id == 0 and not quantifier:
+            return body
+        return _open_group(node) + body + ')' + quantifier
+    if isinstance(node, WildcardElement):
+        return '.' + quantifier
+    if isinstance(node, SpaceElement):
+        return '\\s' + quantifier
+    if isinstance(node, StartElement):
+        return '^'
+    if isinstance(node, EndElement):
+        return '$'
+    if isinstance(node, RangeElement):
+        body = ''.join(_render_char(start) if start == end else _render_char(start) + '-' + _render_char(end) for start, end in node.intervals)
+        return '[' + ('' if node.is_positive_logic else '^') + body + ']' + quantifier
+    if isinstance(node, LiteralElement):
+        return ''.join(_render_char(ord(ch)) for ch in node.match) + quantifier
+    if isinstance(node, Element):
+        return _render_char(ord(node.match)) + quantifier
+    return ''
@@ -1,5 +1,48 @@
+import unicodedata
+from bisect import bisect_right
 from collections import deque
-from typing import Deque, List, Union
+from typing import Deque, Dict, FrozenSet, Iterator, List, Tuple, Union
+
+
+# code points looked up in a table by RangeElement, the other ones are
+# searched in its intervals
+LATIN1_SIZE = 256
+
+# the folded form, and the case variants, of the Latin-1 characters met so
+# far, for each ignore_case mode; the other ones are computed each time, so
+# that matching a text in many scripts doesn't grow the caches without bound
+_folded: Dict[int, Dict[str, str]] = {1: {}, 2: {}}
+_variants: Dict[int, Dict[str, FrozenSet[str]]] = {1: {}, 2: {}}
+
+
+def fold(ch: str, ignore_case: int) -> str:
+    """ Returns the folded form of a character.
+
+    Characters are compared through their folded form when the case is
+    ignored: the NFKD decomposition of the character, lowercased when
+    ignore_case is 1, casefolded when it is 2. The folded form may be
+    longer than one character, e.g. for ß or é.
+    """
+    folded = _folded[ignore_case].get(ch)
+    if folded is None:
+        folded = unicodedata.normalize("NFKD", ch)
+        folded = folded.lower() if ignore_case == 1 else folded.casefold()
+        if ord(ch) < LATIN1_SIZE:
+            _folded[ignore_case][ch] = folded
+    return folded
+
+
+def case_variants(ch: str, ignore_case: int) -> FrozenSet[str]:
+    """ Returns the characters having the same folded form as ch among ch,
+    its lowercase, its uppercase and its folded form."""
+    variants = _variants[ignore_case].get(ch)
+    if variants is None:
+        folded = fold(ch, ignore_case)
+        candidates = (ch, ch.lower(), ch.upper(), folded, folded.upper())
+        variants = frozenset(v for v in candidates if len(v) == 1 and fold(v, ignore_case) == folded)
+        if ord(ch) < LATIN1_SIZE:
+            _variants[ignore_case][ch] = variants
+    return variants
 
 
 class ASTNode:
@@ -9,7 +52,8 @@ class ASTNode:
     """
 
     def __init__(self) -> None:
-        pass
+        # (start, end) indexes of the node in the regex, set by the Parser
+        self.span: Union[Tuple[int, int], None] = None
 
 
 class RE(ASTNode):
@@ -23,6 +67,8 @@ class RE(ASTNode):
         self.__capturing__: bool = capturing
         self.group_name: str = group_name
         self.group_id: int = -1
+        # the number of group ids given by the parser
+        self.groups_count: int = 0
         self.child: Union[GroupNode, OrNode] = child
         self.children: List[Union[GroupNode, OrNode]] = deque([child])
 
@@ -75,6 +121,26 @@ class Element(LeafNode):
         return self.match == ch
 
 
+class FoldedElement(Element):
+    """ AST FoldedElement.
+
+    Specialization of the Element class matching, when the case is ignored,
+    every character with the same folded form as its own.
+    """
+
+    def __init__(self, match_ch: str = None, ignore_case: int = 2) -> None:
+        super().__init__(match_ch=match_ch)
+        self.ignore_case: int = ignore_case
+        self.folded: str = fold(match_ch, ignore_case)
+        self.__folds__: Dict[str, str] = _folded[ignore_case]
+
+    def is_match(self, ch: str = None, str_i: int = 0, str_len: int = 0) -> bool:
+        folded = self.__folds__.get(ch)
+        if folded is None:
+            folded = fold(ch, self.ignore_case)
+        return folded == self.folded
+
+
 class WildcardElement(Element):
     """ AST WildcardElement.
 
@@ -103,23 +169,131 @@ class SpaceElement(Element):
         return ch.isspace() and len(ch) == 1
 
 
+class LiteralElement(LeafNode):
+    """ AST LiteralElement.
+
+    Specialization of the LeafNode class matching a run of characters, as
+    the Elements of each of them, one after the other, would. It is built
+    by the optimizer, never by the Parser, and it is always matched once.
+    """
+
+    def __init__(self, match_str: str = '') -> None:
+        super().__init__()
+        self.match: str = match_str
+        self.min: Union[int, float] = 1
+        self.max: Union[int, float] = 1
+
+    def is_match(self, ch: str = None, str_i: int = 0, str_len: int = 0) -> bool:
+        return self.match == ch
+
+
 class RangeElement(LeafNode):
     """ AST RangeElement.
 
     Specialization of the LeafNode class modeling the range-element behavior,
     that is that it matches with more than one character.
+
+    The characters are stored as a sorted list of disjoint intervals of code
+    points, together with a lookup table for the Latin-1 ones, so that
+    neither building the node nor matching a character depends on the width
+    of the ranges.
+
+    When ignore_case is set a character is in the ranges if it, or one of
+    its case variants, is.
     """
 
-    def __init__(self, match_str: str, is_positive_logic: bool = True) -> None:
+    def __init__(self, match_str: str = '', is_positive_logic: bool = True, intervals: List[Tuple[int, int]] = None, ignore_case: int = 0) -> None:
         super().__init__()
-        self.match: str = match_str
+        intervals = list(intervals) if intervals is not None else []
+        intervals.extend((ord(ch), ord(ch)) for ch in match_str)
+        self.intervals: List[Tuple[int, int]] = RangeElement.merge_intervals(intervals)
         self.min: Union[int, float] = 1
         self.max: Union[int, float] = 1
         self.is_positive_logic: bool = is_positive_logic
+        self.ignore_case: int = ignore_case
+        self.__starts__: List[int] = [start for start, _ in self.intervals]
+        # the logic is applied in advance, the table holds is_match results
+        if ignore_case:
+            self.__latin1__: Dict[str, bool] = {ch: self.contains(ch) == is_positive_logic for ch in map(chr, range(LATIN1_SIZE))}
+        else:
+            self.__latin1__: Dict[str, bool] = RangeElement.latin1_table(self.intervals, is_positive_logic)
+
+    @staticmethod
+    def from_table(intervals: List[Tuple[int, int]], is_positive_logic: bool, ignore_case: int, latin1: Dict[str, bool]) -> 'RangeElement':
+        """ Returns a RangeElement built from intervals already merged and
+        from its table of the Latin-1 characters, without computing them
+        again."""
+        element = RangeElement.__new__(RangeElement)
+        LeafNode.__init__(element)
+        element.intervals = intervals
+        element.min, element.max = 1, 1
+        element.is_positive_logic = is_positive_logic
+        element.ignore_case = ignore_case
+        element.__starts__ = [start for start, _ in intervals]
+        element.__latin1__ = latin1
+        return element
+
+    @staticmethod
+    def merge_intervals(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """ Returns the sorted union of the inclusive intervals, where the
+        overlapping and adjacent intervals are merged."""
+        merged = []
+        for start, end in sorted(intervals):
+            if merged and start <= merged[-1][1] + 1:
+                if end > merged[-1][1]:
+                    merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    @staticmethod
+    def latin1_table(intervals: List[Tuple[int, int]], is_positive_logic: bool = True) -> Dict[str, bool]:
+        """ Returns a table mapping each Latin-1 character to whether a
+        RangeElement with these intervals and logic matches it."""
+        table = dict.fromkeys(map(chr, range(LATIN1_SIZE)), not is_positive_logic)
+        for start, end in intervals:
+            if start >= LATIN1_SIZE:
+                break
+            for cp in range(start, min(end, LATIN1_SIZE - 1) + 1):
+                table[chr(cp)] = is_positive_logic
+        return table
+
+    @property
+    def match(self) -> str:
+        """ The characters in the ranges, as a sorted string.
+
+        Built on every access, so for wide ranges it is expensive: use
+        intervals, size or contains instead.
+        """
+        return "".join(chr(cp) for start, end in self.intervals for cp in range(start, end + 1))
+
+    def size(self) -> int:
+        """ Returns the number of characters in the ranges."""
+        return sum(end - start + 1 for start, end in self.intervals)
+
+    def chars(self) -> Iterator[str]:
+        """ Returns an iterator over the characters in the ranges."""
+        return (chr(cp) for start, end in self.intervals for cp in range(start, end + 1))
+
+    def contains(self, ch: str) -> bool:
+        """ Returns whether ch is in the ranges, regardless of the logic."""
+        if self.ignore_case:
+            return any(self.__in_intervals__(ord(variant)) for variant in case_variants(ch, self.ignore_case))
+        cp = ord(ch)
+        if cp < LATIN1_SIZE:
+            return self.__latin1__[ch] == self.is_positive_logic
+        return self.__in_intervals__(cp)
+
+    def __in_intervals__(self, cp: int) -> bool:
+        i = bisect_right(self.__starts__, cp) - 1
+        return i >= 0 and cp <= self.intervals[i][1]
 
     def is_match(self, ch: str = None, str_i: int = 0, str_len: int = 0) -> bool:
         # XNOR of whether the ch is found and the logic (positive/negative)
-        return not((ch in self.match) ^ self.is_positive_logic)
+        found = self.__latin1__.get(ch)
+        if found is not None:
+            return found
+        return self.contains(ch) == self.is_positive_logic
 
 
 class StartElement(LeafNode):
@@ -158,14 +332,13 @@ class OrNode(ASTNode):
     """ AST OrNode.
 
     Inherits from ASTNode and models the or-nodes, that is the nodes that
-    divides the regex into two possible matching paths.
+    divide the regex into alternative matching paths, one per child, in the
+    order they appear in the regex.
     """
 
-    def __init__(self, left: ASTNode, right: ASTNode) -> None:
+    def __init__(self, children: List[ASTNode]) -> None:
         super().__init__()
-        self.left: ASTNode = left
-        self.right: ASTNode = right
-        self.children: List[ASTNode] = [left, right]
+        self.children: List[ASTNode] = list(children)
         self.min: Union[int, float] = 1
         self.max: Union[int, float] = 1
 
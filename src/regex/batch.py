@@ -0,0 +1,157 @@
+"""Module containing the batch matching API.
+
+match_many matches one regex against many test strings, and match_any many
+regexes against one test string, paying the setup cost of a match (cache
+lookup, engine choice, prefilter, closures) once for the whole batch instead
+of once per call. The regexes given to match_any are merged into a single
+automaton, a PatternSet, so each test string is scanned once whatever the
+number of regexes.
+
+The results are compact arrays of integers, made of one (id, start, end)
+record per match, where id is the index of the test string for match_many and
+the index of the regex for match_any.
+
+Example:
+    Matching a regex against many lines::
+
+        records = match_many(r"[0-9]+ refused", lines)
+        for i in range(0, len(records), 3):
+            line_i, start, end = records[i:i + 3]
+
+    Matching many regexes against a line::
+
+        patterns = PatternSet([r"refused", r"reset", r"timed? ?out"])
+        for line in lines:
+            records = patterns.match(line)
+"""
+
+
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+from nfa import AutomatonUnsupported, SetDFA, compile_program_set
+from pattern import Pattern, compile, AUTOMATON
+from engine import RegexEngine
+
+
+RECORD_SIZE = 3
+
+
+def match_many(re: Union[str, Pattern], strings: Iterable[str], ignore_case: int = 0, engine: str = None) -> array:
+    """ Searches a regex in each of many test strings.
+
+    Each string is searched as by RegexEngine.match, without
+    continue_after_match, and only the span of the first match is returned.
+
+    Args:
+        re (Union[str, Pattern]): the regular expression to search
+        strings (Iterable[str]): the test strings
+        ignore_case (int): the same as in RegexEngine.match (default is 0)
+        engine (str): the engine to use, BACKTRACKING or AUTOMATON; if None
+            the engine of the pattern is used, or AUTOMATON if the pattern
+            doesn't set one (default is None)
+
+    Returns:
+        array: a flat array of (string index, start, end) records, one for
+        each string where the regex matched, in the order of the strings
+    """
+    pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+    if engine is None:
+        engine = pattern.engine or AUTOMATON
+    # the same search RegexEngine.match runs, so the spans are the same
+    search = RegexEngine().__get_span_search__(pattern, engine)
+
+    records = array('q')
+    append = records.append
+    for string_i, string in enumerate(strings):
+        span = search(string, 0)
+        if span is not None:
+            append(string_i)
+            append(span[0])
+            append(span[1])
+    return records
+
+
+class PatternSet:
+    """ Many regexes merged into a single automaton.
+
+    The automaton finds the span of the leftmost-longest match of every
+    regex in a single scan of the test string. Regexes that can't be
+    compiled into an automaton are searched one by one, as
+    RegexEngine.match searches them.
+    """
+
+    def __init__(self, regexes: Sequence[Union[str, Pattern]], ignore_case: int = 0) -> None:
+        self.patterns: List[Pattern] = [re if isinstance(re, Pattern) else compile(re, ignore_case) for re in regexes]
+        if any(pattern.ignore_case != ignore_case for pattern in self.patterns):
+            raise Exception("All the patterns of a PatternSet must have the same ignore_case.")
+        self.ignore_case: int = ignore_case
+
+        # the indexes of the patterns merged into the automaton
+        self.merged: List[int] = [i for i, pattern in enumerate(self.patterns) if pattern.get_automaton() is not None]
+        # the indexes of the patterns searched one by one
+        self.others: List[int] = [i for i, pattern in enumerate(self.patterns) if pattern.get_automaton() is None]
+        self.dfa: Union[SetDFA, None] = None
+        if self.merged:
+            try:
+                self.dfa = SetDFA(compile_program_set([self.patterns[i].ast for i in self.merged]))
+            except AutomatonUnsupported:
+                # the merged program is too large, fall back to one by one
+                self.others = sorted(self.others + self.merged)
+                self.merged = []
+        reng = RegexEngine()
+        self.__searches__: Dict[int, Callable[[str, int], Optional[Tuple[int, int]]]] = {
+            i: reng.__get_span_search__(self.patterns[i], AUTOMATON) for i in self.others}
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def __repr__(self) -> str:
+        return "PatternSet({!r})".format([pattern.re for pattern in self.patterns])
+
+    def match(self, string: str) -> array:
+        """ Searches every regex of the set in a test string.
+
+        Args:
+            string (str): the test string
+
+        Returns:
+            array: a flat array of (pattern index, start, end) records, one
+            for each regex that matched, sorted by pattern index, with the
+            span of the first match of the regex
+        """
+        found = []
+        if self.dfa is not None:
+            for i, (start, end) in self.dfa.scan(string).items():
+                found.append((self.merged[i], start, end))
+        for pattern_i in self.others:
+            span = self.__searches__[pattern_i](string, 0)
+            if span is not None:
+                found.append((pattern_i, span[0], span[1]))
+        found.sort()
+
+        records = array('q')
+        for record in found:
+            records.extend(record)
+        return records
+
+
+def match_any(patterns: Union[PatternSet, Sequence[Union[str, Pattern]]], string: str, ignore_case: int = 0) -> array:
+    """ Searches many regexes in a test string.
+
+    Building a PatternSet merges the regexes into one automaton, so when
+    matching the same regexes many times the PatternSet should be built once
+    and passed in place of the regexes.
+
+    Args:
+        patterns (Union[PatternSet, Sequence[Union[str, Pattern]]]): the
+            regular expressions to search
+        string (str): the test string
+        ignore_case (int): the same as in RegexEngine.match, ignored if
+            patterns is a PatternSet (default is 0)
+
+    Returns:
+        array: the same as PatternSet.match
+    """
+    if not isinstance(patterns, PatternSet):
+        patterns = PatternSet(patterns, ignore_case)
+    return patterns.match(string)
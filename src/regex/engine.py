@@ -7,15 +7,48 @@ Example:
 
         reng = RegexEngine()
         result, consumed = reng.match(r"a+bx", "aabx")
+
+    Matching a compiled regex, so that it is parsed only once::
+
+        pattern = compile(r"a+bx")
+        result, consumed = reng.match(pattern, "aabx")
+
+    Using the automaton based engine, that runs in linear time whatever the
+    regex is::
+
+        reng = RegexEngine(engine=AUTOMATON)
+        result, consumed = reng.match(r"(a+)+b", "aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaac")
+
+    Bounding the work spent on an untrusted regex::
+
+        try:
+            result, consumed = reng.match(user_regex, text, max_steps=100000, timeout=0.05)
+        except MatchLimitExceeded as e:
+            print("gave up after", e.steps, "steps")
+
+    Iterating over the matches lazily, or just counting them::
+
+        for matches in reng.finditer(r"[0-9]+", text):
+            print(matches[0].match)
+        n = reng.count(r"[0-9]+", text)
+
+    Replacing the matches, and splitting the string on them::
+
+        text = reng.sub(r"(?<user>[a-z]+)@example\\.com", r"\\g<user>@example.org", text)
+        fields = reng.split(r" *, *", line)
 """
 
 
+import math
 from collections import deque
-from typing import Callable, Deque, Union, Tuple, List
-import unicodedata
-from treeparser import Parser
-from matcher import Match
-from astree import RE, GroupNode, LeafNode, OrNode, EndElement, StartElement
+from typing import Callable, Deque, Iterator, Optional, Union, Tuple, List
+from matcher import Match, CaptureSlots
+from astree import RE, GroupNode, LeafNode, LiteralElement, OrNode, EndElement, StartElement
+from prefilter import Prefilter
+from vm import MatchLimits, MatchLimitExceeded
+from template import Template, group_names
+from profiler import ProfilingVM, ProfileReport
+from pattern import Pattern, compile, cache_put, cache_info, set_cache_size, purge, BACKTRACKING, AUTOMATON, ENGINES
 
 
 class RegexEngine:
@@ -24,12 +57,12 @@ class RegexEngine:
     This class contains all the necessary to recognize regular expressions in a test string.
     """
 
-    def __init__(self):
-        self.parser: Parser = Parser()
-        self.prev_re: str = None
-        self.prev_ast: RE = None
+    def __init__(self, engine: str = BACKTRACKING):
+        if engine not in ENGINES:
+            raise Exception("Unknown engine '{}'.".format(engine))
+        self.engine: str = engine
 
-    def match(self, re: str, string: str, return_matches: bool = False, continue_after_match: bool = False, ignore_case: int = 0) -> Union[Tuple[bool, int, List[Deque[Match]]], Tuple[bool, int]]:
+    def match(self, re: Union[str, Pattern], string: str, return_matches: bool = False, continue_after_match: bool = False, ignore_case: int = 0, engine: str = None, index_only: bool = False, max_steps: int = None, timeout: float = None) -> Union[Tuple[bool, int, List[Deque[Match]]], Tuple[bool, int]]:
         """ Searches a regex in a test string.
 
         Searches the passed regular expression in the passed test string and
@@ -38,12 +71,16 @@ class RegexEngine:
         It is possible to customize both the returned value and the search
         method.
 
-        The ignore_case flag may cause unexpected results in the returned
-        number of matched characters, and also in the returned matches, e.g.
-        when the character ẞ is present in either the regex or the test string.
+        The ignore_case flag is compiled into the pattern, and the test string
+        is read unchanged, so the returned indexes always point into it. The
+        characters are compared one at a time through their folded form (see
+        astree.fold), thus a character folding to more than one character,
+        like ß or ﬁ, doesn't match the sequence it folds to (ss, fi).
 
         Args:
-            re (str): the regular expression to search
+            re (Union[str, Pattern]): the regular expression to search, either
+                as a string, which is compiled through the patterns cache, or
+                as a Pattern returned by compile()
             string (str): the test string
             return_matches (bool): if True a data structure containing the
                 matches - the whole match and the subgroups matched
@@ -52,8 +89,26 @@ class RegexEngine:
                 matching until the whole input is consumed
                 (default is False)
             ignore_case (int): when 0 the case is not ignored, when 1 a "soft"
-                case ignoring is performed, when 2 casefolding is performed.
+                case ignoring is performed, lowercasing the characters, when 2
+                casefolding is performed.
+                It is ignored when re is a Pattern, whose own flag is used.
                 (default is 0)
+            engine (str): the matching engine to use, either BACKTRACKING or
+                AUTOMATON. Both follow the leftmost-longest rule: the
+                backtracking engine runs the compiled program on a virtual
+                machine, while the automaton runs in linear time through a
+                lazily built DFA. The regexes too large to be compiled are
+                matched on their AST by __match__ (default is the engine of the Pattern, if any, otherwise the
+                engine passed to the constructor)
+            index_only (bool): if True, and return_matches is True, each
+                match is returned as a (group_id, start_idx, end_idx) tuple
+                instead of a Match, so the results don't keep a reference to
+                the test string (default is False)
+            max_steps (int): the maximum number of steps the backtracking
+                engine may take, over all the searches of the call; None for
+                no limit (default is None)
+            timeout (float): the maximum number of seconds the backtracking
+                engine may run; None for no limit (default is None)
 
         Returns:
             A tuple containing whether a match was found or not, the last
@@ -61,6 +116,9 @@ class RegexEngine:
             list of deques of Match, where each list of matches represents
             in the first position the whole match, and in the subsequent
             positions all the group and subgroups matched. 
+
+        Raises:
+            MatchLimitExceeded: if max_steps or timeout is exceeded
         """
 
         def return_fnc(res: bool, consumed: int, all_matches: List[Deque[Match]], return_matches: bool) -> Union[Tuple[bool, int, List[Deque[Match]]], Tuple[bool, int]]:
@@ -70,22 +128,20 @@ class RegexEngine:
             else:
                 return res, consumed
 
-        if ignore_case == 1:
-            re = unicodedata.normalize("NFKD", re).lower()
-            string = unicodedata.normalize("NFKD", string).casefold()
-        elif ignore_case == 2:
-            re = unicodedata.normalize("NFKD", re).casefold()
-            string = unicodedata.normalize("NFKD", string).casefold()
+        pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
 
-        ast = self.parser.parse(re=re) if self.prev_re != re else self.prev_ast
-        self.prev_re = re
-        self.prev_ast = ast
+        if engine is None:
+            engine = pattern.engine if pattern.engine is not None else self.engine
+        limits = MatchLimits(max_steps, timeout) if max_steps is not None or timeout is not None else None
+        # with index_only the engines build the tuples straight from the
+        # captures, without creating the Match objects
+        search = self.__get_search__(pattern, engine, return_matches, limits, index_only)
 
         # variables holding the matched groups list for each matched substring in the test string
         all_matches: List[Deque[Match]] = []
         highest_matched_idx: int = 0  # holds the highest matched string's index
 
-        res, consumed, matches = self.__match__(ast, string, 0)
+        res, consumed, matches = search(string, 0)
         if res:
             highest_matched_idx = consumed
             all_matches.append(matches)
@@ -96,7 +152,7 @@ class RegexEngine:
             return return_fnc(res, highest_matched_idx, all_matches, return_matches)
 
         while True:
-            res, consumed, matches = self.__match__(ast, string, consumed)
+            res, consumed, matches = search(string, consumed)
 
             # if consumed is not grater than highest_matched_idx this means the new match
             # consumed 0 characters, so there is really nothing more to match
@@ -106,12 +162,314 @@ class RegexEngine:
             else:
                 return return_fnc(True, highest_matched_idx, all_matches, return_matches)
 
-    def __match__(self, ast: RE, string: str, start_str_i: int) -> Tuple[bool, int, Deque[Match]]:
-        """ Same as match, but always returns after the first match."""
-        matches: Deque[Match] = deque()
+    def profile(self, re: Union[str, Pattern], string: str, continue_after_match: bool = False, ignore_case: int = 0) -> ProfileReport:
+        """ Matches a regex as match does with the backtracking engine,
+        counting the work done by each node of the regex.
+
+        Args:
+            re (Union[str, Pattern]): the regular expression to search
+            string (str): the test string
+            continue_after_match (bool): the same as in match (default is
+                False)
+            ignore_case (int): the same as in match (default is 0)
+
+        Returns:
+            ProfileReport: the result of the match, and the counts of each
+            node keyed by its span in the regex (see profiler)
+
+        Raises:
+            Exception: if the regex is too large to be compiled
+        """
+        pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+        vm = pattern.get_vm()
+        if vm is None:
+            raise Exception("The regex is too large to be compiled, so it can't be profiled.")
+        profiling_vm = ProfilingVM(vm.prog, pattern.prefilter)
+
+        def search(start_str_i: int) -> Tuple[bool, int]:
+            if pattern.prefilter is not None and not pattern.prefilter.may_match(string, start_str_i):
+                return False, len(string)
+            res, consumed, _ = profiling_vm.search(string, start_str_i, False)
+            return res, consumed
+
+        res, consumed = search(0)
+        highest_matched_idx = consumed if res else 0
+        while res and continue_after_match and consumed > 0:
+            res, consumed = search(consumed)
+            if not res or consumed <= highest_matched_idx:
+                break
+            highest_matched_idx = consumed
+        return profiling_vm.report(pattern.re, highest_matched_idx > 0 or res, highest_matched_idx)
+
+    def finditer(self, re: Union[str, Pattern], string: str, ignore_case: int = 0, engine: str = None, max_steps: int = None, timeout: float = None) -> Iterator[Deque[Match]]:
+        """ Lazily searches all the non-overlapping matches of a regex.
+
+        Each search starts where the previous match ended, or one character
+        later after an empty match, so the matches are found one at a time
+        and only while the generator is consumed.
+
+        Args:
+            re (Union[str, Pattern]): the regular expression to search
+            string (str): the test string
+            ignore_case (int): the same as in match (default is 0)
+            engine (str): the same as in match (default is None)
+            max_steps (int): the same as in match, counted over all the
+                matches yielded (default is None)
+            timeout (float): the same as in match, measured from the call
+                (default is None)
+
+        Returns:
+            An iterator over the matches, each one a deque of Match holding
+            the whole match first and then the groups matched.
+
+        Raises:
+            MatchLimitExceeded: if max_steps or timeout is exceeded
+        """
+        pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+        if engine is None:
+            engine = pattern.engine if pattern.engine is not None else self.engine
+        limits = MatchLimits(max_steps, timeout) if max_steps is not None or timeout is not None else None
+        search = self.__get_search__(pattern, engine, True, limits)
+
+        str_i = 0
+        while str_i <= len(string):
+            res, end, matches = search(string, str_i)
+            if not res:
+                return
+            yield matches
+            str_i = end if end > matches[0].start_idx else end + 1
+
+    def findall(self, re: Union[str, Pattern], string: str, ignore_case: int = 0, engine: str = None, max_steps: int = None, timeout: float = None) -> List[str]:
+        """ Returns the substrings matched by the non-overlapping matches of
+        a regex, found as by finditer but without computing the groups.
+
+        The arguments are the same as in finditer.
+        """
+        return [string[start:end] for start, end in self.__iter_spans__(re, string, ignore_case, engine, max_steps, timeout)]
+
+    def count(self, re: Union[str, Pattern], string: str, ignore_case: int = 0, engine: str = None, max_steps: int = None, timeout: float = None) -> int:
+        """ Returns the number of non-overlapping matches of a regex, found as
+        by finditer but without computing the groups.
+
+        The arguments are the same as in finditer.
+        """
+        return sum(1 for _ in self.__iter_spans__(re, string, ignore_case, engine, max_steps, timeout))
+
+    def sub(self, re: Union[str, Pattern], repl: Union[str, Callable[[Deque[Match]], str]], string: str, count: int = 0, ignore_case: int = 0, engine: str = None, max_steps: int = None, timeout: float = None) -> str:
+        """ Replaces the non-overlapping matches of a regex.
+
+        The string is scanned once, as by finditer, and the output is
+        assembled in a single list of pieces joined at the end.
+
+        Args:
+            re (Union[str, Pattern]): the regular expression to search
+            repl (Union[str, Callable[[Deque[Match]], str]]): either a
+                template, where the group references like \\1 and \\g<name>
+                are replaced by the text matched by the group (see
+                template.Template), or a function called with the matches
+                yielded by finditer and returning the replacement
+            string (str): the test string
+            count (int): the maximum number of matches replaced, 0 for all of
+                them; no search is run past the last one (default is 0)
+            ignore_case (int): the same as in match (default is 0)
+            engine (str): the same as in match (default is None)
+            max_steps (int): the same as in finditer (default is None)
+            timeout (float): the same as in finditer (default is None)
+
+        Returns:
+            str: the string with the matches replaced
+
+        Raises:
+            MatchLimitExceeded: if max_steps or timeout is exceeded
+        """
+        pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+        template = Template(repl, pattern.ast) if isinstance(repl, str) else None
+
+        pieces = []
+        last = 0
+        replaced = 0
+        if template is not None and not template.uses_groups:
+            # the groups aren't needed, only the spans are searched
+            for start, end in self.__iter_spans__(pattern, string, ignore_case, engine, max_steps, timeout):
+                pieces.append(string[last:start])
+                pieces.append(template.expand_span(string, start, end))
+                last = end
+                replaced += 1
+                # checked before the next match is searched
+                if replaced == count:
+                    break
+        else:
+            for matches in self.finditer(pattern, string, ignore_case, engine, max_steps, timeout):
+                pieces.append(string[last:matches[0].start_idx])
+                pieces.append(template.expand(string, matches) if template is not None else repl(matches))
+                last = matches[0].end_idx
+                replaced += 1
+                if replaced == count:
+                    break
+        pieces.append(string[last:])
+        return ''.join(pieces)
+
+    def split(self, re: Union[str, Pattern], string: str, maxsplit: int = 0, ignore_case: int = 0, engine: str = None, max_steps: int = None, timeout: float = None) -> List[Union[str, None]]:
+        """ Splits a string by the non-overlapping matches of a regex.
+
+        If the regex has capturing groups, the text matched by each group is
+        returned too, after the piece preceding the match, or None if the
+        group didn't take part in the match.
+
+        Args:
+            re (Union[str, Pattern]): the regular expression to search
+            string (str): the test string
+            maxsplit (int): the maximum number of splits, 0 for no limit; no
+                search is run past the last one (default is 0)
+            ignore_case (int): the same as in match (default is 0)
+            engine (str): the same as in match (default is None)
+            max_steps (int): the same as in finditer (default is None)
+            timeout (float): the same as in finditer (default is None)
+
+        Returns:
+            List[Union[str, None]]: the pieces of the string
+
+        Raises:
+            MatchLimitExceeded: if max_steps or timeout is exceeded
+        """
+        pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+        group_ids = sorted(group_id for group_id in group_names(pattern.ast) if group_id != 0)
+
+        pieces = []
+        last = 0
+        if not group_ids:
+            for start, end in self.__iter_spans__(pattern, string, ignore_case, engine, max_steps, timeout):
+                pieces.append(string[last:start])
+                last = end
+                # checked before the next match is searched
+                if len(pieces) == maxsplit:
+                    break
+        else:
+            splits = 0
+            for matches in self.finditer(pattern, string, ignore_case, engine, max_steps, timeout):
+                pieces.append(string[last:matches[0].start_idx])
+                groups = {match.group_id: match for match in matches}
+                for group_id in group_ids:
+                    match = groups.get(group_id)
+                    pieces.append(string[match.start_idx:match.end_idx] if match is not None else None)
+                last = matches[0].end_idx
+                splits += 1
+                if splits == maxsplit:
+                    break
+        pieces.append(string[last:])
+        return pieces
+
+    def __iter_spans__(self, re: Union[str, Pattern], string: str, ignore_case: int, engine: Optional[str], max_steps: Optional[int], timeout: Optional[float]) -> Iterator[Tuple[int, int]]:
+        """ Same as finditer, but yields the (start, end) span of each match."""
+        pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+        if engine is None:
+            engine = pattern.engine if pattern.engine is not None else self.engine
+        limits = MatchLimits(max_steps, timeout) if max_steps is not None or timeout is not None else None
+        search_span = self.__get_span_search__(pattern, engine, limits)
+
+        str_i = 0
+        while str_i <= len(string):
+            span = search_span(string, str_i)
+            if span is None:
+                return
+            yield span
+            start, end = span
+            str_i = end if end > start else end + 1
+
+    def __get_span_search__(self, pattern: Pattern, engine: str, limits: MatchLimits = None) -> Callable[[str, int], Optional[Tuple[int, int]]]:
+        """ Same as __get_search__, but the returned function only finds the
+        (start, end) span of the match, or None, without building any Match.
+        """
+        prefilter = pattern.prefilter
+        if engine == AUTOMATON:
+            automaton = pattern.get_automaton()
+            if automaton is not None:
+                if prefilter is None:
+                    return automaton.search_span
+
+                def search(string: str, start_str_i: int) -> Optional[Tuple[int, int]]:
+                    if prefilter.may_match(string, start_str_i):
+                        start_str_i = prefilter.next_candidate(string, start_str_i)
+                        if start_str_i != -1:
+                            return automaton.search_span(string, start_str_i)
+                    return None
+                return search
+        elif engine != BACKTRACKING:
+            raise Exception("Unknown engine '{}'.".format(engine))
+
+        vm = pattern.get_vm()
+        if vm is None:
+            def search_ast(string: str, start_str_i: int) -> Optional[Tuple[int, int]]:
+                res, end, matches = self.__match__(pattern.ast, string, start_str_i, prefilter, limits)
+                return (matches[0].start_idx, end) if res else None
+            return search_ast
+
+        def search_vm(string: str, start_str_i: int) -> Optional[Tuple[int, int]]:
+            if prefilter is None or prefilter.may_match(string, start_str_i):
+                slots = vm.search_slots(string, start_str_i, limits)
+                if slots is not None:
+                    return slots[0], slots[1]
+            return None
+        return search_vm
+
+    def __get_search__(self, pattern: Pattern, engine: str, return_matches: bool, limits: MatchLimits = None, index_only: bool = False) -> Callable[[str, int], Tuple[bool, int, Deque[Match]]]:
+        """ Returns the function searching the pattern with the chosen engine.
+
+        The limits are enforced by the backtracking engine only. If index_only
+        is True the matches are returned as (group_id, start_idx, end_idx)
+        tuples.
+        """
+        prefilter = pattern.prefilter
+        if engine == AUTOMATON:
+            automaton = pattern.get_automaton()
+            if automaton is not None:
+                if prefilter is None:
+                    return lambda string, start_str_i: automaton.search(string, start_str_i, return_matches, index_only)
+
+                def search(string: str, start_str_i: int) -> Tuple[bool, int, Deque[Match]]:
+                    # no match can start before the first candidate index
+                    if prefilter.may_match(string, start_str_i):
+                        start_str_i = prefilter.next_candidate(string, start_str_i)
+                        if start_str_i != -1:
+                            return automaton.search(string, start_str_i, return_matches, index_only)
+                    return False, len(string), deque()
+                return search
+        elif engine != BACKTRACKING:
+            raise Exception("Unknown engine '{}'.".format(engine))
+
+        vm = pattern.get_vm()
+        if vm is None:
+            # the regex is too large to be compiled, use the AST matcher
+            return lambda string, start_str_i: self.__match__(pattern.ast, string, start_str_i, prefilter, limits, index_only)
+        if prefilter is None:
+            return lambda string, start_str_i: vm.search(string, start_str_i, return_matches, limits, index_only)
+
+        def search_vm(string: str, start_str_i: int) -> Tuple[bool, int, Deque[Match]]:
+            if prefilter.may_match(string, start_str_i):
+                return vm.search(string, start_str_i, return_matches, limits, index_only)
+            return False, len(string), deque()
+        return search_vm
+
+    def __match__(self, ast: RE, string: str, start_str_i: int, prefilter: Prefilter = None, limits: MatchLimits = None, index_only: bool = False) -> Tuple[bool, int, Deque[Match]]:
+        """ Same as match, but always returns after the first match.
+
+        If a prefilter is passed, the start indexes where the regex can't
+        match are skipped. If limits are passed, every node visited counts as
+        a step, and MatchLimitExceeded is raised when they are exceeded. If
+        index_only is True the matches are returned as (group_id, start_idx,
+        end_idx) tuples.
+        """
+        next_check = limits.next_check() if limits is not None else math.inf
+
+        def count_step() -> None:
+            nonlocal next_check
+            if limits is not None:
+                limits.steps += 1
+                if limits.steps >= next_check:
+                    next_check = limits.check(limits.steps)
 
-        # used to restore the left match of a ornode if necessary
-        last_match: Match = None
+        # the captures of the groups, turned into Match objects at the end
+        captures = CaptureSlots(ast.groups_count)
 
         # str_i represents the matched characters so far. It is inizialized to
         # the value of the input parameter start_str_i because the match could
@@ -129,8 +487,9 @@ class RegexEngine:
 
         def return_fnc(res: bool, str_i: int) -> Tuple[bool, int, Deque[Match]]:
             """ Returns the Tuple to be returned by __match__."""
-            nonlocal matches
-            return res, str_i, matches
+            if not res:
+                return res, str_i, deque()
+            return res, str_i, captures.to_spans() if index_only else captures.to_matches(string)
 
         def save_matches(match_group: Callable, ast: Union[RE, GroupNode], string: str, start_idx: int, max_matched_idx=-1) -> Tuple[bool, int]:
             """ Save the matches of capturing groups.
@@ -145,45 +504,52 @@ class RegexEngine:
                 A tuple of the boolean result of the match, and the last matched
                 index.
             """
-            nonlocal matches
-            nonlocal last_match
-
             res, end_idx = match_group(ast, string, max_matched_idx)
 
-            if ast.is_capturing() and res == True:
-                for i in range(0, len(matches)):
-                    if matches[i].group_id == ast.group_id:
-                        last_match = matches[i]
-                        matches.remove(matches[i])
-                        break
-                matches.appendleft(
-                    Match(ast.group_id, start_idx, end_idx, string, ast.group_name))
+            if res and ast.is_capturing():
+                captures.save(ast.group_id, start_idx, end_idx, ast.group_name)
 
             return res, end_idx
-        
+
         def remove_leftmost_match():
             """ Used when matching an OrNode.
-            
+
             When matching an OrNode the right children is always saved instead
             of saving the left one when the chosen path goes left. By calling
             this function you remove the leftmost match (the one created by the
             right child).
             """
-            nonlocal matches
-            matches.popleft()
-        
+            captures.drop_latest()
+
         def appendleft_last_match():
             """ Used when matching an OrNode.
-            
+
             When matching an OrNode the right children is always saved instead
             of saving the left one when the chosen path goes left. By calling
             this function you restore the left match.
             """
-            nonlocal matches
-            matches.appendleft(last_match)
+            captures.restore_last()
 
 
-        def match_group(ast: Union[RE, GroupNode, OrNode], string: str, max_matched_idx: int = -1) -> Tuple[bool, int]:
+        def match_alternatives(alternatives: List[GroupNode], string: str, max_matched_idx: int = -1) -> Tuple[bool, int]:
+            """ Used when matching an OrNode.
+
+            Matches the first of the alternatives that matches, saving its
+            captures. Returns the match state and the new string index, as
+            match_group does.
+            """
+            nonlocal str_i
+            tmp_str_i = str_i
+            for alternative in alternatives:
+                str_i = tmp_str_i
+                res, new_str_i = save_matches(
+                    match_group, alternative, string, str_i, max_matched_idx)
+                if res:
+                    break
+            str_i = new_str_i
+            return res, str_i
+
+        def match_group(ast: Union[RE, GroupNode], string: str, max_matched_idx: int = -1) -> Tuple[bool, int]:
             """
             Match a group, which is always the case.s
 
@@ -215,6 +581,7 @@ class RegexEngine:
                 nonlocal max_matched_idx
                 nonlocal ast
 
+                count_step()
                 if len(backtrack_stack) == 0:
                     return False, str_i, curr_child_i
 
@@ -278,23 +645,9 @@ class RegexEngine:
             curr_node = ast.children[0] if len(ast.children) > 0 else None
             i = 0  # the children i'm iterating, not to confuse with str_i
 
-            if isinstance(ast, OrNode):
-                # matcha il primo, se matcha return true
-                # se no matcha il secondo
-                # se matcha return true, altrimenti false
-                tmp_str_i = str_i
-                res, new_str_i = save_matches(
-                            match_group, curr_node, string, str_i, max_matched_idx) if not isinstance(curr_node, OrNode) else match_group(curr_node, string, max_matched_idx)
-                if not res:
-                    str_i = tmp_str_i
-                    curr_node = ast.right
-                    res, new_str_i = save_matches(
-                            match_group, curr_node, string, str_i, max_matched_idx) if not isinstance(curr_node, OrNode) else match_group(curr_node, string, max_matched_idx)
-                str_i = new_str_i
-                return res, str_i
-
             # the passed ast can't be a Leaf
             while i < len(ast.children):
+                count_step()
                 curr_node = ast.children[i]
 
                 # if is OrNode I evaluate the sub-groups with a recursive call
@@ -308,13 +661,16 @@ class RegexEngine:
                     while j < max_:
                         tmp_str_i = str_i
 
-                        save_match_left = isinstance(curr_node.left, GroupNode)
-                        res_left, str_i_left = save_matches(match_group, curr_node.left, string, str_i, max_matched_idx) if save_match_left else match_group(curr_node.left, string, max_matched_idx)
+                        save_match_left = isinstance(curr_node.children[0], GroupNode)
+                        res_left, str_i_left = save_matches(match_group, curr_node.children[0], string, str_i, max_matched_idx) if save_match_left else match_group(curr_node.children[0], string, max_matched_idx)
 
                         str_i = tmp_str_i
 
-                        save_match_right = isinstance(curr_node.right, GroupNode)
-                        res_right, str_i_right = save_matches(match_group, curr_node.right, string, str_i, max_matched_idx) if save_match_right else match_group(curr_node.right, string, max_matched_idx)
+                        # the first alternative is compared with the first
+                        # matching one among the others
+                        others = curr_node.children[1:]
+                        save_match_right = len(others) == 1 and isinstance(others[0], GroupNode)
+                        res_right, str_i_right = save_matches(match_group, others[0], string, str_i, max_matched_idx) if save_match_right else match_alternatives(others, string, max_matched_idx)
 
                         if res_left and res_right:
                             # choose the one that consumed the most character
@@ -424,6 +780,39 @@ class RegexEngine:
 
                     continue
 
+                elif isinstance(curr_node, LiteralElement):
+                    # a run of characters, matched at once and recorded on
+                    # the stack as a single consumption
+                    lit = curr_node.match
+                    end = str_i + len(lit)
+                    if string.startswith(lit, str_i) and (max_matched_idx == -1 or end <= max_matched_idx):
+                        backtrack_stack.append((i, 1, 1, [len(lit)]))
+                        str_i = end
+                        i += 1
+                        continue
+
+                    # otherwise it fails as its characters would, one at a
+                    # time: past the first one, backtracking starts from
+                    # the characters already matched
+                    matched = 0
+                    limit = len(string) if max_matched_idx == -1 else min(len(string), max_matched_idx)
+                    while str_i + matched < limit and string[str_i + matched] == lit[matched]:
+                        matched += 1
+                    before_str_i = str_i
+                    if matched == 0 and str_i < len(string) and i > 0 and not isinstance(ast.children[i-1], LeafNode):
+                        str_i = remove_this_node_from_stack(i, str_i)
+                        if str_i == start_str_i:
+                            return False, str_i
+                        max_matched_idx = str_i - 1
+                    can_bt, bt_str_i, bt_i = backtrack(before_str_i, i, matched > 0)
+                    if can_bt:
+                        i = bt_i
+                        str_i = bt_str_i
+                        continue
+                    # the characters matched stay consumed, as they would
+                    str_i += matched
+                    return False, str_i
+
                 elif isinstance(curr_node, LeafNode):
                     # it is a LeafNode obviously now
                     min_, max_ = curr_node.min, curr_node.max
@@ -492,13 +881,21 @@ class RegexEngine:
                 match_group=match_group, ast=ast, string=string, start_idx=str_i)
             return return_fnc(res, consumed)
 
+        if prefilter is not None and not prefilter.may_match(string, str_i):
+            return return_fnc(False, len(string))
+
         while str_i < len(string):
+            if prefilter is not None:
+                str_i = prefilter.next_candidate(string, str_i)
+                if str_i == -1 or str_i == len(string):
+                    return return_fnc(False, len(string))
+                i = str_i
             res, _ = save_matches(match_group=match_group,
                                   ast=ast, string=string, start_idx=str_i)
             i += 1
             if res:
                 return return_fnc(True, str_i)
             else:
-                matches = deque()
+                captures.clear()
                 str_i = i
         return return_fnc(False, str_i)
\ No newline at end of file
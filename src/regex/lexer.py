@@ -1,101 +1,139 @@
+import string
+from array import array
 from typing import List
 from tokens import *
 
 
-class Lexer:
-    """ Lexer class.
+# the kind of each special character, the other ones are elements
+SPECIAL_KINDS = {
+    '.': WILDCARD,
+    '(': LEFT_PARENTHESIS,
+    ')': RIGHT_PARENTHESIS,
+    '[': LEFT_SQUARE_BRACKET,
+    ']': RIGHT_SQUARE_BRACKET,
+    '{': LEFT_CURLY_BRACE,
+    '}': RIGHT_CURLY_BRACE,
+    '-': DASH,
+    '^': START,
+    '$': END,
+    '?': QUESTION_MARK,
+    '*': ASTERISK,
+    '+': PLUS,
+    '|': VERTICAL_BAR,
+}
 
-    This class contains the method to scan a regular expression string producing the corresponding tokens.
+# the kind and the char of the escaped characters, the other ones are
+# elements matching the character itself
+ESCAPES = {
+    't': (ELEMENT, '\t'),
+    's': (SPACE, string.whitespace),
+}
+
+# the kind of the characters allowed inside curly braces
+CURLY_KINDS = dict.fromkeys('0123456789', ELEMENT)
+CURLY_KINDS[','] = COMMA
+CURLY_KINDS['}'] = RIGHT_CURLY_BRACE
+
+
+class TokenStream:
+    """ Compact stream of tokens.
+
+    The i-th token is described by kinds[i], one of the kinds defined in
+    tokens, chars[i], the character it stands for, and positions[i], its
+    index in the regex.
     """
 
+    __slots__ = ("kinds", "chars", "positions")
+
     def __init__(self) -> None:
-        self.__digits__ = '0123456789'
+        self.kinds: array = array('B')
+        self.chars: List[str] = []
+        self.positions: array = array('l')
 
-    def __is_digit__(self, ch: str) -> bool:
-        return self.__digits__.find(ch) > -1
+    def __len__(self) -> int:
+        return len(self.kinds)
 
-    def scan(self, re: str) -> List[Token]:
+
+class Lexer:
+    """ Lexer class.
+
+    This class contains the method to scan a regular expression string producing the corresponding tokens.
+    """
+
+    def tokenize(self, re: str) -> TokenStream:
         """ Regular expressions scanner.
 
-        Scans the regular expression in input and produces the list of recognized Tokens in output.
+        Scans the regular expression in input and produces the stream of
+        recognized tokens, dispatching each character through a table.
         It raises an Exception if there are errors in the regular expression.
 
         Args:
             re (str): the regular expression to scan
 
         Returns:
-            List[Token]: the list of tokens recognized in the passed regex
+            TokenStream: the tokens recognized in the passed regex
         """
-        tokens = []
-
-        def append(elem: Token) -> None:
-            nonlocal tokens
-            tokens.append(elem)
+        stream = TokenStream()
+        kinds, chars, positions = stream.kinds, stream.chars, stream.positions
+        special_kinds = SPECIAL_KINDS
+        re_len = len(re)
 
         i = 0
-        escape_found = False
-        while i < len(re):
+        while i < re_len:
             ch = re[i]
-            if escape_found:
-                if ch == 't':
-                    append(ElementToken(char='\t'))
-                if ch == 's':
-                    # \s matches a space character
-                    append(SpaceToken(char=ch))
-                else:
-                    append(ElementToken(char=ch))
-            elif ch == '\\':
-                escape_found = True
-                i += 1  # otherwise i won't be incremented bc of continue
-                continue
-            elif ch == '.':
-                append(Wildcard())
-            elif ch == '(':
-                append(LeftParenthesis())
-            elif ch == ')':
-                append(RightParenthesis())
-            elif ch == '[':
-                append(LeftSquareBracket())
-            elif ch == '-':
-                append(Dash())
-            elif ch == ']':
-                append(RightSquareBracket())
-            elif ch == '{':
-                append(LeftCurlyBrace())
+            kind = special_kinds.get(ch, ELEMENT)
+            pos = i
+            if ch == '\\':
+                i += 1
+                if i == re_len:
+                    break
+                ch = re[i]
+                kind, ch = ESCAPES.get(ch, (ELEMENT, ch))
+            elif kind == START and i != 0:
+                # a circumflex not at the start negates a range
+                kind = CIRCUMFLEX
+            elif kind == LEFT_CURLY_BRACE:
+                kinds.append(kind)
+                chars.append(ch)
+                positions.append(pos)
                 i += 1
-                while i < len(re):
+                while i < re_len:
                     ch = re[i]
-                    if ch == ',':
-                        append(Comma())
-                    elif self.__is_digit__(ch):
-                        append(ElementToken(char=ch))
-                    elif ch == '}':
-                        append(RightCurlyBrace())
-                        break
-                    else:
+                    kind = CURLY_KINDS.get(ch)
+                    if kind is None:
                         raise Exception("Bad token at index ${}.".format(i))
+                    if kind == RIGHT_CURLY_BRACE:
+                        break
+                    kinds.append(kind)
+                    chars.append(ch)
+                    positions.append(i)
                     i += 1
-            elif ch == '^':
-                if i == 0:
-                    append(Start())
                 else:
-                    append(Circumflex())
-            elif ch == '$':
-                append(End())
-            elif ch == '?':
-                append(QuestionMark())
-            elif ch == '*':
-                append(Asterisk())
-            elif ch == '+':
-                append(Plus())
-            elif ch == '|':
-                append(VerticalBar())
-            elif ch == '}':
-                append(RightCurlyBrace())
-            else:
-                append(ElementToken(char=ch))
-
-            escape_found = False
+                    continue
+                pos = i
+            kinds.append(kind)
+            chars.append(ch)
+            positions.append(pos)
             i += 1
 
-        return tokens
\ No newline at end of file
+        return stream
+
+    def scan(self, re: str) -> List[Token]:
+        """ Regular expressions scanner.
+
+        Same as tokenize, but returns one Token instance per token.
+
+        Args:
+            re (str): the regular expression to scan
+
+        Returns:
+            List[Token]: the list of tokens recognized in the passed regex
+        """
+        stream = self.tokenize(re)
+        tokens = []
+        for kind, ch, pos in zip(stream.kinds, stream.chars, stream.positions):
+            cls = TOKEN_CLASSES[kind]
+            token = cls(char=ch) if cls is ElementToken or cls is SpaceToken else cls()
+            token.pos = pos
+            tokens.append(token)
+        return tokens
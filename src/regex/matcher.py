@@ -1,9 +1,111 @@
+from collections import deque
+from typing import Deque, List, Tuple, Union
+
+
 class Match:
-    """ Contains the information of a match in a regular expression."""
+    """ Contains the information of a match in a regular expression.
+
+    Only the indexes of the match and a reference to the test string are
+    kept: the matched substring is sliced from it when the match attribute is
+    read, so building a Match doesn't copy the test string.
+    """
 
-    def __init__(self, group_id: int, start_idx: int, end_idx: int, string: str, name: str) -> None:
+    __slots__ = ("group_id", "name", "start_idx", "end_idx", "string", "offset")
+
+    def __init__(self, group_id: int, start_idx: int, end_idx: int, string: str, name: str, offset: int = 0) -> None:
+        """ offset is the index, in the test string, of the first character
+        of string, which may be just a piece of the test string."""
         self.group_id: int = group_id
         self.name: str = name
         self.start_idx: int = start_idx
         self.end_idx: int = end_idx
-        self.match: str = string[start_idx:end_idx]
\ No newline at end of file
+        self.string: str = string
+        self.offset: int = offset
+
+    @property
+    def match(self) -> str:
+        """ The matched substring."""
+        return self.string[self.start_idx - self.offset:self.end_idx - self.offset]
+
+    def span(self) -> Tuple[int, int]:
+        """ Returns the tuple (start_idx, end_idx) of the match."""
+        return self.start_idx, self.end_idx
+
+
+class CaptureSlots:
+    """ Captures of the backtracking engine, stored in slots indexed by
+    group_id.
+
+    Each group has a start slot, an end slot and a stamp telling when it was
+    last saved, and a log of the saves allows undoing the latest one in
+    amortized constant time. The captures are turned into Match objects only
+    once the match is over, the most recently saved group first.
+    """
+
+    __slots__ = ("starts", "ends", "names", "stamps", "log", "clock", "last")
+
+    def __init__(self, n_groups: int = 0) -> None:
+        self.starts: List[int] = [-1] * n_groups
+        self.ends: List[int] = [-1] * n_groups
+        self.names: List[str] = [None] * n_groups
+        # -1 when the group has no capture
+        self.stamps: List[int] = [-1] * n_groups
+        # (stamp, group_id) of every save, in order
+        self.log: List[Tuple[int, int]] = []
+        self.clock: int = 0
+        # (group_id, start, end, name) of the last capture replaced by a save
+        self.last: Union[Tuple[int, int, int, str], None] = None
+
+    def __store__(self, group_id: int, start_idx: int, end_idx: int, name: str) -> None:
+        if group_id >= len(self.starts):
+            grow = group_id + 1 - len(self.starts)
+            self.starts.extend([-1] * grow)
+            self.ends.extend([-1] * grow)
+            self.names.extend([None] * grow)
+            self.stamps.extend([-1] * grow)
+        self.starts[group_id] = start_idx
+        self.ends[group_id] = end_idx
+        self.names[group_id] = name
+        self.stamps[group_id] = self.clock
+        self.log.append((self.clock, group_id))
+        self.clock += 1
+
+    def save(self, group_id: int, start_idx: int, end_idx: int, name: str) -> None:
+        """ Saves the capture of a group, replacing the previous one."""
+        if group_id < len(self.stamps) and self.stamps[group_id] != -1:
+            self.last = (group_id, self.starts[group_id], self.ends[group_id], self.names[group_id])
+        self.__store__(group_id, start_idx, end_idx, name)
+
+    def drop_latest(self) -> None:
+        """ Removes the most recently saved capture."""
+        log, stamps = self.log, self.stamps
+        while log:
+            stamp, group_id = log.pop()
+            if stamps[group_id] == stamp:
+                stamps[group_id] = -1
+                return
+
+    def restore_last(self) -> None:
+        """ Saves again the last capture replaced by a save."""
+        if self.last is not None:
+            self.__store__(*self.last)
+
+    def clear(self) -> None:
+        """ Removes all the captures."""
+        for _, group_id in self.log:
+            self.stamps[group_id] = -1
+        self.log.clear()
+
+    def to_matches(self, string: str) -> Deque[Match]:
+        """ Returns the captures as Match objects, the most recently saved
+        first."""
+        stamps = self.stamps
+        saved = sorted((group_id for group_id in range(len(stamps)) if stamps[group_id] != -1), key=lambda group_id: -stamps[group_id])
+        return deque(Match(group_id, self.starts[group_id], self.ends[group_id], string, self.names[group_id]) for group_id in saved)
+
+    def to_spans(self) -> Deque[Tuple[int, int, int]]:
+        """ Same as to_matches, but returns (group_id, start_idx, end_idx)
+        tuples instead of Match objects."""
+        stamps = self.stamps
+        saved = sorted((group_id for group_id in range(len(stamps)) if stamps[group_id] != -1), key=lambda group_id: -stamps[group_id])
+        return deque((group_id, self.starts[group_id], self.ends[group_id]) for group_id in saved)
@@ -0,0 +1,918 @@
+"""Module containing the automaton based matching engine.
+
+The AST produced by the Parser is compiled into a Thompson NFA, that is a flat
+list of instructions, which is then simulated without ever backtracking.
+Searching is performed by a lazily built DFA whose states are cached between
+calls, so the time needed to scan a test string is linear in its length
+whatever the pattern is. Groups are recovered, only when requested, by a Pike
+VM run over the matched span.
+
+Alternations of literals, like keyword lists, are compiled into a trie of
+BRANCH instructions, so matching them costs the same however many
+alternatives there are. Over a trie the lazy DFA works as an Aho-Corasick
+automaton, looking for all the alternatives in a single pass.
+
+The automaton follows the leftmost-longest rule: among the matches starting at
+the leftmost possible index, the longest one is returned.
+
+Example:
+    Searching a regex with the automaton::
+
+        automaton = Automaton(Parser().parse(r"(a+)+b"))
+        res, consumed, matches = automaton.search("aaaab", 0)
+"""
+
+
+import math
+from collections import deque
+from typing import Any, Deque, Dict, FrozenSet, Iterator, List, Optional, Set, Tuple
+from astree import RE, ASTNode, GroupNode, OrNode, LeafNode, Element, LiteralElement, StartElement, EndElement
+from matcher import Match
+
+
+# instruction opcodes
+CHAR = 0  # consumes a character equal to arg
+PRED = 1  # consumes a character for which the predicate arg returns True
+SPLIT = 2  # forks the execution to out (preferred) and arg
+JMP = 3  # continues the execution at out
+SAVE = 4  # stores the current string index in the capture slot arg
+ASSERT_START = 5  # succeeds only at the start of the test string
+ASSERT_END = 6  # succeeds only at the end of the test string
+MATCH = 7  # the regex matched
+BRANCH = 8  # consumes a character among the keys of the dict arg, continuing at the instruction it maps to
+
+# counted quantifiers are unrolled, so patterns like a{1,100000} are left to
+# the backtracking engine instead of producing huge programs
+MAX_PROGRAM_SIZE = 20000
+# when the lazy DFA grows over this number of states its cache is flushed
+MAX_DFA_STATES = 4096
+
+
+class AutomatonUnsupported(Exception):
+    """ Raised when a regex AST can't be compiled into an automaton."""
+
+
+class Program:
+    """ Thompson NFA compiled from a regex AST.
+
+    The instruction at index pc is described by ops[pc], args[pc] and
+    outs[pc], where outs[pc] is the index of the instruction to execute next.
+    nodes[pc] is the AST node the instruction was compiled from.
+    """
+
+    def __init__(self) -> None:
+        self.ops: List[int] = []
+        self.args: List[Any] = []
+        self.outs: List[int] = []
+        self.nodes: List[Optional[ASTNode]] = []
+        self.n_groups: int = 0
+        self.group_names: Dict[int, str] = {}
+        # the node being compiled
+        self.owner: Optional[ASTNode] = None
+        # the size limit, raised by the tries, see _compile_trie
+        self.max_size: int = MAX_PROGRAM_SIZE
+        # the tries of the OrNodes, and the ones already allowed over the
+        # size limit, by id of the node
+        self.__tries__: Dict[int, Optional[Tuple["_TrieNode", int]]] = {}
+        self.__sized__: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+    def emit(self, op: int, arg: Any = None, out: int = None) -> int:
+        """ Appends an instruction and returns its index.
+
+        If out is not given the instruction continues to the next one.
+        """
+        pc = len(self.ops)
+        if pc >= self.max_size:
+            raise AutomatonUnsupported(
+                "The regex is too large to be compiled into an automaton.")
+        self.ops.append(op)
+        self.args.append(arg)
+        self.outs.append(pc + 1 if out is None else out)
+        self.nodes.append(self.owner)
+        return pc
+
+
+def compile_program(ast: RE) -> Program:
+    """ Compiles the AST returned by the Parser into a Program.
+
+    Args:
+        ast (RE): the root node of the regular expression's AST
+
+    Returns:
+        Program: the compiled program
+
+    Raises:
+        AutomatonUnsupported: if the AST contains nodes the automaton can't
+            handle or the program would be too large
+    """
+    prog = Program()
+    _compile(prog, ast.child)
+    prog.emit(MATCH)
+    return prog
+
+
+def compile_program_set(asts: List[RE]) -> Program:
+    """ Compiles many ASTs into a single Program.
+
+    The program forks into the program of every AST, each one ending with a
+    MATCH instruction whose arg is the index of its AST in asts.
+    """
+    prog = Program()
+    for i, ast in enumerate(asts):
+        split = prog.emit(SPLIT) if i < len(asts) - 1 else None
+        _compile(prog, ast.child)
+        prog.emit(MATCH, i)
+        if split is not None:
+            prog.args[split] = len(prog)
+    return prog
+
+
+def _compile(prog: Program, node: ASTNode) -> None:
+    """ Compiles a node together with its quantifier.
+
+    Each node is compiled by a _compile_node generator, yielding the children
+    to compile where their instructions go; the generators of the nodes
+    being compiled are kept in an explicit stack, so the depth of the
+    nesting doesn't matter.
+    """
+    stack = [_compile_node(prog, node)]
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+        else:
+            stack.append(_compile_node(prog, child))
+
+
+def _compile_node(prog: Program, node: ASTNode) -> Iterator[ASTNode]:
+    """ Compiles a node together with its quantifier, yielding the nodes to
+    compile in between, see _compile."""
+    owner, prog.owner = prog.owner, node
+    min_, max_ = node.min, node.max
+    for _ in range(min_):
+        yield from _compile_once(prog, node)
+    if max_ == math.inf:
+        split = prog.emit(SPLIT)
+        yield from _compile_once(prog, node)
+        prog.emit(JMP, out=split)
+        prog.args[split] = len(prog)
+    else:
+        splits = []
+        for _ in range(max_ - min_):
+            splits.append(prog.emit(SPLIT))
+            yield from _compile_once(prog, node)
+        for split in splits:
+            prog.args[split] = len(prog)
+    prog.owner = owner
+
+
+def _compile_once(prog: Program, node: ASTNode) -> Iterator[ASTNode]:
+    """ Compiles a single repetition of a node, as _compile_node does."""
+    if isinstance(node, GroupNode):
+        capturing = node.is_capturing()
+        if capturing:
+            prog.n_groups = max(prog.n_groups, node.group_id + 1)
+            prog.group_names.setdefault(node.group_id, node.group_name)
+            prog.emit(SAVE, 2 * node.group_id)
+        for child in node.children:
+            yield child
+        if capturing:
+            prog.emit(SAVE, 2 * node.group_id + 1)
+    elif isinstance(node, OrNode):
+        trie = _trie_of(prog, node)
+        if trie is not None:
+            _compile_trie(prog, node, *trie)
+            return
+        # a chain of SPLITs, each trying one alternative before the next
+        jmps = []
+        for alternative in node.children[:-1]:
+            split = prog.emit(SPLIT)
+            yield alternative
+            jmps.append(prog.emit(JMP))
+            prog.args[split] = len(prog)
+        yield node.children[-1]
+        for jmp in jmps:
+            prog.outs[jmp] = len(prog)
+    elif isinstance(node, StartElement):
+        prog.emit(ASSERT_START)
+    elif isinstance(node, EndElement):
+        prog.emit(ASSERT_END)
+    elif type(node) is Element:
+        prog.emit(CHAR, node.match)
+    elif isinstance(node, LiteralElement):
+        for ch in node.match:
+            prog.emit(CHAR, ch)
+    elif isinstance(node, LeafNode):
+        prog.emit(PRED, node.is_match)
+    else:
+        raise AutomatonUnsupported(
+            "Unsupported node {}.".format(node.__class__.__name__))
+
+
+def _literal_alternatives(node: OrNode) -> Optional[List[str]]:
+    """ Returns the strings matched by the alternatives of node, if each
+    one is a plain sequence of characters, else None.
+
+    The alternatives must also be captured the same way, as they are when
+    the parser produces them.
+    """
+    first = node.children[0]
+    words = []
+    for child in node.children:
+        if not isinstance(child, GroupNode) or child.min != 1 or child.max != 1:
+            return None
+        if child.is_capturing() != first.is_capturing() or child.group_id != first.group_id:
+            return None
+        for el in child.children:
+            if type(el) not in (Element, LiteralElement) or el.min != 1 or el.max != 1:
+                return None
+        words.append(''.join(el.match for el in child.children))
+    return words
+
+
+class _TrieNode:
+    """ Node of the trie of the alternatives of an OrNode.
+
+    Attributes:
+        children (Dict[str, _TrieNode]): the nodes following this one, by
+            character
+        word (Optional[int]): the index of the first alternative ending here,
+            None if no alternative does
+        first (int): the index of the first alternative passing through here
+        last (int): the index of the last alternative passing through here
+    """
+
+    __slots__ = ("children", "word", "first", "last")
+
+    def __init__(self, first: int) -> None:
+        self.children: Dict[str, _TrieNode] = {}
+        self.word: Optional[int] = None
+        self.first: int = first
+        self.last: int = first
+
+
+def _trie_of(prog: Program, node: OrNode) -> Optional[Tuple[_TrieNode, int]]:
+    """ Returns what _build_trie returns for the alternatives of node, None
+    if they aren't all literals, computing it only once per node."""
+    key = id(node)
+    if key not in prog.__tries__:
+        words = _literal_alternatives(node)
+        prog.__tries__[key] = _build_trie(words) if words is not None else None
+    return prog.__tries__[key]
+
+
+def _build_trie(words: List[str]) -> Optional[Tuple[_TrieNode, int]]:
+    """ Returns the trie of words and the number of instructions it
+    compiles to.
+
+    None is returned if the trie can't try the words matching at an index in
+    the order they come in, which happens when a word is a prefix of words
+    coming both before and after it, like "ab" in "abc|ab|abd".
+    """
+    root = _TrieNode(0)
+    size = 0
+    for i, word in enumerate(words):
+        curr = root
+        curr.last = i
+        for ch in word:
+            nxt = curr.children.get(ch)
+            if nxt is None:
+                if not curr.children:
+                    size += 1
+                nxt = curr.children[ch] = _TrieNode(i)
+            curr = nxt
+            curr.last = i
+        if curr.word is None:
+            curr.word = i
+            size += 1
+
+    nodes = [root]
+    while nodes:
+        curr = nodes.pop()
+        if curr.word is not None and curr.children:
+            first = min(child.first for child in curr.children.values())
+            last = max(child.last for child in curr.children.values())
+            if first < curr.word < last:
+                return None
+        nodes.extend(curr.children.values())
+    return root, size
+
+
+def _compile_trie(prog: Program, node: OrNode, root: _TrieNode, size: int) -> None:
+    """ Compiles an alternation of literals into a trie.
+
+    Each node of the trie is a BRANCH choosing the next node by the
+    character read, so the cost of matching the alternation depends on the
+    length of the alternatives rather than on their number. Where an
+    alternative ends and others go on, a SPLIT prefers the path holding the
+    alternatives coming first in the regex, so the same match is found as
+    with a chain of SPLITs.
+    """
+    # the trie grows with the regex, not with its quantifiers, so each trie
+    # is allowed once over the size limit
+    if id(node) not in prog.__sized__:
+        if len(prog) >= prog.max_size:
+            raise AutomatonUnsupported(
+                "The regex is too large to be compiled into an automaton.")
+        prog.__sized__.add(id(node))
+        prog.max_size += size
+
+    group = node.children[0]
+    capturing = group.is_capturing()
+    if capturing:
+        prog.n_groups = max(prog.n_groups, group.group_id + 1)
+        prog.group_names.setdefault(group.group_id, group.group_name)
+        prog.emit(SAVE, 2 * group.group_id)
+
+    # the instructions jumping to the end of the trie, patched at the end
+    exits = []
+    # the trie nodes to compile, with the BRANCH to patch with their pc
+    pending = [(root, None, None)]
+    while pending:
+        curr, parent, ch = pending.pop()
+        if parent is not None:
+            prog.args[parent][ch] = len(prog)
+        if curr.word is not None:
+            if not curr.children:
+                exits.append(prog.emit(JMP))
+                continue
+            split = prog.emit(SPLIT)
+            exits.append(split)
+            if curr.word < min(child.first for child in curr.children.values()):
+                # the alternative ending here comes first
+                prog.args[split], prog.outs[split] = split + 1, None
+            else:
+                prog.args[split], prog.outs[split] = None, split + 1
+        branch = prog.emit(BRANCH, {})
+        pending.extend((child, branch, child_ch) for child_ch, child in curr.children.items())
+
+    end = len(prog)
+    for pc in exits:
+        if prog.ops[pc] == JMP:
+            prog.outs[pc] = end
+        elif prog.args[pc] is None:
+            prog.args[pc] = end
+        else:
+            prog.outs[pc] = end
+
+    if capturing:
+        prog.emit(SAVE, 2 * group.group_id + 1)
+
+
+class _DState:
+    """ State of the lazy DFA.
+
+    Each state holds one set of NFA instructions for every start index that
+    may still produce a match, ordered from the leftmost start to the
+    rightmost one. An instruction is kept only in the set of the leftmost
+    start reaching it, since later starts can't produce a better match.
+    """
+
+    __slots__ = ("sets", "adding", "accept", "end_accept", "truncated", "next")
+
+    def __init__(self, sets: Tuple[FrozenSet[int], ...], adding: bool, accept: int) -> None:
+        self.sets: Tuple[FrozenSet[int], ...] = sets
+        # whether a new thread is started at every index
+        self.adding: bool = adding
+        # index of the leftmost set containing MATCH, -1 if none
+        self.accept: int = accept
+        # same as accept, but valid only at the end of the test string
+        self.end_accept: Optional[int] = None
+        # the state to continue with once the match in accept is recorded
+        self.truncated: Optional[_DState] = None
+        # transitions: ch -> (next state, kept sets indexes, new start added)
+        self.next: Dict[str, Tuple[_DState, Optional[Tuple[int, ...]], bool]] = {}
+
+
+class LazyDFA:
+    """ DFA built on demand from a Program.
+
+    States and transitions are computed the first time they are needed and
+    then cached, so repeated searches with the same pattern only pay for
+    dictionary lookups.
+    """
+
+    def __init__(self, prog: Program) -> None:
+        self.prog: Program = prog
+        self.states: Dict[Tuple[Tuple[FrozenSet[int], ...], bool], _DState] = {}
+        self.__closures__: Dict[Tuple[int, bool, bool], FrozenSet[int]] = {}
+        self.__initial__: Dict[bool, _DState] = {}
+
+    def closure(self, pc: int, at_start: bool, at_end: bool) -> FrozenSet[int]:
+        """ Returns the instructions reachable from pc without consuming.
+
+        Only the consuming instructions, MATCH and, when not at the end of
+        the test string, the pending ASSERT_END are returned.
+        """
+        key = (pc, at_start, at_end)
+        result = self.__closures__.get(key)
+        if result is not None:
+            return result
+
+        ops, args, outs = self.prog.ops, self.prog.args, self.prog.outs
+        found = set()
+        visited = set()
+        stack = [pc]
+        while stack:
+            curr = stack.pop()
+            if curr in visited:
+                continue
+            visited.add(curr)
+            op = ops[curr]
+            if op == SPLIT:
+                stack.append(args[curr])
+                stack.append(outs[curr])
+            elif op == JMP or op == SAVE:
+                stack.append(outs[curr])
+            elif op == ASSERT_START:
+                if at_start:
+                    stack.append(outs[curr])
+            elif op == ASSERT_END:
+                if at_end:
+                    stack.append(outs[curr])
+                else:
+                    found.add(curr)
+            else:
+                found.add(curr)
+
+        result = frozenset(found)
+        self.__closures__[key] = result
+        return result
+
+    def intern(self, sets: Tuple[FrozenSet[int], ...], adding: bool) -> _DState:
+        """ Returns the cached state for sets, creating it if needed."""
+        key = (sets, adding)
+        state = self.states.get(key)
+        if state is None:
+            if len(self.states) >= MAX_DFA_STATES:
+                self.flush()
+            match_pc = len(self.prog) - 1
+            accept = -1
+            for i, s in enumerate(sets):
+                if match_pc in s:
+                    accept = i
+                    break
+            state = _DState(sets, adding, accept)
+            self.states[key] = state
+        return state
+
+    def flush(self) -> None:
+        """ Drops every cached state and transition."""
+        for state in self.states.values():
+            state.next.clear()
+            state.truncated = None
+        self.states.clear()
+        self.__initial__.clear()
+
+    def initial(self, at_start: bool) -> _DState:
+        """ Returns the state to begin a search with."""
+        state = self.__initial__.get(at_start)
+        if state is None:
+            start = self.closure(0, at_start, False)
+            state = self.intern((start,) if start else (), True)
+            self.__initial__[at_start] = state
+        return state
+
+    def step(self, state: _DState, ch: str) -> Tuple[_DState, Optional[Tuple[int, ...]], bool]:
+        """ Computes and caches the transition from state on ch."""
+        ops, args, outs = self.prog.ops, self.prog.args, self.prog.outs
+        seen = set()
+        new_sets = []
+        keep = []
+        for i, s in enumerate(state.sets):
+            nxt = set()
+            for pc in s:
+                op = ops[pc]
+                if (op == CHAR and args[pc] == ch) or (op == PRED and args[pc](ch)):
+                    nxt |= self.closure(outs[pc], False, False)
+                elif op == BRANCH and ch in args[pc]:
+                    nxt |= self.closure(args[pc][ch], False, False)
+            nxt -= seen
+            if nxt:
+                seen |= nxt
+                new_sets.append(frozenset(nxt))
+                keep.append(i)
+
+        new_start = False
+        if state.adding:
+            start = self.closure(0, False, False) - seen
+            if start:
+                new_sets.append(start)
+                new_start = True
+
+        kept = tuple(keep)
+        if kept == tuple(range(len(state.sets))):
+            kept = None
+
+        transition = (self.intern(tuple(new_sets), state.adding), kept, new_start)
+        state.next[ch] = transition
+        return transition
+
+    def truncate(self, state: _DState) -> _DState:
+        """ Returns the state to continue with after recording a match.
+
+        The sets right of the matching one are dropped, and no new threads
+        are started anymore, as they could only produce matches starting
+        after the one already found.
+        """
+        truncated = state.truncated
+        if truncated is None:
+            truncated = self.intern(state.sets[:state.accept + 1], False)
+            state.truncated = truncated
+        return truncated
+
+    def end_accept(self, state: _DState, at_start: bool) -> int:
+        """ Returns the leftmost set matching at the end of the test string."""
+        if not at_start and state.end_accept is not None:
+            return state.end_accept
+
+        ops, outs = self.prog.ops, self.prog.outs
+        match_pc = len(self.prog) - 1
+        result = -1
+        for i, s in enumerate(state.sets):
+            if match_pc in s or any(ops[pc] == ASSERT_END and match_pc in self.closure(outs[pc], at_start, True) for pc in s):
+                result = i
+                break
+
+        if not at_start:
+            state.end_accept = result
+        return result
+
+
+class _SetState:
+    """ State of the SetDFA.
+
+    As in _DState, each state holds one set of NFA instructions for every
+    start index that may still produce a match, ordered from the leftmost
+    start to the rightmost one.
+    """
+
+    __slots__ = ("sets", "adding", "accepts", "end_accepts", "truncated", "next")
+
+    def __init__(self, sets: Tuple[FrozenSet[int], ...], adding: FrozenSet[int], accepts: Tuple[Tuple[int, int], ...]) -> None:
+        self.sets: Tuple[FrozenSet[int], ...] = sets
+        # the instructions of the thread started at every index, only of the
+        # regexes that didn't match yet
+        self.adding: FrozenSet[int] = adding
+        # (regex index, set index) of the leftmost set reaching the MATCH of
+        # each regex matching here
+        self.accepts: Tuple[Tuple[int, int], ...] = accepts
+        # same as accepts, but valid only at the end of the test string
+        self.end_accepts: Optional[Tuple[Tuple[int, int], ...]] = None
+        # the state to continue with once the matches in accepts are
+        # recorded, and the indexes of the sets it kept
+        self.truncated: Optional[Tuple[_SetState, Optional[Tuple[int, ...]]]] = None
+        # transitions: ch -> (next state, kept sets indexes, new start added)
+        self.next: Dict[str, Tuple[_SetState, Optional[Tuple[int, ...]], bool]] = {}
+
+
+class SetDFA(LazyDFA):
+    """ Lazy DFA finding the matches of many regexes at once.
+
+    Built from the Program returned by compile_program_set, it scans the test
+    string once whatever the number of regexes, starting a thread at every
+    index as the LazyDFA does, and records the span of the leftmost-longest
+    match of each regex. Once a regex matched, no thread of it is started
+    anymore, and its threads starting after the match are dropped.
+    """
+
+    def __init__(self, prog: Program) -> None:
+        super().__init__(prog)
+        # the index of the regex each instruction belongs to
+        self.owners: List[int] = []
+        regex_i = 0
+        for pc, op in enumerate(prog.ops):
+            self.owners.append(regex_i)
+            if op == MATCH:
+                regex_i += 1
+        self.set_states: Dict[Tuple[Tuple[FrozenSet[int], ...], FrozenSet[int]], _SetState] = {}
+        self.__set_initial__: Dict[bool, _SetState] = {}
+
+    def intern_set(self, sets: Tuple[FrozenSet[int], ...], adding: FrozenSet[int]) -> _SetState:
+        """ Returns the cached state for sets, creating it if needed."""
+        key = (sets, adding)
+        state = self.set_states.get(key)
+        if state is None:
+            if len(self.set_states) >= MAX_DFA_STATES:
+                for old in self.set_states.values():
+                    old.next.clear()
+                    old.truncated = None
+                self.set_states.clear()
+                self.__set_initial__.clear()
+            ops, args = self.prog.ops, self.prog.args
+            accepts = {}
+            for i, s in enumerate(sets):
+                for pc in s:
+                    if ops[pc] == MATCH:
+                        accepts.setdefault(args[pc], i)
+            state = _SetState(sets, adding, tuple(accepts.items()))
+            self.set_states[key] = state
+        return state
+
+    def initial_set(self, at_start: bool) -> _SetState:
+        """ Returns the state to begin a scan with."""
+        state = self.__set_initial__.get(at_start)
+        if state is None:
+            start = self.closure(0, at_start, False)
+            state = self.intern_set((start,) if start else (), self.closure(0, False, False))
+            self.__set_initial__[at_start] = state
+        return state
+
+    def step_set(self, state: _SetState, ch: str) -> Tuple[_SetState, Optional[Tuple[int, ...]], bool]:
+        """ Computes and caches the transition from state on ch."""
+        ops, args, outs = self.prog.ops, self.prog.args, self.prog.outs
+        seen = set()
+        new_sets = []
+        keep = []
+        for i, s in enumerate(state.sets):
+            nxt = set()
+            for pc in s:
+                op = ops[pc]
+                if (op == CHAR and args[pc] == ch) or (op == PRED and args[pc](ch)):
+                    nxt |= self.closure(outs[pc], False, False)
+                elif op == BRANCH and ch in args[pc]:
+                    nxt |= self.closure(args[pc][ch], False, False)
+            nxt -= seen
+            if nxt:
+                seen |= nxt
+                new_sets.append(frozenset(nxt))
+                keep.append(i)
+
+        start = state.adding - seen
+        if start:
+            new_sets.append(start)
+
+        kept = tuple(keep)
+        if kept == tuple(range(len(state.sets))):
+            kept = None
+
+        transition = (self.intern_set(tuple(new_sets), state.adding), kept, bool(start))
+        state.next[ch] = transition
+        return transition
+
+    def truncate_set(self, state: _SetState, accepts: Tuple[Tuple[int, int], ...]) -> Tuple[_SetState, Optional[Tuple[int, ...]]]:
+        """ Returns the state to continue with after recording the matches
+        in accepts, and the indexes of the sets it kept.
+
+        The threads of each regex matched are dropped from the sets right of
+        the matching one, and no new thread of it is started anymore, as
+        they could only produce matches starting after the one found.
+        """
+        owners = self.owners
+        matched = dict(accepts)
+        new_sets = []
+        keep = []
+        for i, s in enumerate(state.sets):
+            s = frozenset(pc for pc in s if matched.get(owners[pc], i) >= i)
+            if s:
+                new_sets.append(s)
+                keep.append(i)
+        adding = frozenset(pc for pc in state.adding if owners[pc] not in matched)
+
+        kept = tuple(keep)
+        if kept == tuple(range(len(state.sets))):
+            kept = None
+        return self.intern_set(tuple(new_sets), adding), kept
+
+    def set_end_accepts(self, state: _SetState, at_start: bool) -> Tuple[Tuple[int, int], ...]:
+        """ Same as the accepts of state, but at the end of the test
+        string."""
+        if not at_start and state.end_accepts is not None:
+            return state.end_accepts
+
+        ops, args, outs = self.prog.ops, self.prog.args, self.prog.outs
+        accepts = {}
+        for i, s in enumerate(state.sets):
+            for pc in s:
+                if ops[pc] == MATCH:
+                    accepts.setdefault(args[pc], i)
+                elif ops[pc] == ASSERT_END:
+                    for end_pc in self.closure(outs[pc], at_start, True):
+                        if ops[end_pc] == MATCH:
+                            accepts.setdefault(args[end_pc], i)
+        result = tuple(accepts.items())
+
+        if not at_start:
+            state.end_accepts = result
+        return result
+
+    def scan(self, string: str) -> Dict[int, Tuple[int, int]]:
+        """ Returns the (start, end) span of the leftmost-longest match of
+        each regex matching somewhere in string, by index of the regex."""
+        str_len = len(string)
+        state = self.initial_set(True)
+        starts = [0] if state.sets else []
+        spans = {}
+
+        str_i = 0
+        while True:
+            if state.accepts:
+                for regex_i, i in state.accepts:
+                    spans[regex_i] = (starts[i], str_i)
+                truncated = state.truncated
+                if truncated is None:
+                    truncated = state.truncated = self.truncate_set(state, state.accepts)
+                state, kept = truncated
+                if kept is not None:
+                    starts = [starts[i] for i in kept]
+            if str_i == str_len or not (state.sets or state.adding):
+                break
+            ch = string[str_i]
+            transition = state.next.get(ch)
+            if transition is None:
+                transition = self.step_set(state, ch)
+            state, kept, new_start = transition
+            if kept is not None:
+                starts = [starts[i] for i in kept]
+            str_i += 1
+            if new_start:
+                starts.append(str_i)
+
+        if str_i == str_len:
+            for regex_i, i in self.set_end_accepts(state, str_len == 0):
+                spans[regex_i] = (starts[i], str_len)
+        return spans
+
+
+class Automaton:
+    """ Automaton based matcher.
+
+    Compiles the AST of a regular expression into a Program and searches it
+    through a LazyDFA. It raises AutomatonUnsupported if the AST can't be
+    compiled.
+    """
+
+    def __init__(self, ast: RE) -> None:
+        self.prog: Program = compile_program(ast)
+        self.dfa: LazyDFA = LazyDFA(self.prog)
+
+    def search_span(self, string: str, start_str_i: int = 0, base: int = 0, str_len: int = None) -> Optional[Tuple[int, int]]:
+        """ Finds the leftmost-longest match starting at or after start_str_i.
+
+        Args:
+            string (str): the test string, or a piece of it
+            start_str_i (int): the index where the search starts (default is 0)
+            base (int): the index of the first character of string, when
+                string is a piece of the test string (default is 0)
+            str_len (int): the length of the whole test string (default is
+                base + len(string))
+
+        Returns:
+            The tuple (start, end) of the match, or None if there is no match.
+            When string is a piece ending before the test string, and the
+            match can't be told without the characters after it, the tuple is
+            (start, -1), where start is the leftmost index where the match may
+            start.
+        """
+        dfa = self.dfa
+        piece_len = len(string)
+        if str_len is None:
+            str_len = base + piece_len
+        state = dfa.initial(start_str_i == 0)
+        starts = [start_str_i]
+        best = None
+
+        str_i = start_str_i - base
+        while True:
+            if state.accept >= 0:
+                best = (starts[state.accept], base + str_i)
+                del starts[state.accept + 1:]
+                state = dfa.truncate(state)
+            if str_i == piece_len or not state.sets:
+                break
+            ch = string[str_i]
+            transition = state.next.get(ch)
+            if transition is None:
+                transition = dfa.step(state, ch)
+            state, kept, new_start = transition
+            if kept is not None:
+                starts = [starts[i] for i in kept]
+            str_i += 1
+            if new_start:
+                starts.append(base + str_i)
+
+        if str_i == piece_len and state.sets:
+            if base + piece_len < str_len:
+                return starts[0], -1
+            accept = dfa.end_accept(state, str_len == 0)
+            if accept >= 0:
+                best = (starts[accept], str_len)
+        return best
+
+    def captures(self, string: str, start: int, end: int, base: int = 0, str_len: int = None) -> Optional[List[int]]:
+        """ Recovers the capture slots of a match spanning from start to end.
+
+        Runs a Pike VM anchored at start, where the threads are kept in
+        priority order so that greedy quantifiers and left alternatives are
+        preferred, and returns the slots of the first thread matching at end.
+
+        Args:
+            string (str): the test string, or a piece of it
+            start (int): the index where the match starts
+            end (int): the index where the match ends
+            base (int): the index of the first character of string, when
+                string is a piece of the test string (default is 0)
+            str_len (int): the length of the whole test string, -1 if not
+                known yet (default is base + len(string))
+        """
+        ops, args, outs = self.prog.ops, self.prog.args, self.prog.outs
+        if str_len is None:
+            str_len = base + len(string)
+
+        def add_thread(threads: List[Tuple[int, Tuple[int, ...]]], visited: set, pc: int, slots: Tuple[int, ...], str_i: int) -> None:
+            stack = [(pc, slots)]
+            while stack:
+                pc, slots = stack.pop()
+                if pc in visited:
+                    continue
+                visited.add(pc)
+                op = ops[pc]
+                if op == SPLIT:
+                    stack.append((args[pc], slots))
+                    stack.append((outs[pc], slots))
+                elif op == JMP:
+                    stack.append((outs[pc], slots))
+                elif op == SAVE:
+                    new_slots = list(slots)
+                    new_slots[args[pc]] = str_i
+                    stack.append((outs[pc], tuple(new_slots)))
+                elif op == ASSERT_START:
+                    if str_i == 0:
+                        stack.append((outs[pc], slots))
+                elif op == ASSERT_END:
+                    if str_i == str_len:
+                        stack.append((outs[pc], slots))
+                else:
+                    threads.append((pc, slots))
+
+        threads = []
+        add_thread(threads, set(), 0, (-1,) * (2 * self.prog.n_groups), start)
+        str_i = start
+        while threads:
+            if str_i == end:
+                for pc, slots in threads:
+                    if ops[pc] == MATCH:
+                        return list(slots)
+                return None
+            ch = string[str_i - base]
+            next_threads = []
+            visited = set()
+            for pc, slots in threads:
+                op = ops[pc]
+                if (op == CHAR and args[pc] == ch) or (op == PRED and args[pc](ch)):
+                    add_thread(next_threads, visited, outs[pc], slots, str_i + 1)
+                elif op == BRANCH and ch in args[pc]:
+                    add_thread(next_threads, visited, args[pc][ch], slots, str_i + 1)
+            threads = next_threads
+            str_i += 1
+        return None
+
+    def search(self, string: str, start_str_i: int = 0, return_matches: bool = True, index_only: bool = False) -> Tuple[bool, int, Deque[Match]]:
+        """ Searches the regex in string starting from start_str_i.
+
+        Returns the same tuple returned by RegexEngine.__match__: whether a
+        match was found, the index where the match ends and the deque of
+        Match, which is left empty if return_matches is False, or of
+        (group_id, start_idx, end_idx) tuples if index_only is True.
+        """
+        span = self.search_span(string, start_str_i)
+        if span is None:
+            return False, len(string), deque()
+        if not return_matches:
+            return True, span[1], deque()
+        slots = self.captures(string, span[0], span[1])
+        if index_only:
+            return True, span[1], spans_from_slots(slots)
+        return True, span[1], matches_from_slots(slots, self.prog.group_names, string)
+
+
+def _sorted_slots(slots: List[int]) -> List[Tuple[int, int, int]]:
+    """ Returns the (-end_idx, start_idx, group_id) of the groups captured
+    in slots, sorted in the order of the matches."""
+    found = []
+    for group_id in range(len(slots) // 2):
+        start_idx, end_idx = slots[2 * group_id], slots[2 * group_id + 1]
+        if start_idx != -1 and end_idx != -1:
+            found.append((-end_idx, start_idx, group_id))
+    found.sort()
+    return found
+
+
+def matches_from_slots(slots: List[int], group_names: Dict[int, str], string: str, base: int = 0) -> Deque[Match]:
+    """ Builds the deque of Match from a list of capture slots.
+
+    The matches are ordered the same way as RegexEngine.__match__ orders
+    them: the whole match first, then the groups from the last one to end to
+    the first one. base is the index of the first character of string in the
+    test string.
+    """
+    return deque(Match(group_id, start_idx, -neg_end, string, group_names[group_id], base) for neg_end, start_idx, group_id in _sorted_slots(slots))
+
+
+def spans_from_slots(slots: List[int]) -> Deque[Tuple[int, int, int]]:
+    """ Same as matches_from_slots, but builds (group_id, start_idx, end_idx)
+    tuples instead of Match objects."""
+    return deque((group_id, start_idx, -neg_end) for neg_end, start_idx, group_id in _sorted_slots(slots))
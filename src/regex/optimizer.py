@@ -0,0 +1,287 @@
+"""Module containing the optimizer of the ASTs built by the Parser.
+
+The optimizer rewrites an AST into a simpler one matching the same strings,
+with the same groups capturing the same text. Each rewrite is a pass, a
+function rewriting an AST in place and returning it, so that the passes can
+be tested, timed and turned off one by one:
+
+- factor_prefixes: the elements adjacent alternatives of an alternation start
+  with are matched once, e.g. ([0-9]a|[0-9]b|c) becomes ([0-9](?:a|b)|c);
+- merge_single_chars: the alternations of single characters become a single
+  RangeElement, e.g. (a|b|[0-9]) becomes ([ab0-9]);
+- unwrap_groups: the non-capturing groups matched exactly once are replaced
+  by their children, and the ones holding a single child by the child
+  taking their quantifier, e.g. (?:ab)c becomes abc and (?:a)* becomes a*;
+- merge_literals: the runs of characters become a single LiteralElement,
+  matched at once, e.g. the 18 Elements of "connection refused".
+
+The passes only move, or join, elements matching one character or none, so
+the backtracking engine tries the same paths in the same order, and the
+groups of the matches don't change either.
+
+Compiled patterns are optimized with all the passes, see compile_pattern.
+
+Example:
+    Optimizing an AST with some of the passes::
+
+        ast = optimize(Parser().parse(r"(?:get|gets|put)(?:a|b)"), [merge_single_chars])
+"""
+
+
+from collections import deque
+from typing import Callable, List, Sequence
+from astree import RE, ASTNode, GroupNode, OrNode, Element, LiteralElement, FoldedElement, WildcardElement, SpaceElement, RangeElement, StartElement, EndElement
+
+
+def _rewrite(node: ASTNode, rewrite: Callable[[ASTNode], ASTNode]) -> ASTNode:
+    """ Applies rewrite to the descendants of node, bottom-up, and then to
+    node, returning the node replacing it.
+
+    The tree is walked with an explicit stack, so the depth of the nesting
+    doesn't matter.
+    """
+    # the nodes rewritten, whose parent isn't rewritten yet
+    done = []
+    # the nodes to rewrite, and whether their children are rewritten already
+    stack = [(node, False)]
+    while stack:
+        curr, expanded = stack.pop()
+        if isinstance(curr, (RE, GroupNode, OrNode)):
+            if not expanded:
+                stack.append((curr, True))
+                stack.extend((child, False) for child in reversed(curr.children))
+                continue
+            first = len(done) - len(curr.children)
+            children = done[first:]
+            del done[first:]
+            if isinstance(curr, RE):
+                curr.child = children[0]
+                curr.children = deque(children)
+            elif isinstance(curr, GroupNode):
+                curr.children = deque(children)
+            else:
+                curr.children = children
+        done.append(rewrite(curr))
+    return done[0]
+
+
+def _same_group(alternatives: List[ASTNode]) -> bool:
+    """ Returns whether the alternatives are groups matched once and
+    captured the same way, as the parser builds them."""
+    first = alternatives[0]
+    return all(isinstance(alternative, GroupNode) and alternative.min == alternative.max == 1
+               and alternative.is_capturing() == first.is_capturing() and alternative.group_id == first.group_id
+               for alternative in alternatives)
+
+
+def _same_leaf(a: ASTNode, b: ASTNode) -> bool:
+    """ Returns whether a and b are leaves matching the same single
+    character, or the same position."""
+    if type(a) is not type(b) or not a.min == a.max == b.min == b.max == 1:
+        return False
+    if type(a) is Element:
+        return a.match == b.match
+    if type(a) is FoldedElement:
+        return a.folded == b.folded and a.ignore_case == b.ignore_case
+    if type(a) is RangeElement:
+        return a.intervals == b.intervals and a.is_positive_logic == b.is_positive_logic and a.ignore_case == b.ignore_case
+    return type(a) in (WildcardElement, SpaceElement, StartElement, EndElement)
+
+
+def _replace(node: OrNode, children: List[ASTNode]) -> GroupNode:
+    """ Returns the group replacing an OrNode, capturing what its
+    alternatives captured."""
+    first = node.children[0]
+    group = GroupNode(deque(children), first.is_capturing(), first.group_name, first.group_id)
+    group.min, group.max = node.min, node.max
+    group.span = node.span
+    return group
+
+
+def _factor_run(run: List[GroupNode]) -> GroupNode:
+    """ Returns the alternative replacing a run of alternatives
+    starting with the same leaf, matching their common prefix once."""
+    sequences = [list(alternative.children) for alternative in run]
+    first = sequences[0]
+    k = 1
+    while k < len(first) and all(k < len(seq) and _same_leaf(seq[k], first[k]) for seq in sequences[1:]):
+        k += 1
+
+    rests = []
+    for alternative, seq in zip(run, sequences):
+        rest = GroupNode(deque(seq[k:]), False, alternative.group_name, alternative.group_id)
+        if alternative.span is not None:
+            end = alternative.span[1]
+            rest.span = (seq[k].span[0] if len(seq) > k else end, end)
+        rests.append(rest)
+    alternation = OrNode(rests)
+    if run[0].span is not None:
+        # the alternation takes the place of the run in the regex
+        alternation.span = (run[0].span[0], run[-1].span[1])
+
+    group = GroupNode(deque(first[:k] + [alternation]), run[0].is_capturing(), run[0].group_name, run[0].group_id)
+    if run[0].span is not None:
+        group.span = alternation.span
+    return group
+
+
+def _factor_prefixes(node: ASTNode) -> ASTNode:
+    if not isinstance(node, OrNode) or not _same_group(node.children):
+        return node
+    if all(type(el) in (Element, LiteralElement) and el.min == el.max == 1 for alternative in node.children for el in alternative.children):
+        # the compiler already matches the alternations of strings with a trie
+        return node
+
+    # only adjacent alternatives are factored, keeping the order they are tried in
+    runs = [[node.children[0]]]
+    for alternative in node.children[1:]:
+        previous = runs[-1][0].children
+        if alternative.children and previous and _same_leaf(alternative.children[0], previous[0]):
+            runs[-1].append(alternative)
+        else:
+            runs.append([alternative])
+    if len(runs) == len(node.children):
+        return node
+
+    children = [run[0] if len(run) == 1 else _factor_run(run) for run in runs]
+    if len(children) == 1:
+        return _replace(node, list(children[0].children))
+    node.children = children
+    return node
+
+
+def factor_prefixes(ast: RE) -> RE:
+    """ Matches the elements adjacent alternatives of an alternation start
+    with once, before an alternation of the rest of them."""
+    return _rewrite(ast, _factor_prefixes)
+
+
+def _merge_single_chars(node: ASTNode) -> ASTNode:
+    if not isinstance(node, OrNode) or not _same_group(node.children):
+        return node
+    intervals = []
+    for alternative in node.children:
+        if len(alternative.children) != 1:
+            return node
+        element = alternative.children[0]
+        if element.min != 1 or element.max != 1:
+            return node
+        if type(element) is Element:
+            intervals.append((ord(element.match), ord(element.match)))
+        elif type(element) is RangeElement and element.is_positive_logic and not element.ignore_case:
+            intervals.extend(element.intervals)
+        else:
+            return node
+
+    element = RangeElement(intervals=intervals)
+    element.span = node.span
+    return _replace(node, [element])
+
+
+def merge_single_chars(ast: RE) -> RE:
+    """ Replaces the alternations of single characters, and of positive
+    character classes, with a single RangeElement."""
+    return _rewrite(ast, _merge_single_chars)
+
+
+def _anchored(group: GroupNode) -> bool:
+    """ Returns whether the first or the last leaf of group, in any of its
+    alternatives, is a StartElement or an EndElement."""
+    stack = [group.children[0], group.children[-1]] if group.children else []
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (StartElement, EndElement)):
+            return True
+        if isinstance(node, OrNode):
+            stack.extend(node.children)
+        elif isinstance(node, GroupNode) and node.children:
+            stack.extend((node.children[0], node.children[-1]))
+    return False
+
+
+def _unwrap_groups(node: ASTNode) -> ASTNode:
+    if not isinstance(node, GroupNode):
+        return node
+    children = deque()
+    for child in node.children:
+        # an anchor moved among other nodes can't be parsed back
+        if isinstance(child, GroupNode) and not child.is_capturing() and not _anchored(child):
+            if child.min == child.max == 1:
+                children.extend(child.children)
+                continue
+            if len(child.children) == 1:
+                only = child.children[0]
+                if only.min == only.max == 1 and not isinstance(only, (StartElement, EndElement, LiteralElement)):
+                    only.min, only.max = child.min, child.max
+                    only.span = child.span
+                    children.append(only)
+                    continue
+        children.append(child)
+    node.children = children
+    return node
+
+
+def unwrap_groups(ast: RE) -> RE:
+    """ Replaces the non-capturing groups matched once with their children,
+    and the non-capturing groups of a single child with the child, unless
+    they start or end with an anchor."""
+    return _rewrite(ast, _unwrap_groups)
+
+
+def _merge_literals(node: ASTNode) -> ASTNode:
+    if not isinstance(node, GroupNode):
+        return node
+    children = deque()
+    run = []
+    for child in list(node.children) + [None]:
+        if child is not None and type(child) in (Element, LiteralElement) and child.min == child.max == 1:
+            run.append(child)
+            continue
+        if len(run) > 1:
+            literal = LiteralElement(''.join(el.match for el in run))
+            if run[0].span is not None and run[-1].span is not None:
+                literal.span = (run[0].span[0], run[-1].span[1])
+            children.append(literal)
+        else:
+            children.extend(run)
+        run = []
+        if child is not None:
+            children.append(child)
+    node.children = children
+    return node
+
+
+def merge_literals(ast: RE) -> RE:
+    """ Replaces the runs of characters matched once with a single
+    LiteralElement."""
+    return _rewrite(ast, _merge_literals)
+
+
+PASSES: Sequence[Callable[[RE], RE]] = (factor_prefixes, merge_single_chars, unwrap_groups, merge_literals)
+
+
+def optimize(ast: RE, passes: Sequence[Callable[[RE], RE]] = PASSES) -> RE:
+    """ Optimizes an AST.
+
+    Args:
+        ast (RE): the root node of the AST, rewritten in place
+        passes (Sequence[Callable[[RE], RE]]): the passes to apply, in order
+            (default is PASSES)
+
+    Returns:
+        RE: the optimized AST
+    """
+    for optimization in passes:
+        ast = optimization(ast)
+    return ast
+
+
+def size(ast: ASTNode) -> int:
+    """ Returns the number of nodes of an AST."""
+    count = 0
+    nodes = [ast]
+    while nodes:
+        node = nodes.pop()
+        count += 1
+        nodes.extend(getattr(node, 'children', ()))
+    return count
@@ -0,0 +1,259 @@
+"""Module containing the parallel search.
+
+The engines are pure Python, so a single process uses a single core whatever
+the number of threads. search_parallel splits a large test string into shards
+searched by a pool of processes, and search_files searches a list of files
+with one task per file. The compiled pattern is sent to each worker process
+once, when it starts, and the tasks only carry their shard of the test string,
+followed by the next SHARD_OVERLAP characters, or the file path.
+
+Each worker finds the matches starting in its shard, searching into the
+overlap when a match straddles the end of the shard. When a match can't be
+told without the characters past the overlap, the worker stops there and the
+rest of the shard is searched in the whole string while merging. The shards
+are merged in order: when a match of a shard ends inside the next one, the
+search is resumed where that match ended until it meets again a point where
+the worker of the next shard resumed its own search, so the matches returned
+are exactly the ones of a sequential search.
+
+Example:
+    Searching a large log with all the cores::
+
+        with open("server.log") as log:
+            spans = search_parallel(r"connection (refused|reset)", log.read())
+        for i in range(0, len(spans), 2):
+            start, end = spans[i:i + 2]
+"""
+
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence, Tuple, Union
+from nfa import Automaton
+from pattern import Pattern, compile
+
+
+# shards smaller than this aren't worth the inter-process communication
+MIN_SHARD_SIZE = 1 << 16
+# number of shards per worker, so that the workers that finish early can
+# take over the shards of the slower ones
+SHARDS_PER_WORKER = 4
+# number of characters after its shard sent with each task, where the
+# matches straddling the end of the shard are searched
+SHARD_OVERLAP = 1 << 12
+
+# the state of a worker process, set by _init_worker
+_worker_pattern: Union[Pattern, None] = None
+
+
+def _get_automaton(pattern: Pattern) -> Automaton:
+    automaton = pattern.get_automaton()
+    if automaton is None:
+        raise Exception("The regex can't be compiled into an automaton, so it can't be searched in parallel.")
+    return automaton
+
+
+def _resume_index(start: int, end: int) -> int:
+    """ Returns the index where the search resumes after a match."""
+    return end if end > start else end + 1
+
+
+def _next_span(pattern: Pattern, string: str, str_i: int, stop_str_i: int, base: int = 0, str_len: int = None) -> Union[Tuple[int, int], None]:
+    """ Returns the span of the first match starting between str_i and
+    stop_str_i, or None if there is none.
+
+    string may be a piece of the test string, starting at base, as in
+    Automaton.search_span: then the span is (start, -1) when the match can't
+    be told from the piece.
+    """
+    prefilter = pattern.prefilter
+    piece_end = base + len(string)
+    # in a piece ending before the test string, the prefilter misses the
+    # matches too close to the end of the piece
+    if prefilter is not None and (str_len is None or piece_end == str_len or (
+            not prefilter.anchored_end and stop_str_i + max(prefilter.min_len, len(prefilter.prefix)) <= piece_end)):
+        candidate = prefilter.next_candidate(string, str_i - base)
+        if candidate == -1 or base + candidate >= stop_str_i:
+            return None
+    span = _get_automaton(pattern).search_span(string, str_i, base, str_len)
+    if span is None or span[0] >= stop_str_i:
+        return None
+    return span
+
+
+def find_spans(pattern: Pattern, string: str, start_str_i: int = 0, stop_str_i: int = None) -> List[Tuple[int, int]]:
+    """ Finds the non-overlapping matches of a pattern in string.
+
+    Args:
+        pattern (Pattern): the compiled regular expression
+        string (str): the test string
+        start_str_i (int): the index where the search starts (default is 0)
+        stop_str_i (int): the matches starting at or after this index are
+            not returned, while the ones starting before it may end after it;
+            if None the whole string is searched (default is None)
+
+    Returns:
+        The list of the (start, end) tuples of the matches, in order.
+    """
+    str_len = len(string)
+    stop_str_i = str_len + 1 if stop_str_i is None else stop_str_i
+
+    spans = []
+    str_i = start_str_i
+    while str_i <= str_len:
+        span = _next_span(pattern, string, str_i, stop_str_i)
+        if span is None:
+            break
+        spans.append(span)
+        str_i = _resume_index(*span)
+    return spans
+
+
+def _init_worker(pattern: Pattern) -> None:
+    global _worker_pattern
+    _worker_pattern = pattern
+    _get_automaton(pattern)
+
+
+def _search_shard(task: Tuple[str, int, int, int]) -> Tuple[List[Tuple[int, int]], int]:
+    """ Finds the matches starting in a shard, in the piece of the test
+    string sent with it.
+
+    Returns the spans of the matches and the index where the search stopped
+    because the piece ended, or -1 if it reached the end of the shard.
+    """
+    piece, base, stop_str_i, str_len = task
+    spans = []
+    str_i = base
+    while str_i <= base + len(piece):
+        span = _next_span(_worker_pattern, piece, str_i, stop_str_i, base, str_len)
+        if span is None:
+            break
+        if span[1] == -1:
+            return spans, str_i
+        spans.append(span)
+        str_i = _resume_index(*span)
+    return spans, -1
+
+
+def _search_file(path: str, encoding: str) -> List[Tuple[int, int]]:
+    with open(path, encoding=encoding) as file:
+        string = file.read()
+    return find_spans(_worker_pattern, string)
+
+
+def _merge_shards(pattern: Pattern, string: str, shards: List[Tuple[int, int]], results: List[Tuple[List[Tuple[int, int]], int]]) -> array:
+    """ Merges the matches found in each shard into the matches of a
+    sequential search."""
+    spans = array('q')
+    str_i = 0  # where the sequential search resumes
+    for (shard_start, shard_end), (shard_spans, stopped_str_i) in zip(shards, results):
+        if str_i <= shard_start:
+            # the sequential search finds no match starting between str_i and
+            # shard_start, so it goes on exactly as the one of the worker
+            skip = 0
+        else:
+            # a match straddled the shard start: search again from where it
+            # ended, until the search meets a point where the worker resumed
+            resumes = {shard_start: 0}
+            for i, span in enumerate(shard_spans):
+                resumes[_resume_index(*span)] = i + 1
+            skip = None
+            while str_i < shard_end:
+                skip = resumes.get(str_i)
+                if skip is not None:
+                    break
+                span = _next_span(pattern, string, str_i, shard_end)
+                if span is None:
+                    break
+                spans.extend(span)
+                str_i = _resume_index(*span)
+            if skip is None:
+                continue
+        for span in shard_spans[skip:]:
+            spans.extend(span)
+            str_i = _resume_index(*span)
+        if stopped_str_i != -1:
+            # the worker stopped at the end of its piece: go on in the whole
+            # string, from where it stopped, until the end of the shard
+            str_i = stopped_str_i
+            while str_i < shard_end:
+                span = _next_span(pattern, string, str_i, shard_end)
+                if span is None:
+                    break
+                spans.extend(span)
+                str_i = _resume_index(*span)
+    return spans
+
+
+def search_parallel(re: Union[str, Pattern], string: str, max_workers: int = None, ignore_case: int = 0) -> array:
+    """ Searches all the non-overlapping matches of a regex in a large test
+    string with a pool of processes.
+
+    The matches are the same found by searching the automaton in the whole
+    string at once: leftmost-longest, each search starting where the previous
+    match ended (or one character later, after an empty match).
+
+    Args:
+        re (Union[str, Pattern]): the regular expression to search
+        string (str): the test string
+        max_workers (int): the number of worker processes; if None it is the
+            number of CPUs (default is None)
+        ignore_case (int): the same as in RegexEngine.match (default is 0)
+
+    Returns:
+        array: a flat array of (start, end) records, one for each match
+
+    Raises:
+        Exception: if the regex can't be compiled into an automaton
+    """
+    pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+    _get_automaton(pattern)
+    max_workers = max_workers or os.cpu_count() or 1
+
+    n_shards = min(max_workers * SHARDS_PER_WORKER, len(string) // MIN_SHARD_SIZE)
+    if max_workers == 1 or n_shards <= 1:
+        spans = array('q')
+        for span in find_spans(pattern, string):
+            spans.extend(span)
+        return spans
+
+    shard_size = -(-len(string) // n_shards)
+    # the last shard also takes the empty match at the end of the string
+    shards = [(i, i + shard_size) for i in range(0, len(string), shard_size)]
+    shards[-1] = (shards[-1][0], len(string) + 1)
+    tasks = [(string[start:end + SHARD_OVERLAP], start, end, len(string)) for start, end in shards]
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(pattern,)) as executor:
+        results = list(executor.map(_search_shard, tasks))
+    return _merge_shards(pattern, string, shards, results)
+
+
+def search_files(re: Union[str, Pattern], paths: Sequence[str], max_workers: int = None, ignore_case: int = 0, encoding: str = "utf-8") -> array:
+    """ Searches all the non-overlapping matches of a regex in many files
+    with a pool of processes, one file per task.
+
+    Args:
+        re (Union[str, Pattern]): the regular expression to search
+        paths (Sequence[str]): the paths of the text files
+        max_workers (int): the number of worker processes; if None it is the
+            number of CPUs (default is None)
+        ignore_case (int): the same as in RegexEngine.match (default is 0)
+        encoding (str): the encoding of the files (default is "utf-8")
+
+    Returns:
+        array: a flat array of (file index, start, end) records, one for each
+        match, in the order of the files
+
+    Raises:
+        Exception: if the regex can't be compiled into an automaton
+    """
+    pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+    _get_automaton(pattern)
+    with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(pattern,)) as executor:
+        results = executor.map(_search_file, paths, [encoding] * len(paths))
+        records = array('q')
+        for file_i, spans in enumerate(results):
+            for start, end in spans:
+                records.extend((file_i, start, end))
+    return records
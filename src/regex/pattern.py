@@ -0,0 +1,235 @@
+"""Module containing the compiled Pattern class and the patterns cache.
+
+Parsing a regex is far more expensive than looking it up, thus compiled
+patterns are kept in a module-level LRU cache shared by every RegexEngine.
+
+Example:
+    Compiling a regex once and using it many times::
+
+        pattern = compile(r"[a-z]+@[a-z]+\\.com")
+        reng = RegexEngine()
+        for line in lines:
+            result, consumed = reng.match(pattern, line)
+"""
+
+
+import threading
+from collections import OrderedDict, namedtuple
+from typing import Callable, Dict, Sequence, Tuple, Union
+from treeparser import Parser
+from optimizer import PASSES, optimize
+from astree import RE
+from nfa import Automaton, AutomatonUnsupported, compile_program
+from vm import BacktrackingVM
+from prefilter import Prefilter
+
+
+BACKTRACKING = "backtracking"
+AUTOMATON = "automaton"
+ENGINES = (BACKTRACKING, AUTOMATON)
+
+DEFAULT_CACHE_SIZE = 512
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+
+class Pattern:
+    """ Compiled regular expression.
+
+    Holds the AST of a regex together with the matcher state computed from
+    it, so that it can be matched many times without parsing it again.
+    Instances are returned by compile() and accepted by RegexEngine.match in
+    place of the regex string.
+    """
+
+    def __init__(self, re: str, ast: RE, ignore_case: int = 0, engine: str = None, prefilter: Union[Prefilter, bool, None] = None) -> None:
+        """
+        Args:
+            re (str): the regular expression
+            ast (RE): its AST
+            ignore_case (int): the same as in RegexEngine.match (default is 0)
+            engine (str): the engine to match the pattern with (default is None)
+            prefilter (Union[Prefilter, bool, None]): the prefilter of the
+                regex if already known, or False if it is known to be useless;
+                if None it is computed from the AST (default is None)
+        """
+        if engine is not None and engine not in ENGINES:
+            raise Exception("Unknown engine '{}'.".format(engine))
+        self.re: str = re
+        self.ast: RE = ast
+        self.ignore_case: int = ignore_case
+        self.engine: Union[str, None] = engine
+        if prefilter is None:
+            prefilter = Prefilter(ast)
+        # None when it can't skip any start index
+        self.prefilter: Union[Prefilter, None] = prefilter if prefilter and prefilter.is_useful() else None
+        self.__automaton__: Union[Automaton, bool, None] = None
+        self.__vm__: Union[BacktrackingVM, bool, None] = None
+        if engine == AUTOMATON:
+            self.get_automaton()
+
+    def __repr__(self) -> str:
+        return "Pattern({!r})".format(self.re)
+
+    def __getstate__(self) -> dict:
+        # the automaton, together with the DFA states cached in it, and the
+        # virtual machine are left out when pickling, and compiled again on
+        # the first use
+        state = self.__dict__.copy()
+        for matcher in ("__automaton__", "__vm__"):
+            if state[matcher] is not False:
+                state[matcher] = None
+        return state
+
+    def get_automaton(self) -> Union[Automaton, None]:
+        """ Returns the automaton compiled from the AST.
+
+        The automaton is compiled the first time it is requested, and None is
+        returned if the regex can't be compiled into an automaton.
+        """
+        if self.__automaton__ is None:
+            try:
+                self.__automaton__ = Automaton(self.ast)
+            except AutomatonUnsupported:
+                # remember the failure, so the compilation isn't retried
+                self.__automaton__ = False
+        return self.__automaton__ or None
+
+    def get_vm(self) -> Union[BacktrackingVM, None]:
+        """ Returns the backtracking virtual machine running the program
+        compiled from the AST.
+
+        The program is shared with the automaton when it has been compiled
+        already, and None is returned if the regex can't be compiled.
+        """
+        if self.__vm__ is None:
+            try:
+                prog = self.__automaton__.prog if self.__automaton__ else compile_program(self.ast)
+                self.__vm__ = BacktrackingVM(prog, self.prefilter)
+            except AutomatonUnsupported:
+                self.__vm__ = False
+        return self.__vm__ or None
+
+
+class PatternCache:
+    """ Thread-safe LRU cache of compiled patterns.
+
+    Keeps at most maxsize patterns, discarding the least recently used one
+    when full, and counts the hits, the misses and the evictions.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE) -> None:
+        self.parser: Parser = Parser()
+        self.maxsize: int = maxsize
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.__patterns__: Dict[Tuple[str, int, Union[str, None]], Pattern] = OrderedDict()
+        self.__lock__: threading.Lock = threading.Lock()
+
+    def get(self, re: str, ignore_case: int = 0, engine: str = None) -> Pattern:
+        """ Returns the compiled pattern of re, compiling it on a miss."""
+        key = (re, ignore_case, engine)
+        with self.__lock__:
+            pattern = self.__patterns__.get(key)
+            if pattern is not None:
+                self.__patterns__.move_to_end(key)
+                self.hits += 1
+                return pattern
+            self.misses += 1
+
+        # parsing happens outside of the lock, so a slow regex doesn't stall
+        # the other threads; at worst the same regex is compiled twice
+        pattern = compile_pattern(self.parser, re, ignore_case, engine)
+
+        with self.__lock__:
+            if self.maxsize > 0:
+                self.__patterns__[key] = pattern
+                self.__patterns__.move_to_end(key)
+                self.__shrink__()
+        return pattern
+
+    def put(self, pattern: Pattern) -> None:
+        """ Adds a pattern compiled elsewhere, e.g. loaded from a file."""
+        key = (pattern.re, pattern.ignore_case, pattern.engine)
+        with self.__lock__:
+            if self.maxsize > 0:
+                self.__patterns__[key] = pattern
+                self.__patterns__.move_to_end(key)
+                self.__shrink__()
+
+    def resize(self, maxsize: int) -> None:
+        """ Sets the maximum number of cached patterns."""
+        if maxsize < 0:
+            raise Exception("The cache size can't be negative.")
+        with self.__lock__:
+            self.maxsize = maxsize
+            self.__shrink__()
+
+    def clear(self) -> None:
+        """ Empties the cache and resets the counters."""
+        with self.__lock__:
+            self.__patterns__.clear()
+            self.hits, self.misses, self.evictions = 0, 0, 0
+
+    def info(self) -> CacheInfo:
+        with self.__lock__:
+            return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self.__patterns__))
+
+    def __shrink__(self) -> None:
+        while len(self.__patterns__) > self.maxsize:
+            self.__patterns__.popitem(last=False)
+            self.evictions += 1
+
+
+def compile_pattern(parser: Parser, re: str, ignore_case: int = 0, engine: str = None, passes: Sequence[Callable[[RE], RE]] = PASSES) -> Pattern:
+    """ Compiles re into a Pattern without going through the cache.
+
+    The AST is optimized with the passes given, all of them by default, see
+    optimizer.optimize.
+    """
+    return Pattern(re, optimize(parser.parse(re=re, ignore_case=ignore_case), passes), ignore_case, engine)
+
+
+_cache = PatternCache()
+
+
+def compile(re: str, ignore_case: int = 0, engine: str = None) -> Pattern:
+    """ Compiles a regular expression into a Pattern.
+
+    The compiled patterns are cached, so compiling the same regex again is
+    cheap.
+
+    Args:
+        re (str): the regular expression to compile
+        ignore_case (int): the same as in RegexEngine.match (default is 0)
+        engine (str): the engine to match the pattern with, BACKTRACKING or
+            AUTOMATON; if None the engine is chosen by RegexEngine.match
+            (default is None)
+
+    Returns:
+        Pattern: the compiled regular expression
+    """
+    return _cache.get(re, ignore_case, engine)
+
+
+def cache_put(pattern: Pattern) -> None:
+    """ Adds a pattern compiled elsewhere, e.g. loaded from a file, to the
+    patterns cache, so that compile returns it."""
+    _cache.put(pattern)
+
+
+def cache_info() -> CacheInfo:
+    """ Returns the hits, misses, evictions, maximum size and current size
+    of the patterns cache."""
+    return _cache.info()
+
+
+def set_cache_size(maxsize: int) -> None:
+    """ Sets the maximum number of patterns kept in the cache."""
+    _cache.resize(maxsize)
+
+
+def purge() -> None:
+    """ Clears the patterns cache."""
+    _cache.clear()
@@ -0,0 +1,278 @@
+"""Module containing the Prefilter class.
+
+A Prefilter is computed from the AST of a regex and tells the engines at which
+indexes of a test string a match may start, so that the other start indexes
+are skipped without ever running the matcher on them. It knows:
+
+- the literal prefix every match starts with, searched with str.find;
+- the set of characters a match may start with;
+- the longest literal substring every match contains, which allows strings
+  that can't match to be rejected at str.find speed.
+
+Example:
+    Computing the prefilter of a regex::
+
+        prefilter = Prefilter(Parser().parse(r"err(or)?: [0-9]+"))
+        prefilter.prefix  # "err"
+        prefilter.required  # ": "
+"""
+
+
+import math
+import os
+from typing import Dict, FrozenSet, List, Union
+from astree import RE, ASTNode, GroupNode, OrNode, LeafNode, Element, LiteralElement, RangeElement, StartElement, EndElement
+
+
+# first characters sets larger than this are searched with a loop instead of
+# one str.find per character
+MAX_FIND_CHARS = 4
+# range elements larger than this are not turned into first characters sets
+MAX_FIRST_CHARS = 256
+
+
+class _Info:
+    """ What is known about the strings matched by an AST node.
+
+    Attributes:
+        min_len (int): the minimum length of a match
+        max_len (Union[int, float]): the maximum length of a match, math.inf
+            if unbounded
+        first (FrozenSet[str]): the characters a non-empty match may start
+            with, None if any character is possible
+        exact (str): the only string the node matches, None if not known
+        prefix (str): a literal every match starts with
+        suffix (str): a literal every match ends with
+        required (List[str]): literals every match contains
+        anchored_start (bool): whether every match must start the test string
+        anchored_end (bool): whether every match must end the test string
+    """
+
+    __slots__ = ("min_len", "max_len", "first", "exact", "prefix", "suffix", "required", "anchored_start", "anchored_end")
+
+    def __init__(self, min_len: int, max_len: Union[int, float], first: Union[FrozenSet[str], None], exact: Union[str, None] = None, prefix: str = '', suffix: str = '', required: List[str] = None, anchored_start: bool = False, anchored_end: bool = False) -> None:
+        self.min_len: int = min_len
+        self.max_len: Union[int, float] = max_len
+        self.first: Union[FrozenSet[str], None] = first
+        self.exact: Union[str, None] = exact
+        self.prefix: str = exact if exact is not None else prefix
+        self.suffix: str = exact if exact is not None else suffix
+        self.required: List[str] = required if required is not None else []
+        self.anchored_start: bool = anchored_start
+        self.anchored_end: bool = anchored_end
+
+
+def analyze(node: ASTNode) -> _Info:
+    """ Returns what is known about the strings matched by node, quantifier
+    included."""
+    return analyze_tree(node)[id(node)]
+
+
+def analyze_tree(node: ASTNode) -> Dict[int, _Info]:
+    """ Returns what analyze returns for node and for each node below it, by
+    id of the node.
+
+    The tree is walked bottom-up with an explicit stack, so the depth of the
+    nesting doesn't matter, and each node is analyzed once.
+    """
+    infos = {}
+    # the nodes to analyze, and whether their children are analyzed already
+    stack = [(node, False)]
+    while stack:
+        curr, expanded = stack.pop()
+        children = _children(curr)
+        if children and not expanded:
+            stack.append((curr, True))
+            stack.extend((child, False) for child in children)
+            continue
+        once = _analyze_once(curr, [infos[id(child)] for child in children])
+        infos[id(curr)] = once if isinstance(curr, RE) else _quantified(curr, once)
+    return infos
+
+
+def _children(node: ASTNode) -> List[ASTNode]:
+    if isinstance(node, RE):
+        return [node.child]
+    if isinstance(node, (GroupNode, OrNode)):
+        return list(node.children)
+    return []
+
+
+def _quantified(node: ASTNode, once: _Info) -> _Info:
+    """ Returns what is known about node, quantifier included, given what
+    is known about a single repetition of it."""
+    min_, max_ = node.min, node.max
+
+    if max_ == 0:
+        return _Info(0, 0, frozenset(), exact='')
+    min_len, max_len = once.min_len * min_, once.max_len * max_ if once.max_len > 0 else 0
+    if min_ == 0:
+        # the node may be skipped, so nothing else is known
+        return _Info(0, max_len, once.first)
+    if min_ == max_ and once.exact is not None:
+        return _Info(min_len, max_len, once.first, exact=once.exact * min_, anchored_start=once.anchored_start, anchored_end=once.anchored_end)
+
+    required = list(once.required)
+    if once.exact is not None:
+        required.append(once.exact * min_)
+    elif min_ > 1:
+        # consecutive repetitions are joined
+        required.append(once.suffix + once.prefix)
+    prefix = once.exact * min_ if once.exact is not None else once.prefix
+    suffix = once.exact * min_ if once.exact is not None else once.suffix
+    return _Info(min_len, max_len, once.first, prefix=prefix, suffix=suffix, required=required, anchored_start=once.anchored_start, anchored_end=once.anchored_end)
+
+
+def _analyze_once(node: ASTNode, infos: List[_Info]) -> _Info:
+    """ Returns what is known about a single repetition of node, given what
+    is known about its children, in infos."""
+    if isinstance(node, RE):
+        return infos[0]
+    if isinstance(node, GroupNode):
+        return _analyze_sequence(infos)
+    if isinstance(node, OrNode):
+        min_len, max_len = min(info.min_len for info in infos), max(info.max_len for info in infos)
+        first = None if any(info.first is None for info in infos) else frozenset().union(*(info.first for info in infos))
+        anchored_start = all(info.anchored_start for info in infos)
+        anchored_end = all(info.anchored_end for info in infos)
+        exact = infos[0].exact
+        if exact is not None and all(info.exact == exact for info in infos):
+            return _Info(min_len, max_len, first, exact=exact, anchored_start=anchored_start, anchored_end=anchored_end)
+        prefix = os.path.commonprefix([info.prefix for info in infos])
+        suffix = os.path.commonprefix([info.suffix[::-1] for info in infos])[::-1]
+        return _Info(min_len, max_len, first, prefix=prefix, suffix=suffix, anchored_start=anchored_start, anchored_end=anchored_end)
+    if isinstance(node, StartElement):
+        # zero-width assertion
+        return _Info(0, 0, frozenset(), exact='', anchored_start=True)
+    if isinstance(node, EndElement):
+        return _Info(0, 0, frozenset(), exact='', anchored_end=True)
+    if type(node) is Element:
+        return _Info(1, 1, frozenset(node.match), exact=node.match)
+    if isinstance(node, LiteralElement):
+        return _Info(len(node.match), len(node.match), frozenset(node.match[:1]), exact=node.match)
+    if isinstance(node, RangeElement):
+        # the case variants of the characters aren't listed
+        if node.is_positive_logic and not node.ignore_case and node.size() <= MAX_FIRST_CHARS:
+            return _Info(1, 1, frozenset(node.chars()))
+        return _Info(1, 1, None)
+    if isinstance(node, LeafNode):
+        return _Info(1, 1, None)
+    return _Info(0, math.inf, None)
+
+
+def _analyze_sequence(infos: List[_Info]) -> _Info:
+    """ Returns what is known about the concatenation of the nodes infos
+    describe."""
+    # the first character comes from the children up to the first one that
+    # can't match the empty string
+    first = frozenset()
+    for info in infos:
+        first = None if info.first is None else first | info.first
+        if first is None or info.min_len > 0:
+            break
+    min_len = sum(info.min_len for info in infos)
+    max_len = sum(info.max_len for info in infos)
+    # a mandatory anchor anywhere in the sequence anchors the whole sequence
+    anchored_start = any(info.anchored_start for info in infos)
+    anchored_end = any(info.anchored_end for info in infos)
+
+    # literal runs are built by joining the exact children, together with the
+    # prefixes and suffixes of the children surrounding them
+    runs = []
+    required = []
+    run = ''
+    for info in infos:
+        if info.exact is not None:
+            run += info.exact
+        else:
+            runs.append(run + info.prefix)
+            required.extend(info.required)
+            run = info.suffix
+    runs.append(run)
+
+    if len(runs) == 1:
+        return _Info(min_len, max_len, first, exact=runs[0], anchored_start=anchored_start, anchored_end=anchored_end)
+    return _Info(min_len, max_len, first, prefix=runs[0], suffix=runs[-1], required=runs + required, anchored_start=anchored_start, anchored_end=anchored_end)
+
+
+class Prefilter:
+    """ Start indexes filter of a regex.
+
+    Computed from the AST of a regex, tells the indexes of a test string where
+    a match may start. Regexes anchored to the start of the test string are
+    only tried at index 0, and the ones anchored to its end and matching
+    strings of bounded length only at the indexes close enough to the end.
+    """
+
+    def __init__(self, ast: RE) -> None:
+        info = analyze(ast.child)
+        self.min_len: int = info.min_len
+        self.max_len: Union[int, float] = info.max_len
+        self.prefix: str = info.prefix
+        # when the regex can match the empty string a match may start anywhere
+        self.first_chars: Union[FrozenSet[str], None] = info.first if info.min_len > 0 else None
+        self.required: str = max([info.prefix, info.suffix] + info.required, key=len)
+        self.anchored_start: bool = info.anchored_start
+        self.anchored_end: bool = info.anchored_end
+
+    @staticmethod
+    def from_fields(min_len: int, max_len: Union[int, float], prefix: str, first_chars: Union[FrozenSet[str], None], required: str, anchored_start: bool, anchored_end: bool) -> 'Prefilter':
+        """ Returns a Prefilter with the given fields, e.g. as saved by
+        serialize, without analyzing the AST again."""
+        prefilter = Prefilter.__new__(Prefilter)
+        prefilter.min_len, prefilter.max_len = min_len, max_len
+        prefilter.prefix, prefilter.first_chars, prefilter.required = prefix, first_chars, required
+        prefilter.anchored_start, prefilter.anchored_end = anchored_start, anchored_end
+        return prefilter
+
+    def is_useful(self) -> bool:
+        """ Returns whether the prefilter can skip any index at all."""
+        return bool(self.prefix or self.first_chars is not None or self.required or
+                    self.anchored_start or (self.anchored_end and self.max_len != math.inf))
+
+    def may_match(self, string: str, start_str_i: int = 0) -> bool:
+        """ Returns False if no match can start at or after start_str_i."""
+        return not self.required or string.find(self.required, start_str_i) != -1
+
+    def next_candidate(self, string: str, str_i: int) -> int:
+        """ Returns the first index, starting from str_i, where a match may
+        start, or -1 if there is none."""
+        str_len = len(string)
+        if self.anchored_end:
+            # the match must end at str_len
+            str_i = max(str_i, str_len - self.max_len)
+        # no match fits after the last index
+        last_i = str_len - self.min_len
+        if str_i > last_i:
+            return -1
+
+        if self.anchored_start:
+            if str_i > 0:
+                return -1
+            if self.prefix:
+                return 0 if string.startswith(self.prefix) else -1
+            if self.first_chars is not None:
+                return 0 if str_len > 0 and string[0] in self.first_chars else -1
+            return 0
+
+        if self.prefix:
+            return string.find(self.prefix, str_i, last_i + len(self.prefix))
+
+        first_chars = self.first_chars
+        if first_chars is None:
+            return str_i
+
+        if len(first_chars) <= MAX_FIND_CHARS:
+            # look for the closest of the first characters, each search
+            # stopping at the best index found so far
+            best = last_i + 1
+            for ch in first_chars:
+                found = string.find(ch, str_i, best)
+                if found != -1:
+                    best = found
+            return best if best <= last_i else -1
+
+        for i in range(str_i, last_i + 1):
+            if string[i] in first_chars:
+                return i
+        return -1
@@ -0,0 +1,158 @@
+"""Module containing the profiler of the backtracking engine.
+
+The ProfilingVM runs the same search as the BacktrackingVM, through the same
+loop and memo, counting the work done by each instruction, and the counts are
+then summed up by the AST node each instruction was compiled from. The report
+tells, for each node, and thus for each piece of the regex:
+
+- steps: the instructions of the node executed;
+- calls: the characters tested against the node;
+- pushes: the alternatives saved on the backtrack stack by the node's
+  quantifier or alternation;
+- pops: the alternatives taken back from the stack, i.e. the backtracks;
+- saves: the captures saved by the node's group;
+
+while retries counts the start indexes tried. The loop counting them is built
+from the same source as the one of the BacktrackingVM, which doesn't count
+anything, so the searches not profiled pay nothing for the profiler.
+
+Example:
+    Finding the part of a regex that burns the CPU::
+
+        report = RegexEngine().profile(r"(a|aa)*[bc]", "a" * 30)
+        print(report)
+"""
+
+
+from typing import Dict, List, Optional, Tuple
+from astree import ASTNode
+from nfa import Program, CHAR, PRED, BRANCH, SPLIT, SAVE
+from prefilter import Prefilter
+from vm import BacktrackingVM, MatchLimits, StepCounters
+from analyzer import render
+
+
+COUNTERS = ("steps", "calls", "pushes", "pops", "saves")
+
+
+class NodeProfile:
+    """ Work done by one AST node.
+
+    Attributes:
+        node (ASTNode): the node
+        span (Optional[Tuple[int, int]]): its indexes in the regex, None if
+            the parser didn't record them
+        source (str): its text in the regex
+    """
+
+    __slots__ = ("node", "span", "source", "steps", "calls", "pushes", "pops", "saves")
+
+    def __init__(self, node: ASTNode, span: Optional[Tuple[int, int]], source: str) -> None:
+        self.node: ASTNode = node
+        self.span: Optional[Tuple[int, int]] = span
+        self.source: str = source
+        self.steps: int = 0
+        self.calls: int = 0
+        self.pushes: int = 0
+        self.pops: int = 0
+        self.saves: int = 0
+
+    def counts(self) -> Dict[str, int]:
+        return {counter: getattr(self, counter) for counter in COUNTERS}
+
+
+class ProfileReport:
+    """ Work done by a profiled match.
+
+    Attributes:
+        re (str): the regular expression
+        result (bool): whether a match was found
+        consumed (int): the same as returned by RegexEngine.match
+        retries (int): the start indexes tried
+        nodes (List[NodeProfile]): the profile of each node, in the order
+            the nodes appear in the regex
+    """
+
+    def __init__(self, re: str, result: bool, consumed: int, retries: int, nodes: List[NodeProfile]) -> None:
+        self.re: str = re
+        self.result: bool = result
+        self.consumed: int = consumed
+        self.retries: int = retries
+        self.nodes: List[NodeProfile] = nodes
+
+    def total(self, counter: str) -> int:
+        return sum(getattr(profile, counter) for profile in self.nodes)
+
+    def by_span(self) -> Dict[Tuple[int, int], Dict[str, int]]:
+        """ Returns the counts of the nodes with a known span, keyed by the
+        span of the node in the regex.
+
+        The counts of the nodes with the same span, like a group and its only
+        child, are summed up.
+        """
+        spans = {}
+        for profile in self.nodes:
+            if profile.span is None:
+                continue
+            counts = spans.setdefault(profile.span, dict.fromkeys(COUNTERS, 0))
+            for counter in COUNTERS:
+                counts[counter] += getattr(profile, counter)
+        return spans
+
+    def hottest(self, n: int = 5) -> List[NodeProfile]:
+        """ Returns the n nodes which executed the most steps."""
+        return sorted(self.nodes, key=lambda profile: profile.steps, reverse=True)[:n]
+
+    def __str__(self) -> str:
+        lines = ["{!r}: {} steps, {} start retries".format(self.re, self.total("steps"), self.retries),
+                 "{:>9} {:>9} {:>9} {:>9} {:>9}  {}".format(*COUNTERS, "node")]
+        for profile in self.hottest(len(self.nodes)):
+            where = "{}-{}".format(*profile.span) if profile.span is not None else "?"
+            lines.append("{:>9} {:>9} {:>9} {:>9} {:>9}  {} ({}, {})".format(
+                *profile.counts().values(), profile.source, where, profile.node.__class__.__name__))
+        return "\n".join(lines)
+
+
+class ProfilingVM(BacktrackingVM):
+    """ BacktrackingVM counting the work done by each instruction.
+
+    The searches run the BacktrackingVM's own loop, given the counters, which
+    are kept across searches, until reset is called.
+    """
+
+    def __init__(self, prog: Program, prefilter: Prefilter = None) -> None:
+        super().__init__(prog, prefilter)
+        self.reset()
+
+    def reset(self) -> None:
+        self.counters: StepCounters = StepCounters(len(self.prog))
+
+    def search_slots(self, string: str, start_str_i: int = 0, limits: MatchLimits = None, counters: StepCounters = None) -> Optional[List[int]]:
+        """ Same as BacktrackingVM.search_slots, updating the counters of
+        the ProfilingVM."""
+        return super().search_slots(string, start_str_i, limits, self.counters)
+
+    def report(self, re: str, result: bool, consumed: int) -> ProfileReport:
+        """ Returns the counters summed up by AST node."""
+        profiles: Dict[int, NodeProfile] = {}
+        ops, counters = self.prog.ops, self.counters
+        for pc, node in enumerate(self.prog.nodes):
+            if node is None:
+                continue
+            profile = profiles.get(id(node))
+            if profile is None:
+                span = node.span
+                source = re[span[0]:span[1]] if span is not None else render(node)
+                profile = profiles[id(node)] = NodeProfile(node, span, source)
+            # each execution of an instruction tests a character, pushes an
+            # alternative or saves a capture, depending on its opcode
+            steps = counters.steps[pc]
+            profile.steps += steps
+            if ops[pc] in (CHAR, PRED, BRANCH):
+                profile.calls += steps
+            elif ops[pc] == SPLIT:
+                profile.pushes += steps
+            elif ops[pc] == SAVE:
+                profile.saves += steps
+            profile.pops += counters.pops[pc]
+        return ProfileReport(re, result, consumed, counters.retries, list(profiles.values()))
@@ -0,0 +1,371 @@
+"""Module containing the binary serialization of compiled patterns.
+
+Parsing thousands of regexes is slow, so a set of compiled patterns can be
+saved once into a file and loaded by every worker. Loading reads the AST
+nodes back from the file, together with the Latin-1 tables of the ranges and
+the group names, without running the lexer and the parser, so it takes time
+proportional to the size of the file. The automaton and the virtual machine
+are compiled from the AST on their first use, as for any other Pattern.
+
+The file is read through mmap, so the processes forked from the one that
+opened it, and the other processes opening the same file, share its pages.
+
+File format, all the integers being little-endian:
+
+- header: the magic bytes b"PYREGEX\\0", the format version (u32) and the
+  number of patterns (u32);
+- the offset of each pattern record from the start of the file (u64 each);
+- the pattern records: ignore_case (u8), engine (u8: 0 for None, then the
+  index in pattern.ENGINES plus one), groups_count (u32), the regex (str),
+  the prefilter, and the AST nodes in preorder.
+
+The prefilter is a flag (u8), 0 if the pattern has none, followed by min_len
+and max_len (u32, INF for math.inf), anchored_start and anchored_end (u8),
+the prefix and the required literal (str), and the first characters as a
+flag (u8), 0 if they are unknown, followed by a str holding them.
+
+Each node is its kind (u8), min and max (u32, INF for math.inf), its span
+in the regex (two i32, -1 when unknown) and then:
+
+- GROUP: group_id (i32), capturing (u8), group_name (str), number of
+  children (u32);
+- OR: number of children (u32);
+- ELEMENT: the code point of the character (u32);
+- FOLDED: the code point of the character (u32), ignore_case (u8);
+- LITERAL: the characters (str);
+- RANGE: is_positive_logic (u8), ignore_case (u8), number of intervals
+  (u32), each interval as two code points (u32), and the Latin-1 table as
+  256 bytes, 1 for the characters matched;
+- WILDCARD, SPACE, START, END: nothing.
+
+A str is its length in bytes (u32) followed by its UTF-8 encoding.
+
+Example:
+    Saving the rules once, and loading them in each worker::
+
+        save([compile(rule) for rule in rules], "rules.pyrx")
+
+        with PatternStore("rules.pyrx") as store:
+            for pattern in store:
+                reng.match(pattern, line)
+"""
+
+
+import math
+import mmap
+import struct
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+from astree import RE, ASTNode, GroupNode, OrNode, Element, LiteralElement, FoldedElement, WildcardElement, SpaceElement, RangeElement, StartElement, EndElement, LATIN1_SIZE
+from prefilter import Prefilter
+from pattern import Pattern, ENGINES, cache_put
+
+
+MAGIC = b"PYREGEX\0"
+FORMAT_VERSION = 4
+
+# node kinds
+GROUP, OR, ELEMENT, FOLDED, RANGE, WILDCARD, SPACE, START, END, LITERAL = range(10)
+
+# stored in place of math.inf
+INF = 0xFFFFFFFF
+
+_HEADER = struct.Struct("<8sII")
+_PREFILTER = struct.Struct("<IIBB")
+_OFFSET = struct.Struct("<Q")
+_PATTERN = struct.Struct("<BBI")
+_NODE = struct.Struct("<BIIii")
+_GROUP = struct.Struct("<iB")
+_U8 = struct.Struct("<B")
+_U32 = struct.Struct("<I")
+_FOLDED = struct.Struct("<IB")
+_RANGE = struct.Struct("<BBI")
+_INTERVAL = struct.Struct("<II")
+
+_LATIN1_CHARS = [chr(cp) for cp in range(LATIN1_SIZE)]
+
+
+def _pack_str(out: List[bytes], string: str) -> None:
+    data = string.encode("utf-8")
+    out.append(_U32.pack(len(data)))
+    out.append(data)
+
+
+def _pack_node(out: List[bytes], node: ASTNode) -> None:
+    """ Packs node and the nodes below it, in preorder.
+
+    The tree is walked with an explicit stack, so the depth of the nesting
+    doesn't matter.
+    """
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        header = (node.min, INF if node.max == math.inf else node.max) + (node.span or (-1, -1))
+        if isinstance(node, GroupNode):
+            out.append(_NODE.pack(GROUP, *header))
+            out.append(_GROUP.pack(node.group_id, node.is_capturing()))
+            _pack_str(out, node.group_name)
+            out.append(_U32.pack(len(node.children)))
+        elif isinstance(node, OrNode):
+            out.append(_NODE.pack(OR, *header))
+            out.append(_U32.pack(len(node.children)))
+        elif isinstance(node, RangeElement):
+            out.append(_NODE.pack(RANGE, *header))
+            out.append(_RANGE.pack(node.is_positive_logic, node.ignore_case, len(node.intervals)))
+            out.extend(_INTERVAL.pack(start, end) for start, end in node.intervals)
+            out.append(bytes(node.is_match(ch) for ch in _LATIN1_CHARS))
+        elif isinstance(node, FoldedElement):
+            out.append(_NODE.pack(FOLDED, *header))
+            out.append(_FOLDED.pack(ord(node.match), node.ignore_case))
+        elif isinstance(node, WildcardElement):
+            out.append(_NODE.pack(WILDCARD, *header))
+        elif isinstance(node, SpaceElement):
+            out.append(_NODE.pack(SPACE, *header))
+        elif isinstance(node, Element):
+            out.append(_NODE.pack(ELEMENT, *header))
+            out.append(_U32.pack(ord(node.match)))
+        elif isinstance(node, LiteralElement):
+            out.append(_NODE.pack(LITERAL, *header))
+            _pack_str(out, node.match)
+        elif isinstance(node, StartElement):
+            out.append(_NODE.pack(START, *header))
+        elif isinstance(node, EndElement):
+            out.append(_NODE.pack(END, *header))
+        else:
+            raise Exception("Unable to serialize the node {}.".format(node.__class__.__name__))
+        if isinstance(node, (GroupNode, OrNode)):
+            stack.extend(reversed(node.children))
+
+
+def _pack_prefilter(out: List[bytes], prefilter: Union[Prefilter, None]) -> None:
+    out.append(_U8.pack(prefilter is not None))
+    if prefilter is None:
+        return
+    max_len = INF if prefilter.max_len == math.inf else prefilter.max_len
+    out.append(_PREFILTER.pack(prefilter.min_len, max_len, prefilter.anchored_start, prefilter.anchored_end))
+    _pack_str(out, prefilter.prefix)
+    _pack_str(out, prefilter.required)
+    out.append(_U8.pack(prefilter.first_chars is not None))
+    if prefilter.first_chars is not None:
+        _pack_str(out, "".join(sorted(prefilter.first_chars)))
+
+
+def _pack_pattern(pattern: Pattern) -> bytes:
+    out = [_PATTERN.pack(pattern.ignore_case, ENGINES.index(pattern.engine) + 1 if pattern.engine is not None else 0, pattern.ast.groups_count)]
+    _pack_str(out, pattern.re)
+    _pack_prefilter(out, pattern.prefilter)
+    _pack_node(out, pattern.ast.child)
+    return b"".join(out)
+
+
+def dumps(patterns: Iterable[Pattern]) -> bytes:
+    """ Returns the binary serialization of the patterns."""
+    records = [_pack_pattern(pattern) for pattern in patterns]
+    offset = _HEADER.size + _OFFSET.size * len(records)
+    offsets = []
+    for record in records:
+        offsets.append(_OFFSET.pack(offset))
+        offset += len(record)
+    return b"".join([_HEADER.pack(MAGIC, FORMAT_VERSION, len(records))] + offsets + records)
+
+
+def save(patterns: Iterable[Pattern], path: str) -> None:
+    """ Writes the binary serialization of the patterns into a file."""
+    with open(path, "wb") as file:
+        file.write(dumps(patterns))
+
+
+class _Reader:
+    """ Decoder of the records of a serialized patterns buffer.
+
+    The Latin-1 tables decoded are kept in tables, so that the ranges with
+    the same table, like the many [0-9] of a rules file, share it.
+    """
+
+    def __init__(self, buffer: Union[bytes, mmap.mmap], tables: Dict[bytes, Dict[str, bool]]) -> None:
+        self.buffer: Union[bytes, mmap.mmap] = buffer
+        self.tables: Dict[bytes, Dict[str, bool]] = tables
+        self.pos: int = 0
+
+    def unpack(self, fmt: struct.Struct) -> Tuple:
+        values = fmt.unpack_from(self.buffer, self.pos)
+        self.pos += fmt.size
+        return values
+
+    def read_str(self) -> str:
+        length, = self.unpack(_U32)
+        self.pos += length
+        return str(self.buffer[self.pos - length:self.pos], "utf-8")
+
+    def read_node(self) -> ASTNode:
+        """ Reads a node and the nodes below it, written by _pack_node.
+
+        The groups and the alternations are kept in an explicit stack until
+        all their children are read, so the depth of the nesting doesn't
+        matter.
+        """
+        # the nodes whose children are being read, each one with the number
+        # of its children and the children read so far
+        pending = []
+        while True:
+            node, n_children = self.read_one()
+            if n_children > 0:
+                pending.append((node, n_children, []))
+                continue
+            while pending:
+                parent, n_children, children = pending[-1]
+                children.append(node)
+                if len(children) < n_children:
+                    break
+                pending.pop()
+                parent.children = deque(children) if isinstance(parent, GroupNode) else children
+                node = parent
+            else:
+                return node
+
+    def read_one(self) -> Tuple[ASTNode, int]:
+        """ Reads a node without its children, returning it together with
+        the number of children following it."""
+        n_children = 0
+        kind, min_, max_, span_start, span_end = self.unpack(_NODE)
+        if kind == GROUP:
+            group_id, capturing = self.unpack(_GROUP)
+            group_name = self.read_str()
+            n_children, = self.unpack(_U32)
+            node = GroupNode(deque(), bool(capturing), group_name, group_id)
+        elif kind == OR:
+            n_children, = self.unpack(_U32)
+            node = OrNode([])
+        elif kind == ELEMENT:
+            cp, = self.unpack(_U32)
+            node = Element(chr(cp))
+        elif kind == LITERAL:
+            node = LiteralElement(self.read_str())
+        elif kind == FOLDED:
+            cp, ignore_case = self.unpack(_FOLDED)
+            node = FoldedElement(chr(cp), ignore_case)
+        elif kind == RANGE:
+            is_positive_logic, ignore_case, n_intervals = self.unpack(_RANGE)
+            intervals = [self.unpack(_INTERVAL) for _ in range(n_intervals)]
+            data = self.buffer[self.pos:self.pos + LATIN1_SIZE]
+            self.pos += LATIN1_SIZE
+            table = self.tables.get(data)
+            if table is None:
+                table = self.tables[data] = dict(zip(_LATIN1_CHARS, map(bool, data)))
+            node = RangeElement.from_table(intervals, bool(is_positive_logic), ignore_case, table)
+        elif kind == WILDCARD:
+            node = WildcardElement()
+        elif kind == SPACE:
+            node = SpaceElement()
+        elif kind == START:
+            node = StartElement()
+        elif kind == END:
+            node = EndElement()
+        else:
+            raise Exception("Corrupted pattern file: unknown node kind {}.".format(kind))
+        node.min, node.max = min_, math.inf if max_ == INF else max_
+        if span_start >= 0:
+            node.span = (span_start, span_end)
+        return node, n_children
+
+    def read_pattern(self, offset: int) -> Pattern:
+        self.pos = offset
+        ignore_case, engine, groups_count = self.unpack(_PATTERN)
+        re = self.read_str()
+        prefilter = self.read_prefilter()
+        ast = RE(self.read_node())
+        ast.span = (0, len(re))
+        ast.groups_count = groups_count
+        return Pattern(re, ast, ignore_case, ENGINES[engine - 1] if engine else None, prefilter)
+
+    def read_prefilter(self) -> Union[Prefilter, bool]:
+        present, = self.unpack(_U8)
+        if not present:
+            return False
+        min_len, max_len, anchored_start, anchored_end = self.unpack(_PREFILTER)
+        prefix = self.read_str()
+        required = self.read_str()
+        has_first, = self.unpack(_U8)
+        first_chars = frozenset(self.read_str()) if has_first else None
+        return Prefilter.from_fields(min_len, math.inf if max_len == INF else max_len, prefix, first_chars, required, bool(anchored_start), bool(anchored_end))
+
+
+def _read_offsets(buffer: Union[bytes, mmap.mmap]) -> List[int]:
+    if len(buffer) < _HEADER.size:
+        raise Exception("Not a pattern file.")
+    magic, version, count = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise Exception("Not a pattern file.")
+    if version != FORMAT_VERSION:
+        raise Exception("Unsupported pattern file version {}, expected {}.".format(version, FORMAT_VERSION))
+    return [_OFFSET.unpack_from(buffer, _HEADER.size + i * _OFFSET.size)[0] for i in range(count)]
+
+
+def loads(data: bytes) -> List[Pattern]:
+    """ Returns the patterns serialized by dumps."""
+    reader = _Reader(data, {})
+    return [reader.read_pattern(offset) for offset in _read_offsets(data)]
+
+
+class PatternStore:
+    """ Read-only view of a file written by save.
+
+    The file is mapped in memory, and each pattern is decoded the first time
+    it is accessed, so opening a store costs the same whatever the number of
+    patterns in it.
+    """
+
+    def __init__(self, path: str, cache: bool = False) -> None:
+        """
+        Args:
+            path (str): the path of the file
+            cache (bool): if True the patterns decoded are added to the
+                patterns cache, so that compile and RegexEngine.match find
+                them without parsing the regexes (default is False)
+        """
+        with open(path, "rb") as file:
+            self.__buffer__: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.cache: bool = cache
+        self.__offsets__: List[int] = _read_offsets(self.__buffer__)
+        self.__patterns__: Dict[int, Pattern] = {}
+        self.__tables__: Dict[bytes, Dict[str, bool]] = {}
+
+    def __len__(self) -> int:
+        return len(self.__offsets__)
+
+    def __getitem__(self, i: int) -> Pattern:
+        pattern = self.__patterns__.get(i)
+        if pattern is None:
+            pattern = _Reader(self.__buffer__, self.__tables__).read_pattern(self.__offsets__[i])
+            self.__patterns__[i] = pattern
+            if self.cache:
+                cache_put(pattern)
+        return pattern
+
+    def __iter__(self) -> Iterator[Pattern]:
+        return (self[i] for i in range(len(self)))
+
+    def close(self) -> None:
+        """ Unmaps the file; the patterns already decoded remain usable."""
+        self.__buffer__.close()
+
+    def __enter__(self) -> 'PatternStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def load(path: str, cache: bool = True) -> List[Pattern]:
+    """ Returns all the patterns saved in a file.
+
+    Args:
+        path (str): the path of the file
+        cache (bool): if True the patterns are added to the patterns cache
+            (default is True)
+
+    Returns:
+        List[Pattern]: the patterns, in the order they were saved
+    """
+    with PatternStore(path, cache) as store:
+        return list(store)
@@ -0,0 +1,152 @@
+"""Module containing the streaming search.
+
+finditer_stream searches a regex in a text read piece by piece, from a file
+object or from an iterator of chunks, yielding the matches as soon as they are
+found. The search runs on the automaton of the pattern, whose state doesn't
+depend on the text already scanned, so only the text from the leftmost index
+where a match may still start is kept in memory, and the matches spanning
+two or more chunks are found as well.
+
+Example:
+    Searching a regex in a large file::
+
+        with open("server.log") as log:
+            for matches in finditer_stream(r"connection (refused|reset)", log):
+                print(matches[0].start_idx, matches[0].match)
+"""
+
+
+from collections import deque
+from typing import Deque, Iterable, Iterator, TextIO, Union
+from matcher import Match
+from nfa import matches_from_slots
+from pattern import Pattern, compile
+
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def read_chunks(source: Union[str, TextIO, Iterable[str]], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    """ Returns an iterator over the non-empty chunks of source.
+
+    Args:
+        source (Union[str, TextIO, Iterable[str]]): a string, a text file
+            object, or an iterable of strings
+        chunk_size (int): the number of characters read at once from a file
+            object (default is DEFAULT_CHUNK_SIZE)
+    """
+    if isinstance(source, str):
+        if source:
+            yield source
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        for chunk in source:
+            if chunk:
+                yield chunk
+
+
+def finditer_stream(re: Union[str, Pattern], source: Union[str, TextIO, Iterable[str]], return_groups: bool = True, chunk_size: int = DEFAULT_CHUNK_SIZE, ignore_case: int = 0) -> Iterator[Deque[Match]]:
+    """ Searches all the non-overlapping matches of a regex in a text stream.
+
+    The matches are the same found by searching the automaton in the whole
+    text at once: leftmost-longest, each search starting where the previous
+    match ended (or one character later, after an empty match).
+
+    Args:
+        re (Union[str, Pattern]): the regular expression to search
+        source (Union[str, TextIO, Iterable[str]]): the text, as a string, a
+            text file object, or an iterable of strings
+        return_groups (bool): if False only the whole match is returned and
+            the groups aren't computed (default is True)
+        chunk_size (int): the number of characters read at once from a file
+            object (default is DEFAULT_CHUNK_SIZE)
+        ignore_case (int): the same as in RegexEngine.match; it is ignored
+            when re is a Pattern, whose own flag is used (default is 0)
+
+    Returns:
+        An iterator of deques of Match, one deque per match, with the whole
+        match in the first position followed by the groups matched, with
+        indexes relative to the start of the stream.
+
+    Raises:
+        Exception: if the regex can't be compiled into an automaton
+    """
+    pattern = re if isinstance(re, Pattern) else compile(re, ignore_case)
+    automaton = pattern.get_automaton()
+    if automaton is None:
+        raise Exception("The regex can't be compiled into an automaton, so it can't be streamed.")
+    dfa = automaton.dfa
+    group_names = automaton.prog.group_names
+    chunks = read_chunks(source, chunk_size)
+
+    buf = ''  # the text kept in memory
+    base = 0  # the index of buf[0] in the stream
+    ended = False  # whether the whole stream has been read
+
+    str_i = 0
+    state = dfa.initial(True)
+    starts = [0]
+    best = None
+
+    while True:
+        if str_i - base >= len(buf) and not ended:
+            # drop the text no match can include anymore, and read on; after
+            # an empty match str_i may be one character past the text read
+            keep = min(starts[0] if starts else str_i, best[0] if best else str_i, str_i, base + len(buf))
+            buf = buf[keep - base:]
+            base = keep
+            chunk = next(chunks, None)
+            if chunk is None:
+                ended = True
+                if str_i - base > len(buf):
+                    return
+            else:
+                buf += chunk
+                continue
+
+        if state.accept >= 0:
+            best = (starts[state.accept], str_i)
+            del starts[state.accept + 1:]
+            state = dfa.truncate(state)
+
+        at_end = ended and str_i - base == len(buf)
+        if not at_end and state.sets:
+            ch = buf[str_i - base]
+            transition = state.next.get(ch)
+            if transition is None:
+                transition = dfa.step(state, ch)
+            state, kept, new_start = transition
+            if kept is not None:
+                starts = [starts[i] for i in kept]
+            str_i += 1
+            if new_start:
+                starts.append(str_i)
+            continue
+
+        # the current search is over
+        if at_end and state.sets:
+            accept = dfa.end_accept(state, str_i == 0)
+            if accept >= 0:
+                best = (starts[accept], str_i)
+        if best is None:
+            # either the stream is over, or no thread can ever start again
+            return
+
+        start, end = best
+        if return_groups:
+            slots = automaton.captures(buf, start, end, base, str_i if at_end else -1)
+            yield matches_from_slots(slots, group_names, buf, base)
+        else:
+            yield deque([Match(0, start, end, buf, group_names[0], base)])
+
+        str_i = end if end > start else end + 1
+        if ended and str_i > base + len(buf):
+            return
+        state = dfa.initial(str_i == 0)
+        starts = [str_i]
+        best = None
@@ -0,0 +1,140 @@
+"""Module containing the replacement templates used by RegexEngine.sub.
+
+A template is parsed once into a list of literal strings and group ids, so
+expanding it for each match only joins slices of the test string.
+
+The template syntax is the one of Python's re module:
+
+- \\1, \\2, ... up to \\99 insert the text matched by the group with that id;
+- \\g<id> and \\g<name> insert the text matched by the group with that id or
+  name, \\g<0> inserting the whole match;
+- \\0, which Python reads as an octal escape, is refused rather than read
+  as a reference to the whole match;
+- \\n, \\t, \\r and \\\\ insert a newline, a tab, a carriage return and a
+  backslash;
+
+while the other escapes are kept as they are. The groups that didn't
+take part in the match insert the empty string.
+
+Example:
+    Expanding a template for each match::
+
+        template = Template(r"\\g<key>: \\2", pattern.ast)
+        for matches in reng.finditer(pattern, text):
+            print(template.expand(text, matches))
+"""
+
+
+from typing import Dict, Iterable, List, Union
+from astree import RE, ASTNode, GroupNode
+from matcher import Match
+
+
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', '\\': '\\'}
+# str.isdigit accepts the digits of every script, group ids are ASCII only
+DIGITS = '0123456789'
+
+
+def group_names(ast: Union[RE, ASTNode]) -> Dict[int, str]:
+    """ Returns the name of each capturing group of an AST, by group id."""
+    names = {}
+    nodes = [ast]
+    while nodes:
+        node = nodes.pop()
+        if isinstance(node, GroupNode) and node.is_capturing():
+            names.setdefault(node.group_id, node.group_name)
+        nodes.extend(getattr(node, 'children', ()))
+    return names
+
+
+class Template:
+    """ Parsed replacement template.
+
+    Attributes:
+        parts (List[Union[str, int]]): the literal strings, and the ids of the
+            groups whose text is inserted, in the order they are output
+        uses_groups (bool): whether groups other than the whole match are
+            referenced, thus whether the groups must be computed
+    """
+
+    def __init__(self, repl: str, ast: RE) -> None:
+        names = group_names(ast)
+        ids = {name: group_id for group_id, name in names.items()}
+        self.parts: List[Union[str, int]] = []
+        literal = []
+
+        def add_group(group_id: int) -> None:
+            if group_id not in names:
+                raise Exception("Invalid group reference {}.".format(group_id))
+            if literal:
+                self.parts.append(''.join(literal))
+                literal.clear()
+            self.parts.append(group_id)
+
+        i = 0
+        while i < len(repl):
+            ch = repl[i]
+            i += 1
+            if ch != '\\':
+                literal.append(ch)
+                continue
+            if i == len(repl):
+                raise Exception("Bad escape at the end of the replacement.")
+            ch = repl[i]
+            i += 1
+            if ch in DIGITS:
+                if ch == '0':
+                    raise Exception("Bad escape \\0 in the replacement, use \\g<0> for the whole match.")
+                # at most two digits, as in Python
+                if i < len(repl) and repl[i] in DIGITS:
+                    ch += repl[i]
+                    i += 1
+                add_group(int(ch))
+            elif ch == 'g':
+                end = repl.find('>', i)
+                if i == len(repl) or repl[i] != '<' or end == -1:
+                    raise Exception("Missing group name in the replacement.")
+                name = repl[i + 1:end]
+                i = end + 1
+                if name and all(digit in DIGITS for digit in name):
+                    add_group(int(name))
+                elif name in ids:
+                    add_group(ids[name])
+                else:
+                    raise Exception("Unknown group name '{}'.".format(name))
+            elif ch in ESCAPES:
+                literal.append(ESCAPES[ch])
+            else:
+                literal.append('\\' + ch)
+        if literal:
+            self.parts.append(''.join(literal))
+
+        self.uses_groups: bool = any(type(part) is int and part != 0 for part in self.parts)
+
+    def expand(self, string: str, matches: Iterable[Match]) -> str:
+        """ Returns the replacement of a match.
+
+        Args:
+            string (str): the test string
+            matches (Iterable[Match]): the whole match and the groups
+                matched, as yielded by RegexEngine.finditer
+
+        Returns:
+            str: the template with the group references replaced
+        """
+        groups = {match.group_id: match for match in matches}
+        pieces = []
+        for part in self.parts:
+            if type(part) is str:
+                pieces.append(part)
+            else:
+                match = groups.get(part)
+                if match is not None:
+                    pieces.append(string[match.start_idx:match.end_idx])
+        return ''.join(pieces)
+
+    def expand_span(self, string: str, start: int, end: int) -> str:
+        """ Returns the replacement of a match given its span, when the
+        template doesn't use the groups."""
+        whole = string[start:end]
+        return ''.join(whole if type(part) is int else part for part in self.parts)
@@ -5,6 +5,8 @@ class Token:
 
     def __init__(self) -> None:
         self.char: str = ''
+        # index of the token in the regex, set by the Lexer
+        self.pos: int = -1
     pass
 
     def __repr__(self) -> str:
@@ -241,4 +243,16 @@ class Dash(Token):
 
     def __init__(self):
         super().__init__()
-        self.char = '-'
\ No newline at end of file
+        self.char = '-'
+
+# kinds of the tokens in the compact stream produced by Lexer.tokenize
+ELEMENT, WILDCARD, SPACE, START, END, COMMA, LEFT_PARENTHESIS, RIGHT_PARENTHESIS, \
+    LEFT_CURLY_BRACE, RIGHT_CURLY_BRACE, LEFT_SQUARE_BRACKET, RIGHT_SQUARE_BRACKET, \
+    ASTERISK, PLUS, QUESTION_MARK, VERTICAL_BAR, CIRCUMFLEX, DASH = range(18)
+
+# the Token class of each kind
+TOKEN_CLASSES = [ElementToken, Wildcard, SpaceToken, Start, End, Comma, LeftParenthesis, RightParenthesis,
+                 LeftCurlyBrace, RightCurlyBrace, LeftSquareBracket, RightSquareBracket,
+                 Asterisk, Plus, QuestionMark, VerticalBar, Circumflex, Dash]
+
+QUANTIFIERS = (ASTERISK, PLUS, QUESTION_MARK)
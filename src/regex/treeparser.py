@@ -1,4 +1,4 @@
-from typing import Union, Callable
+from typing import Deque, List, Tuple, Union
 import itertools
 import math
 from lexer import Lexer
@@ -6,18 +6,51 @@ from tokens import *
 from astree import *
 import logging
 
-logging.basicConfig(level=logging.DEBUG, format='[%(levelname)s] - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+class _OpenGroup:
+    """ A group whose closing parenthesis hasn't been parsed yet.
+
+    Attributes:
+        capturing (bool): whether the group is capturing
+        group_name (str): its name, None for the default one
+        group_id (int): its id, None until it is given
+        start_pos (int): the position of its opening parenthesis
+        alternatives (List[GroupNode]): the alternatives parsed so far
+        elements (Deque[ASTNode]): the children of the alternative being
+            parsed
+        seq_pos (int): the position where that alternative starts
+        match_start (bool): whether that alternative starts with '^'
+    """
+
+    __slots__ = ("capturing", "group_name", "group_id", "start_pos", "alternatives", "elements", "seq_pos", "match_start")
+
+    def __init__(self, capturing: bool, group_name: Union[str, None], start_pos: int) -> None:
+        self.capturing: bool = capturing
+        self.group_name: Union[str, None] = group_name
+        self.group_id: Union[int, None] = None
+        self.start_pos: int = start_pos
+        self.alternatives: List[GroupNode] = []
+        self.elements: Deque[ASTNode] = deque()
+        self.seq_pos: int = start_pos
+        self.match_start: bool = False
+
 
 class Parser:
     """ Regular Expression Parser.
 
-    Parser instances can parse regular expressions and return the corresponding AST.    
+    Parser instances can parse regular expressions and return the corresponding AST.
+
+    When trace is True every parsing step is logged, at DEBUG level, to the
+    "treeparser" logger. Tracing is off by default, and then costs nothing.
     """
 
-    def __init__(self) -> None:
+    def __init__(self, trace: bool = False) -> None:
         self.lxr: Lexer = Lexer()
+        self.trace: bool = trace
 
-    def parse(self, re: str) -> RE:
+    def parse(self, re: str, ignore_case: int = 0) -> RE:
         """ Parses a regular expression.
 
         Parses a regex and returns the corresponding AST.
@@ -25,186 +58,192 @@ class Parser:
 
         Args:
             re (str): a regular expression
+            ignore_case (int): when set the characters and the ranges of the
+                regex match regardless of the case, see RegexEngine.match
+                (default is 0)
 
         Returns:
             RE: the root node of the regular expression's AST
         """
-
-        def get_range_str(start: str, end: str) -> str:
-            """
-            Parse range elements ([a-m|0-3]) to get the number/letters 
-            contained in a given range.
-            """
-            logging.info("Range elements detected, generating range...")
-
-            result = []
-            i = ord(start)
-            while i <= ord(end):
-                result.append(chr(i))
-                i += 1
-            
-            logging.info("Range string generated: %s", result)
-            return "".join(result)
-
-        def next_tkn_initializer(re: str) -> Callable[[bool], Union[Token, None]]:
+        trace = self.trace
+
+        if trace:
+            logger.debug("Tokenizing...")
+        stream = self.lxr.tokenize(re=re)
+        if trace:
+            logger.debug("Tokenizing done.")
+        kinds, chars, positions = stream.kinds, stream.chars, stream.positions
+        n_tokens = len(kinds)
+
+        # the current token: its index in the stream, kind, char and position
+        # in the regex; kind is None when there are no more tokens
+        i = -1
+        kind: Union[int, None] = None
+        char: Union[str, None] = None
+        pos: int = len(re)
+
+        def next_tkn() -> None:
             """ Set the current token to the next one to parse."""
-            logging.info("Tokenizing...")
-            tokens = self.lxr.scan(re=re)
-            logging.info("Tokenizing done, initializing next_tkn...")
-
-            i = -1
-
-            def next_tkn(without_consuming: bool = False) -> Union[Token, None]:
-                """
-                Args:
-                    `without_consuming` (bool): if True, returns the next token without consuming it
-
-                Returns:
-                    Token: the next token to parse or None if there are no more tokens
-                """                
-                nonlocal i
-                nonlocal tokens
-                nonlocal curr_tkn
-
-                if without_consuming:
-                    if len(tokens) > i + 1:
-                        logging.info("Current token is %s (Not consumed)", tokens[i+1])
-                        return tokens[i+1]
-                    else:
-                        logging.info("No more tokens")
-                        return None
-
-                i += 1
-                if i < len(tokens):
-                    logging.info("Current token is %s (Consumed)", tokens[i])
-                    curr_tkn = tokens[i]
-                else:
-                    logging.info("No more tokens")
-                    curr_tkn = None
-
-            return next_tkn
-
-        def parse_re() -> RE:
-            return RE(parse_re_seq())
-
-        def parse_re_seq(capturing: bool = True, group_name: str = None, group_id: int = None) -> Union[OrNode, GroupNode]:
-            """ Parse sequences of regular expressions separated by the OR operator (|). """
-            logging.info("Parsing RE_SEQ...")
-
-            match_start, match_end = False, False
-            if type(curr_tkn) is Start or type(curr_tkn) is Circumflex:
-                logging.info("Start token detected")
+            nonlocal i, kind, char, pos
+            i += 1
+            if i < n_tokens:
+                kind, char, pos = kinds[i], chars[i], positions[i]
+                if trace:
+                    logger.debug("Current token is %s: %s (Consumed)", char, TOKEN_CLASSES[kind].__name__)
+            else:
+                kind, char, pos = None, None, len(re)
+                if trace:
+                    logger.debug("No more tokens")
+
+        def peek() -> Union[int, None]:
+            """ Returns the kind of the next token without consuming it, or
+            None if there are no more tokens."""
+            return kinds[i + 1] if i + 1 < n_tokens else None
+
+        def begin_alternative(group: _OpenGroup) -> None:
+            """ Starts parsing an alternative of a group (RE_SEQ). """
+            if trace:
+                logger.debug("Parsing RE_SEQ...")
+
+            group.seq_pos = pos
+            group.match_start = False
+            if kind == START or kind == CIRCUMFLEX:
+                if trace:
+                    logger.debug("Start token detected")
                 next_tkn()
-                match_start = True
-
-            node = parse_group(capturing=capturing, group_name=group_name, group_id=group_id)
-
-            if isinstance(curr_tkn, EndToken):
-                logging.info("End token detected")
+                group.match_start = True
+
+            if trace:
+                logger.debug("Parsing GROUP...")
+            if group.group_id is None:
+                group.group_id = next(groups_counter)
+            group.elements = deque()
+
+        def end_alternative(group: _OpenGroup) -> None:
+            """ Ends the alternative being parsed, turning it into a GroupNode. """
+            match_end = False
+            if kind == END:
+                if trace:
+                    logger.debug("End token detected")
+                end_pos = pos
                 next_tkn()
                 match_end = True
-            else:
-                match_end = False
 
-            if match_start:
+            node = GroupNode(children=group.elements, capturing=group.capturing,
+                             group_name=group.group_name, group_id=group.group_id)
+            if group.match_start:
                 node.children.appendleft(StartElement())
+                node.children[0].span = (group.seq_pos, group.seq_pos + 1)
             if match_end:
                 node.children.append(EndElement())
+                node.children[-1].span = (end_pos, end_pos + 1)
+            node.span = (group.seq_pos, pos)
+            # the next alternatives share the name of the first one
+            group.group_name = node.group_name
+            group.alternatives.append(node)
+
+        def add_element(group: _OpenGroup, new_el: ASTNode, start_pos: int) -> None:
+            """ Adds an element to the alternative being parsed, along with
+            its quantifier. """
+            next_tkn()
 
-            if isinstance(curr_tkn, OrToken):
-                next_tkn()
-                node = OrNode(left=node, right=parse_re_seq(
-                    group_name=node.group_name, group_id=node.group_id))
-
-            return node
-
-        def parse_group(capturing: bool = True, group_name: str = None, group_id: int = None) -> GroupNode:
-            
-            logging.info("Parsing GROUP...")
-
-            nonlocal groups_counter
-            if group_id is None:
-                group_id = next(groups_counter)
-
-            elements = deque()  # holds the children of the GroupNode
-
-            while curr_tkn is not None and not isinstance(curr_tkn, OrToken) and \
-                    not isinstance(curr_tkn, RightParenthesis) and \
-                    not isinstance(curr_tkn, EndToken):
-                new_el = parse_range_el()
+            if kind in QUANTIFIERS:
+                if kind == QUESTION_MARK:
+                    new_el.min, new_el.max = 0, 1
+                elif kind == ASTERISK:
+                    new_el.min, new_el.max = 0, math.inf
+                else:
+                    new_el.min, new_el.max = 1, math.inf
                 next_tkn()
+            elif kind == LEFT_CURLY_BRACE:
+                parse_curly(new_el)
 
-                if isinstance(curr_tkn, EndToken):
-                    elements.append(new_el)
-                    break
+            # the span includes the quantifier
+            new_el.span = (start_pos, pos)
+            group.elements.append(new_el)
 
-                if isinstance(curr_tkn, Quantifier):
-                    if isinstance(curr_tkn, ZeroOrOne):
-                        new_el.min, new_el.max = 0, 1
-                    elif isinstance(curr_tkn, ZeroOrMore):
-                        new_el.min, new_el.max = 0, math.inf
+        def parse_re() -> RE:
+            """ Parses the regex with an explicit stack of the open groups, so
+            that neither the alternatives nor the nesting depth recurse. """
+            group = _OpenGroup(capturing=True, group_name=None, start_pos=0)
+            open_groups = []
+            begin_alternative(group)
+
+            while True:
+                while kind is not None and kind != VERTICAL_BAR and kind != RIGHT_PARENTHESIS and kind != END:
+                    start_pos = pos
+                    if kind == LEFT_PARENTHESIS:
+                        capturing, group_name = parse_group_start()
+                        open_groups.append(group)
+                        group = _OpenGroup(capturing=capturing, group_name=group_name, start_pos=start_pos)
+                        begin_alternative(group)
                     else:
-                        new_el.min, new_el.max = 1, math.inf
+                        add_element(group, parse_range_el(), start_pos)
+
+                end_alternative(group)
+                if kind == VERTICAL_BAR:
                     next_tkn()
-                elif isinstance(curr_tkn, LeftCurlyBrace):
-                    parse_curly(new_el)
+                    begin_alternative(group)
+                    continue
 
-                elements.append(new_el)
+                alternatives = group.alternatives
+                if len(alternatives) == 1:
+                    node = alternatives[0]
+                else:
+                    node = OrNode(children=alternatives)
+                    node.span = (alternatives[0].span[0], alternatives[-1].span[1])
 
-            return GroupNode(children=elements, capturing=capturing, group_name=group_name, group_id=group_id)
+                if not open_groups:
+                    return RE(node)
+                if kind != RIGHT_PARENTHESIS:
+                    raise Exception("Missing closing group parenthesis ')'.")
+                # the closing parenthesis is consumed by add_element
+                start_pos = group.start_pos
+                group = open_groups.pop()
+                add_element(group, node, start_pos)
 
         def parse_curly(new_el: ASTNode) -> None:
-            logging.info("Parsing range quantifiers...")
+            if trace:
+                logger.debug("Parsing range quantifiers...")
             # move past the left brace
             next_tkn()
 
             # find val_1, val_2
             val_1, val_2 = '', ''
-            try:
-                while isinstance(curr_tkn, ElementToken):
-                    val_1 += curr_tkn.char
-                    next_tkn()
-                if val_1 == '':
-                    val_1 == 0
-                else:
-                    val_1 = int(val_1)
-
-                if isinstance(curr_tkn, RightCurlyBrace):
-                    # case {exact}
-                    if type(val_1) is int:
-                        new_el.min, new_el.max = val_1, val_1
-                        logging.info("Exact quantifier detected: %s", val_1)
-                        next_tkn()  # skip the closing brace
-                        return
-                    else:
-                        raise Exception("Invalid curly brace syntax.")
-
-                next_tkn() # skip comma
-                while isinstance(curr_tkn, ElementToken):
-                    val_2 += curr_tkn.char
-                    next_tkn()
-                if val_2 == '':
-                    val_2 == math.inf
-                else:
-                    val_2 = int(val_2)
+            while kind == ELEMENT:
+                val_1 += char
+                next_tkn()
 
+            if kind == RIGHT_CURLY_BRACE:
+                # case {exact}
+                if val_1 == '':
+                    raise Exception("Invalid curly brace syntax.")
+                new_el.min, new_el.max = int(val_1), int(val_1)
+                if trace:
+                    logger.debug("Exact quantifier detected: %s", val_1)
                 next_tkn()  # skip the closing brace
+                return
 
-                new_el.min = val_1 if type(val_1) is int else 0
-                new_el.max = val_2 if type(val_2) is int else math.inf
+            next_tkn()  # skip comma
+            while kind == ELEMENT:
+                val_2 += char
+                next_tkn()
+            next_tkn()  # skip the closing brace
 
-                logging.info("Range quantifier detected: %s, %s", val_1, val_2)
+            new_el.min = int(val_1) if val_1 != '' else 0
+            new_el.max = int(val_2) if val_2 != '' else math.inf
 
-            except Exception as e:
-                raise Exception("Invalid curly brace syntax.")
+            if trace:
+                logger.debug("Range quantifier detected: %s, %s", val_1, val_2)
 
         def parse_range_el() -> ASTNode:
-            logging.info("Parsing RANGE_EL...")
+            if trace:
+                logger.debug("Parsing RANGE_EL...")
 
-            if isinstance(curr_tkn, LeftSquareBracket):
+            if kind == LEFT_SQUARE_BRACKET:
                 next_tkn()
                 element = parse_inner_el()
-                if isinstance(curr_tkn, RightSquareBracket):
+                if kind == RIGHT_SQUARE_BRACKET:
                     return element
                 else:
                     raise Exception(
@@ -215,115 +254,123 @@ class Parser:
         def parse_inner_el() -> RangeElement:
             """ Creates a single RangeElement with all the matches"""
 
-            logging.info("Parsing INNER_EL...")
+            if trace:
+                logger.debug("Parsing INNER_EL...")
 
-            nonlocal curr_tkn
-            match_str = ''
-            if curr_tkn is None:
+            # inclusive intervals of code points
+            intervals = []
+            if kind is None:
                 raise Exception(
                     "Missing closing ']'.")
 
             positive_logic = True
-            if isinstance(curr_tkn, NotToken):
-                logging.info("Circumflex detected (negative logic)")
+            if kind == CIRCUMFLEX:
+                if trace:
+                    logger.debug("Circumflex detected (negative logic)")
                 positive_logic = False
                 next_tkn()
 
-            prev_char = None
-            while curr_tkn is not None:
-                if isinstance(curr_tkn, RightSquareBracket):
+            while kind is not None:
+                if kind == RIGHT_SQUARE_BRACKET:
                     # End of Range
                     break
 
-                if isinstance(curr_tkn, SpaceToken):
-                    match_str += curr_tkn.char
+                if kind == SPACE:
+                    intervals.extend((ord(ch), ord(ch)) for ch in char)
                     next_tkn()
                     continue
 
                 # every character inside it must be treated as an element
-                if not isinstance(curr_tkn, ElementToken):
-                    curr_tkn = ElementToken(char=curr_tkn.char)
-
-                if next_tkn(without_consuming=True) is None:
+                next_kind = peek()
+                if next_kind is None:
                     raise Exception("Missing closing ']'.")
-                elif isinstance(next_tkn(without_consuming=True), Dash):
+                elif next_kind == DASH:
                     # it may be a range (like a-z, A-M, 0-9, ...)
-                    prev_char = curr_tkn.char
+                    prev_char = char
                     next_tkn()  # current token is now the Dash
-                    if isinstance(next_tkn(without_consuming=True), RightSquareBracket) or isinstance(next_tkn(without_consuming=True), SpaceToken):
+                    next_kind = peek()
+                    if next_kind == RIGHT_SQUARE_BRACKET or next_kind == SPACE:
                         # we're in one of these scenarios: "<char>-]" "<char>-\s"
                         # the dash and previous character must be interpreted as single elements
-                        match_str += prev_char + curr_tkn.char
+                        intervals.append((ord(prev_char), ord(prev_char)))
+                        intervals.append((ord(char), ord(char)))
                     else:
-                        # we're in the case of an actual range (or next_tkn is none)
-                        next_tkn()  # curr_tkn is now the one after the dash
-                        if next_tkn is None:
+                        # we're in the case of an actual range
+                        next_tkn()  # the current token is now the one after the dash
+                        if kind is None:
                             raise Exception("Missing closing ']'.")
-                        elif ord(prev_char) > ord(curr_tkn.char):
+                        elif ord(prev_char) > ord(char):
                             raise Exception(
-                                f"Range values reversed. Start '{prev_char}' char code is greater than end '{curr_tkn.char}' char code.")
+                                f"Range values reversed. Start '{prev_char}' char code is greater than end '{char}' char code.")
                         else:
-                            match_str += get_range_str(prev_char,
-                                                       curr_tkn.char)
+                            if trace:
+                                logger.debug("Range detected: %s-%s", prev_char, char)
+                            intervals.append((ord(prev_char), ord(char)))
                 else:
-                    # no range, no missing ']', just a char to add to match_str
-                    match_str += curr_tkn.char
+                    # no range, no missing ']', just a char to add to the intervals
+                    intervals.append((ord(char), ord(char)))
                 next_tkn()
 
-            logging.info(f"Match string: {match_str} with {'positive' if positive_logic else 'negative'} logic.")
-            return RangeElement(match_str="".join(sorted(set(match_str))), is_positive_logic=positive_logic)
+            if trace:
+                logger.debug("Match intervals: %s with %s logic.", intervals, 'positive' if positive_logic else 'negative')
+            return RangeElement(intervals=intervals, is_positive_logic=positive_logic, ignore_case=ignore_case)
 
-        def parse_el() -> Union[Element, OrNode, GroupNode]:
+        def parse_el() -> Element:
             """ Parses an EL (element). """
-            logging.info("Parsing EL...")
-
-            group_name: Union[str, None] = None
-
-            if isinstance(curr_tkn, ElementToken):
-                return Element(match_ch=curr_tkn.char)
-            elif isinstance(curr_tkn, Wildcard):
+            if trace:
+                logger.debug("Parsing EL...")
+
+            if kind == ELEMENT:
+                if ignore_case:
+                    return FoldedElement(match_ch=char, ignore_case=ignore_case)
+                return Element(match_ch=char)
+            elif kind == WILDCARD:
                 return WildcardElement()
-            elif isinstance(curr_tkn, SpaceToken):
+            elif kind == SPACE:
                 return SpaceElement()
-            elif isinstance(curr_tkn, LeftParenthesis):
+            else:
+                raise Exception(
+                    "Unescaped special character {}.".format(char))
+
+        def parse_group_start() -> Tuple[bool, Union[str, None]]:
+            """ Parses the opening of a group, returning whether it is
+            capturing and its name. """
+            if trace:
+                logger.debug("Parsing EL...")
+
+            group_name: Union[str, None] = None
+            next_tkn()
+            capturing = True
+            # (?: for non-capturing group
+            if kind == QUESTION_MARK:
                 next_tkn()
-                capturing = True
-                # (?: for non-capturing group
-                if type(curr_tkn) is QuestionMark:
+                if char == ':':
+                    if trace:
+                        logger.debug("Non-capturing group detected.")
+                    capturing = False
                     next_tkn()
-                    if curr_tkn.char == ':':
-                        logging.info("Non-capturing group detected.")
-                        capturing = False
-                        next_tkn()
-                    elif curr_tkn.char == '<':
-                        next_tkn()
-                        group_name = parse_group_name()
-                        logging.info(f"Named group detected: {group_name}")
-                    else:
-                        if curr_tkn is None:
-                            raise Exception("Unterminated group.")
-                        else:
-                            raise Exception(
-                                f"Invalid group: '{{?{curr_tkn.char}}}'.")
-                res = parse_re_seq(capturing=capturing, group_name=group_name)
-                if isinstance(curr_tkn, RightParenthesis):
-                    # next_tkn() not needed (parse_group's while loop will eat the parenthesis)
-                    return res
+                elif char == '<':
+                    next_tkn()
+                    group_name = parse_group_name()
+                    if trace:
+                        logger.debug("Named group detected: %s", group_name)
                 else:
-                    raise Exception("Missing closing group parenthesis ')'.")
-            else:
-                raise Exception(
-                    "Unescaped special character {}.".format(curr_tkn.char))
+                    if kind is None:
+                        raise Exception("Unterminated group.")
+                    else:
+                        raise Exception(
+                            f"Invalid group: '{{?{char}}}'.")
+            return capturing, group_name
 
         def parse_group_name() -> str:
             """ Parses a group name. """
-            if curr_tkn is None:
+            if kind is None:
                 raise Exception("Unterminated named group name.")
             group_name = ''
-            while curr_tkn.char != '>':
-                group_name += curr_tkn.char
+            while char != '>':
+                group_name += char
                 next_tkn()
-                if curr_tkn is None:
+                if kind is None:
                     raise Exception("Unterminated named group name.")
             if len(group_name) == 0:
                 raise Exception("Unexpected empty named group name.")
@@ -332,16 +379,12 @@ class Parser:
 
         groups_counter = itertools.count(start=0)
 
-        curr_tkn = None
-        next_tkn = next_tkn_initializer(re)
         next_tkn()
 
         ast = parse_re()
-        if curr_tkn is not None:
+        ast.span = (0, len(re))
+        if kind is not None:
             raise Exception(
                 "Unable to parse the regex.")
+        ast.groups_count = next(groups_counter)
         return ast
-
-
-parser  = Parser()
-ast = parser.parse(r"a{1,9}")
\ No newline at end of file
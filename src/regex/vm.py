@@ -0,0 +1,400 @@
+"""Module containing the backtracking virtual machine.
+
+The BacktrackingVM runs the flat instruction list compiled from the AST (see
+nfa.Program) in a single loop driven by an explicit stack, so neither the
+pattern nor the test string affect the recursion depth, and the only
+allocations of a search are its stack and its capture slots: the visited
+states are recorded in a memo kept by the machine between searches, which
+grows with the part of the string the search explores, and is trimmed back
+to KEPT_MEMO_SIZE when the search ends.
+
+Each (instruction, string index) state is executed at most once per search:
+the states reached again can't lead to a match not found already, so the
+search time is bounded by the program size times the string length, even for
+the patterns that make a naive backtracker explode. The memo holds up to
+MAX_MEMO_SIZE states: past it, it only records the states of a window of the
+string indexes following the index tried, and the states out of the window
+go to a set cleared when the window moves, so they may be executed again for
+another start index, which costs time but doesn't change the result.
+
+The machine follows the same leftmost-longest rule as the automaton, and
+among the ways of matching the longest string it picks the one preferring
+greedy quantifiers and left alternatives, so it returns the same groups too.
+
+Example:
+    Searching a regex with the virtual machine::
+
+        vm = BacktrackingVM(compile_program(Parser().parse(r"(a|ab)(c|bcd)")))
+        res, consumed, matches = vm.search("abcd", 0)
+"""
+
+
+import ast
+import inspect
+import math
+import textwrap
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional, Tuple, Union
+from matcher import Match
+from nfa import Program, CHAR, PRED, BRANCH, SPLIT, JMP, SAVE, ASSERT_START, ASSERT_END, matches_from_slots, spans_from_slots
+from prefilter import Prefilter
+
+
+# number of steps between two checks of the deadline
+CHECK_INTERVAL = 1024
+# number of (instruction, string index) states recorded by the memo of a
+# search, one byte each
+MAX_MEMO_SIZE = 1 << 22
+# size the memos are trimmed to when kept for the next searches
+KEPT_MEMO_SIZE = 1 << 16
+# the memo is cleared when its stamps wrap around
+MAX_STAMP = 255
+
+
+class MatchLimitExceeded(Exception):
+    """ Raised when a match takes more steps, or more time, than allowed.
+
+    Attributes:
+        steps (int): the number of steps taken when the match was stopped
+    """
+
+    def __init__(self, message: str, steps: int) -> None:
+        super().__init__(message)
+        self.steps: int = steps
+
+
+class MatchLimits:
+    """ Step budget and deadline of a match.
+
+    A step is an instruction executed by the virtual machine, or a node
+    visited by the AST matcher. The same limits are shared by all the
+    searches run by a RegexEngine.match call.
+    """
+
+    __slots__ = ("max_steps", "deadline", "steps")
+
+    def __init__(self, max_steps: int = None, timeout: float = None) -> None:
+        self.max_steps: Optional[int] = max_steps
+        # in time.monotonic() seconds
+        self.deadline: Optional[float] = time.monotonic() + timeout if timeout is not None else None
+        self.steps: int = 0
+
+    def next_check(self) -> Union[int, float]:
+        """ Returns the number of steps at which check must be called."""
+        limit = self.max_steps + 1 if self.max_steps is not None else math.inf
+        if self.deadline is not None:
+            limit = min(limit, self.steps + CHECK_INTERVAL)
+        return limit
+
+    def check(self, steps: int) -> Union[int, float]:
+        """ Records the steps taken so far, raises MatchLimitExceeded if a
+        limit is exceeded, and otherwise returns the next check point."""
+        self.steps = steps
+        if self.max_steps is not None and steps > self.max_steps:
+            raise MatchLimitExceeded("Step budget of {} exceeded.".format(self.max_steps), steps)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise MatchLimitExceeded("Deadline exceeded after {} steps.".format(steps), steps)
+        return self.next_check()
+
+
+class _Memo:
+    """ States visited by the searches of a BacktrackingVM.
+
+    The slots of a string index are a row of one slot per instruction, and
+    the rows are added as the search reaches further indexes. Each search,
+    and each move of its window, takes a new stamp, and the slots of the
+    states visited since hold it, so the memo is only cleared when the
+    stamps wrap around.
+    """
+
+    __slots__ = ("slots", "stamp")
+
+    def __init__(self) -> None:
+        self.slots: bytearray = bytearray()
+        self.stamp: int = 0
+
+    def next_stamp(self) -> int:
+        """ Returns a stamp held by none of the slots."""
+        if self.stamp == MAX_STAMP:
+            self.slots[:] = bytes(len(self.slots))
+            self.stamp = 0
+        self.stamp += 1
+        return self.stamp
+
+    def grow(self, rows: int, max_rows: int, row_size: int) -> int:
+        """ Grows the memo, in place, to hold at least rows rows, and at most
+        max_rows, doubling its rows to keep the growth amortized. Returns
+        the number of rows held."""
+        held = len(self.slots) // row_size
+        rows = min(max_rows, max(rows, 2 * held))
+        self.slots.extend(bytes((rows - held) * row_size))
+        return rows
+
+    def trim(self) -> None:
+        """ Shrinks the memo to KEPT_MEMO_SIZE slots at most."""
+        if len(self.slots) > KEPT_MEMO_SIZE:
+            del self.slots[KEPT_MEMO_SIZE:]
+
+
+class StepCounters:
+    """ Work done by the searches of a BacktrackingVM, see search_slots.
+
+    Attributes:
+        steps (List[int]): the times each instruction was executed
+        pops (List[int]): the alternatives pushed by each SPLIT that were
+            taken back from the stack, i.e. the backtracks
+        retries (int): the start indexes tried
+    """
+
+    __slots__ = ("steps", "pops", "retries")
+
+    def __init__(self, size: int) -> None:
+        self.steps: List[int] = [0] * size
+        self.pops: List[int] = [0] * size
+        self.retries: int = 0
+
+
+class BacktrackingVM:
+    """ Backtracking matcher of a compiled Program."""
+
+    def __init__(self, prog: Program, prefilter: Prefilter = None) -> None:
+        self.prog: Program = prog
+        self.prefilter: Optional[Prefilter] = prefilter
+        # the memos not in use, each search taking one so that the searches
+        # running at the same time in different threads don't share it
+        self.__memos__: List[_Memo] = []
+
+    def search_slots(self, string: str, start_str_i: int = 0, limits: MatchLimits = None, counters: StepCounters = None) -> Optional[List[int]]:
+        """ Finds the leftmost-longest match starting at or after start_str_i.
+
+        If limits are passed, the steps taken are added to them, and
+        MatchLimitExceeded is raised when they are exceeded. If counters are
+        passed, the work done is added to them.
+
+        Returns:
+            The capture slots of the match, where slots 0 and 1 hold its start
+            and end, or None if there is no match.
+        """
+        if counters is None:
+            return self.__search_plain__(string, start_str_i, limits, None)
+        return self.__search_counting__(string, start_str_i, limits, counters)
+
+    def __search__(self, string: str, start_str_i: int, limits: Optional[MatchLimits], counters: Optional[StepCounters]) -> Optional[List[int]]:
+        """ The search loop of search_slots, never run as it is: the code
+        guarded by counting is kept or dropped by _specialize, building a
+        loop for each case."""
+        ops, args, outs = self.prog.ops, self.prog.args, self.prog.outs
+        size = len(self.prog)
+        prefilter = self.prefilter
+        str_len = len(string)
+        width = str_len + 1
+        slots = [-1] * max(2, 2 * self.prog.n_groups)
+
+        # the states visited while trying an index, that can't lead to a match
+        # when the index doesn't match, so they are kept for the next indexes;
+        # only the rows string indexes from lo are recorded, the state
+        # (pc, str_i) in slot (str_i - lo) * size + pc, and the memo holds the
+        # first held of them, growing when the search goes past them
+        lo = start_str_i
+        rows = min(width - lo, max(1, MAX_MEMO_SIZE // size))
+        try:
+            memo = self.__memos__.pop()
+        except IndexError:
+            memo = _Memo()
+        stamp = memo.next_stamp()
+        visited = memo.slots
+        held = min(rows, len(visited) // size)
+        # the states past the window, so that a path can't loop forever on
+        # them
+        overflow = set()
+        # flat stack of (pc, str_i) pairs; a negative pc -k marks the undo of
+        # a save, and str_i is then the previous value of the slot k - 1; when
+        # counting, a SPLIT at pc pushes its alternative as pc + size, so
+        # that the pop is counted there
+        stack = []
+        counting = counters is not None
+        if counting:
+            step_counts, pop_counts = counters.steps, counters.pops
+
+        steps = limits.steps if limits is not None else 0
+        next_check = limits.next_check() if limits is not None else math.inf
+
+        best_end = -1
+        best_slots = None
+        start = start_str_i
+        while start <= str_len:
+            if prefilter is not None:
+                start = prefilter.next_candidate(string, start)
+                if start == -1:
+                    break
+            if lo + rows < width and start - lo >= rows >> 1:
+                # the states before start are no use anymore
+                lo = start
+                stamp = memo.next_stamp()
+                overflow.clear()
+            if counting:
+                counters.retries += 1
+
+            stack.append(0)
+            stack.append(start)
+            while stack:
+                str_i = stack.pop()
+                pc = stack.pop()
+                if pc < 0:
+                    slots[-pc - 1] = str_i
+                    continue
+                if counting and pc >= size:
+                    pc -= size
+                    pop_counts[pc] += 1
+                    pc = args[pc]
+                while True:
+                    offset = str_i - lo
+                    if held <= offset < rows:
+                        held = memo.grow(offset + 1, rows, size)
+                    if offset < held:
+                        slot = offset * size + pc
+                        if visited[slot] == stamp:
+                            break
+                        visited[slot] = stamp
+                    else:
+                        state = pc * width + str_i
+                        if state in overflow:
+                            break
+                        overflow.add(state)
+                    steps += 1
+                    if steps >= next_check:
+                        next_check = limits.check(steps)
+                    if counting:
+                        step_counts[pc] += 1
+                    op = ops[pc]
+                    if op == CHAR:
+                        if str_i < str_len and string[str_i] == args[pc]:
+                            pc = outs[pc]
+                            str_i += 1
+                            continue
+                        break
+                    if op == PRED:
+                        if str_i < str_len and args[pc](string[str_i]):
+                            pc = outs[pc]
+                            str_i += 1
+                            continue
+                        break
+                    if op == BRANCH:
+                        if str_i < str_len:
+                            target = args[pc].get(string[str_i])
+                            if target is not None:
+                                pc = target
+                                str_i += 1
+                                continue
+                        break
+                    if op == SPLIT:
+                        # the alternative is tried after the preferred path
+                        stack.append(pc + size if counting else args[pc])
+                        stack.append(str_i)
+                        pc = outs[pc]
+                    elif op == JMP:
+                        pc = outs[pc]
+                    elif op == SAVE:
+                        slot = args[pc]
+                        stack.append(-slot - 1)
+                        stack.append(slots[slot])
+                        slots[slot] = str_i
+                        pc = outs[pc]
+                    elif op == ASSERT_START:
+                        if str_i != 0:
+                            break
+                        pc = outs[pc]
+                    elif op == ASSERT_END:
+                        if str_i != str_len:
+                            break
+                        pc = outs[pc]
+                    else:
+                        # MATCH: the paths explored first are preferred among
+                        # the ones matching the same length
+                        if str_i > best_end:
+                            best_end = str_i
+                            best_slots = slots[:]
+                        break
+
+            if best_slots is not None:
+                break
+            start += 1
+
+        memo.trim()
+        self.__memos__.append(memo)
+        if limits is not None:
+            limits.steps = steps
+        if best_slots is None:
+            return None
+        best_slots[0], best_slots[1] = start, best_end
+        return best_slots
+
+    # the loop with and without the counting, so that the searches without
+    # counters don't check for them at each step
+    __search_plain__: Callable
+    __search_counting__: Callable
+
+    def search(self, string: str, start_str_i: int = 0, return_matches: bool = True, limits: MatchLimits = None, index_only: bool = False) -> Tuple[bool, int, Deque[Match]]:
+        """ Searches the regex in string starting from start_str_i.
+
+        Returns the same tuple returned by Automaton.search.
+        """
+        slots = self.search_slots(string, start_str_i, limits)
+        if slots is None:
+            return False, len(string), deque()
+        if not return_matches:
+            return True, slots[1], deque()
+        if index_only:
+            return True, slots[1], spans_from_slots(slots)
+        return True, slots[1], matches_from_slots(slots, self.prog.group_names, string)
+
+
+class _Specialize(ast.NodeTransformer):
+    """ Rewrites the source of a function for a constant value of its
+    counting variable, dropping the statements and the branches it rules
+    out."""
+
+    def __init__(self, counting: bool) -> None:
+        self.counting: bool = counting
+
+    def __fold__(self, test: ast.expr) -> Union[bool, ast.expr]:
+        """ Returns the value of test, counting being replaced with its
+        value, or the part of test left to evaluate."""
+        if isinstance(test, ast.Name) and test.id == "counting":
+            return self.counting
+        if isinstance(test, ast.BoolOp) and isinstance(test.op, ast.And) and self.__fold__(test.values[0]) is self.counting:
+            if not self.counting:
+                return False
+            rest = test.values[1:]
+            return rest[0] if len(rest) == 1 else ast.BoolOp(ast.And(), rest)
+        return test
+
+    def __branch__(self, node: Union[ast.If, ast.IfExp]) -> Union[ast.AST, List[ast.stmt]]:
+        self.generic_visit(node)
+        test = self.__fold__(node.test)
+        if test is True:
+            return node.body
+        if test is False:
+            return node.orelse
+        node.test = test
+        return node
+
+    visit_If = __branch__
+    visit_IfExp = __branch__
+
+
+def _specialize(fnc: Callable, counting: bool) -> Callable:
+    """ Returns fnc compiled again from its source, with the value of its
+    counting variable fixed to counting."""
+    tree = ast.parse(textwrap.dedent(inspect.getsource(fnc)))
+    tree = ast.fix_missing_locations(_Specialize(counting).visit(tree))
+    # the line numbers of the tracebacks point into this file
+    ast.increment_lineno(tree, fnc.__code__.co_firstlineno - 1)
+    namespace = {}
+    exec(compile(tree, inspect.getsourcefile(fnc), "exec"), fnc.__globals__, namespace)
+    return namespace[fnc.__name__]
+
+
+BacktrackingVM.__search_plain__ = _specialize(BacktrackingVM.__search__, False)
+BacktrackingVM.__search_counting__ = _specialize(BacktrackingVM.__search__, True)
@@ -0,0 +1,48 @@
+import pytest
+
+from regex.analyzer import check, render, PatternRejected, NESTED_QUANTIFIERS, OVERLAPPING_ALTERNATION
+from regex.treeparser import Parser
+
+
+@pytest.mark.parametrize("re, kinds", [
+    ('(a+)+b', [NESTED_QUANTIFIERS]),
+    ('([a-z]+)*@', [NESTED_QUANTIFIERS]),
+    ('(x+x+)+y', [NESTED_QUANTIFIERS]),
+    ('(a|ab)*c', [OVERLAPPING_ALTERNATION]),
+    ('(a|b|ab)+', [OVERLAPPING_ALTERNATION]),
+    ('((a|.)b)*', [OVERLAPPING_ALTERNATION]),
+    ('(a|b)*c', []),
+    ('(?:ab|cd)+', []),
+    ('x*y*', []),
+    ('(a|ab)c', []),
+    ('(a?)+', []),
+])
+def test_risks(re: str, kinds):
+    report = check(re)
+    assert [risk.kind for risk in report.risks] == kinds
+    assert report.is_safe() == (kinds == [])
+
+
+def test_large_alternation():
+    # the branches start with 5000 different characters
+    words = [chr(0x4e00 + i) + 'x' for i in range(5000)]
+    assert check('(' + '|'.join(words) + ')*').is_safe()
+    report = check('(' + '|'.join(words + [chr(0x4e00) + 'y']) + ')*')
+    assert [risk.kind for risk in report.risks] == [OVERLAPPING_ALTERNATION]
+
+
+def test_refuse():
+    with pytest.raises(PatternRejected) as e:
+        check('(a+)+b', refuse=True)
+    assert e.value.report.risks[0].fragment == '(a+)+'
+    assert check('a+b', refuse=True).is_safe()
+
+
+@pytest.mark.parametrize("re", [
+    '(a+)+b',
+    '(a|ab)*c|d',
+    '(?<n>x\\.y)+|[^0-9a-c]{2,3}$',
+    '^(?:ab)?\\s.{2,}',
+])
+def test_render(re: str):
+    assert render(Parser().parse(re)) == re
@@ -0,0 +1,61 @@
+from regex import astree
+from regex.astree import RangeElement, FoldedElement, fold, LATIN1_SIZE
+from regex.treeparser import Parser
+
+
+def test_merge_intervals():
+    assert RangeElement.merge_intervals([(5, 9), (1, 3), (4, 4), (8, 12), (20, 20)]) == [(1, 12), (20, 20)]
+    assert RangeElement.merge_intervals([]) == []
+
+
+def test_range_element():
+    element = RangeElement('zx', intervals=[(ord('a'), ord('c')), (0x4e00, 0x9fff)])
+    assert element.intervals == [(97, 99), (120, 120), (122, 122), (0x4e00, 0x9fff)]
+    assert element.size() == 3 + 2 + 0x9fff - 0x4e00 + 1
+    assert all(element.is_match(ch) for ch in 'abcxz一水鿿')
+    assert not any(element.is_match(ch) for ch in 'dy䷿ꀀ\xe9')
+    negated = RangeElement(intervals=element.intervals, is_positive_logic=False)
+    assert negated.is_match('d') and not negated.is_match('水')
+    assert RangeElement('cab').match == 'abc'
+
+
+def test_parsed_intervals():
+    parser = Parser()
+    element = parser.parse('[\x00-\uffff]').child.children[0]
+    assert element.intervals == [(0, 0xffff)]
+    element = parser.parse(r'[^a-zA-Z0-9_-]').child.children[0]
+    assert element.intervals == [(45, 45), (48, 57), (65, 90), (95, 95), (97, 122)]
+    assert not element.is_positive_logic
+
+
+def test_fold():
+    assert fold('A', 1) == 'a'
+    assert fold('ß', 1) == 'ß'
+    assert fold('ß', 2) == 'ss'
+    assert fold('É', 2) == 'e\u0301'
+
+
+def test_folded_element():
+    element = FoldedElement('É', ignore_case=2)
+    assert element.is_match('é') and element.is_match('É')
+    assert not element.is_match('e')
+    assert FoldedElement('k', ignore_case=2).is_match('\u212a')
+
+
+def test_fold_caches_are_bounded():
+    element = FoldedElement('a', ignore_case=2)
+    ranges = RangeElement(intervals=[(ord('a'), ord('z'))], ignore_case=2)
+    for cp in range(0x100, 0x3000):
+        element.is_match(chr(cp))
+        ranges.is_match(chr(cp))
+    assert len(astree._folded[2]) <= LATIN1_SIZE
+    assert len(astree._variants[2]) <= LATIN1_SIZE
+
+
+def test_range_element_ignore_case():
+    element = RangeElement(intervals=[(ord('a'), ord('f')), (ord('Ж'), ord('Ж'))], ignore_case=1)
+    assert all(element.is_match(ch) for ch in 'aFжЖ')
+    assert not any(element.is_match(ch) for ch in 'gZз')
+    negated = RangeElement(intervals=[(ord('A'), ord('Z'))], is_positive_logic=False, ignore_case=2)
+    assert not negated.is_match('q')
+    assert negated.is_match('1')
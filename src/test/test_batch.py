@@ -0,0 +1,74 @@
+import pytest
+
+from regex.engine import RegexEngine, BACKTRACKING, AUTOMATON
+from regex.batch import PatternSet, match_many, match_any
+
+
+def records(array):
+    return [tuple(array[i:i + 3]) for i in range(0, len(array), 3)]
+
+
+def test_match_many():
+    strings = ['a 12 refused', 'no', '7 refused x', '']
+    assert records(match_many('[0-9]+ refused', strings)) == [(0, 2, 12), (2, 0, 9)]
+    assert records(match_many('[0-9]+ refused', strings, engine=BACKTRACKING)) == [(0, 2, 12), (2, 0, 9)]
+    assert records(match_many('x*', ['', 'ax'])) == [(0, 0, 0), (1, 0, 0)]
+
+
+def test_match_many_same_as_match():
+    reng = RegexEngine()
+    strings = ['abcabd', 'xxabd', 'ab', 'abde']
+    expected = []
+    for i, string in enumerate(strings):
+        res, end, matches = reng.match('(abc|abd)e?', string, return_matches=True)
+        if res:
+            expected.append((i, matches[0][0].start_idx, end))
+    assert records(match_many('(abc|abd)e?', strings)) == expected
+
+
+@pytest.mark.parametrize("engine", [BACKTRACKING, AUTOMATON])
+@pytest.mark.parametrize("re", ['(a|ab)(c|bcd)', '$', '(ab)*abc', 'b*', '(x+x+)+y'])
+def test_match_many_agrees_with_match(re, engine):
+    reng = RegexEngine()
+    strings = ['abcd', 'xababcx', '', 'xxxxy', 'bb']
+    expected = []
+    for i, string in enumerate(strings):
+        res, end, matches = reng.match(re, string, return_matches=True, engine=engine)
+        if res:
+            expected.append((i, matches[0][0].start_idx, end))
+    assert records(match_many(re, strings, engine=engine)) == expected
+
+
+def test_match_many_ignore_case():
+    assert records(match_many('refused', ['REFUSED', 'ok'], ignore_case=1)) == [(0, 0, 7)]
+
+
+@pytest.mark.parametrize("string, expected", [
+    ('abbc refused', [(0, 5, 12), (1, 0, 1), (3, 0, 0), (4, 0, 4)]),
+    ('', [(3, 0, 0)]),
+    ('b', [(2, 0, 1), (3, 0, 0)]),
+])
+def test_pattern_set(string, expected):
+    patterns = PatternSet(['refused', '^a', 'b$', 'x*', '(a|b)+c'])
+    assert records(patterns.match(string)) == expected
+
+
+def test_pattern_set_same_as_match():
+    reng = RegexEngine()
+    res = ['(a|ab)(c|bcd)', 'b*', 'c$', '(ab)*abc', 'bcd|cd', '^x']
+    patterns = PatternSet(res)
+    for string in ['abcd', 'xababcd', 'bbc', '']:
+        expected = []
+        for i, re in enumerate(res):
+            result = reng.match(patterns.patterns[i], string)
+            if result[0]:
+                start = reng.match(patterns.patterns[i], string, return_matches=True)[2][0][0].start_idx
+                expected.append((i, start, result[1]))
+        assert records(patterns.match(string)) == expected
+
+
+def test_match_any():
+    assert records(match_any(['reset', 'refused'], 'connection refused')) == [(1, 11, 18)]
+    assert records(match_any(['reset', 'refused'], 'connection closed')) == []
+    patterns = PatternSet(['reset', 'refused'])
+    assert records(match_any(patterns, 'reset and refused')) == [(0, 0, 5), (1, 10, 17)]
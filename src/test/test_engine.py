@@ -0,0 +1,105 @@
+import pytest
+
+from regex.engine import RegexEngine, BACKTRACKING, AUTOMATON, MatchLimitExceeded
+from regex.nfa import MAX_PROGRAM_SIZE
+
+ENGINES = [BACKTRACKING, AUTOMATON]
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_finditer(engine):
+    reng = RegexEngine(engine=engine)
+    matches = list(reng.finditer(r'(?<key>[a-z]+)=([0-9]+)', 'a=1, bc=22; d=x'))
+    assert [m[0].match for m in matches] == ['a=1', 'bc=22']
+    assert [m[0].span() for m in matches] == [(0, 3), (5, 10)]
+    assert {m.name: m.match for m in list(matches[1])[1:]} == {'key': 'bc', 'Group 2': '22'}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_finditer_is_lazy(engine):
+    reng = RegexEngine(engine=engine)
+    matches = reng.finditer('a', 'xaxa')
+    assert next(matches)[0].span() == (1, 2)
+    assert next(matches)[0].span() == (3, 4)
+    assert next(matches, None) is None
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_empty_matches(engine):
+    reng = RegexEngine(engine=engine)
+    assert [m[0].span() for m in reng.finditer('b*', 'abba')] == [(0, 0), (1, 3), (3, 3), (4, 4)]
+    assert reng.findall('[0-9]*', 'a12b345') == ['', '12', '', '345', '']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_findall_and_count(engine):
+    reng = RegexEngine(engine=engine)
+    text = 'error: disk; warn: cpu; error: net ' * 50
+    assert reng.findall('(error|warn): [a-z]+', text)[:3] == ['error: disk', 'warn: cpu', 'error: net']
+    assert reng.count('error', text) == 100
+    assert reng.count('ERROR', text, ignore_case=1) == 100
+    assert reng.count('fatal', text) == 0
+
+
+def test_findall_large_regex():
+    # too large to be compiled, matched on the AST
+    assert RegexEngine().findall('(abc){1,9000}', 'abcxabcabc') == ['abc', 'abcabc']
+
+
+def test_count_limits():
+    with pytest.raises(MatchLimitExceeded):
+        RegexEngine().count('(a|b)*c', 'ab' * 1000 + 'c', max_steps=100)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_sub(engine):
+    reng = RegexEngine(engine=engine)
+    text = 'bob@example.com, al@example.com'
+    assert reng.sub(r'(?<user>[a-z]+)@example\.com', r'\g<user>@example.org', text) == 'bob@example.org, al@example.org'
+    assert reng.sub(r'([a-z]+)@([a-z]+)', r'\2:\1', text) == 'example:bob.com, example:al.com'
+    assert reng.sub('a|(b)', r'[\1\g<0>]', 'xaybz') == 'x[a]y[bb]z'
+    assert reng.sub('x*', '-', 'abxd') == '-a-b--d-'
+    assert reng.sub('a', 'b', 'aaa', count=2) == 'bba'
+    assert reng.sub('[0-9]+', lambda matches: str(2 * int(matches[0].match)), 'a1b22') == 'a2b44'
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_split(engine):
+    reng = RegexEngine(engine=engine)
+    assert reng.split(' *, *', 'a , b,c') == ['a', 'b', 'c']
+    assert reng.split(',', 'a,b,c', maxsplit=1) == ['a', 'b,c']
+    assert reng.split('(,)|(;)', 'a,b;c') == ['a', ',', None, 'b', None, ';', 'c']
+    assert reng.split('x*', 'axbc') == ['', 'a', '', 'b', 'c', '']
+
+
+def test_sub_and_split_limits():
+    reng = RegexEngine()
+    # a second search would exceed the budget, but none is run past the count
+    string = 'ab' + 'ac' * 300 + 'xb'
+    assert reng.sub('(a|c)+b', '-', string, count=1, max_steps=100) == '-' + string[2:]
+    assert reng.sub('((a|c)+)b', r'\1', string, count=1, max_steps=100) == 'a' + string[2:]
+    assert reng.split('(?:a|c)+b', string, maxsplit=1, max_steps=100) == ['', string[2:]]
+    assert reng.split('((?:a|c)+)b', string, maxsplit=1, max_steps=100) == ['', 'a', string[2:]]
+    with pytest.raises(MatchLimitExceeded):
+        reng.sub('(a|c)+b', '-', string, max_steps=100)
+    with pytest.raises(MatchLimitExceeded):
+        reng.split('((?:a|c)+)b', string, timeout=0)
+
+
+def test_large_alternation():
+    words = ['w{}x'.format(i) for i in range(5000)]
+    reng = RegexEngine()
+    assert reng.findall('(?:' + '|'.join(words) + ')!', 'w12x w4999x! w3x!') == ['w4999x!', 'w3x!']
+    # the alternatives of a non-capturing group capture nothing
+    assert [m.group_id for m in reng.match('(?:a|b)c', 'bc', True)[2][0]] == [0]
+
+
+def test_literal_runs():
+    # too large for the automaton, the literals are matched on the AST
+    tail = 'x{0,' + str(MAX_PROGRAM_SIZE) + '}'
+    reng = RegexEngine()
+    assert reng.match('connection refused' + tail, 'a connection closed, connection refused') == (True, 39)
+    assert reng.match('(ab)*c' + tail, 'ababc') == (True, 5)
+    assert reng.match('abcd' + tail, 'abcabcd') == (True, 7)
+    assert not reng.match('abcd' + tail, 'abcabc')[0]
+    assert [m.span() for m in reng.match('(?<w>ab)cd' + tail, 'xabcdx', True)[2][0]] == [(1, 6), (1, 3)]
@@ -62,4 +62,31 @@ def test_lexer_1(lexer: Lexer):
     assert transform(tokens[1]) == ElementToken.__name__
     assert transform(tokens[2]) == ElementToken.__name__
     assert transform(tokens[3]) == SpaceToken.__name__
-    assert transform(tokens[4]) == ElementToken.__name__
\ No newline at end of file
+    assert transform(tokens[4]) == ElementToken.__name__
+
+
+def test_escaped_tab_is_one_token(lexer: Lexer):
+    tokens = lexer.scan(r'a\tb')
+    assert [token.char for token in tokens] == ['a', '\t', 'b']
+
+
+def test_token_positions(lexer: Lexer):
+    tokens = lexer.scan(r'a\.{2,3}')
+    assert [token.pos for token in tokens] == [0, 1, 3, 4, 5, 6, 7]
+
+
+def test_tokenize(lexer: Lexer):
+    stream = lexer.tokenize(r'^(a|\s)[^x-]{1,}$')
+    assert list(stream.kinds) == [START, LEFT_PARENTHESIS, ELEMENT, VERTICAL_BAR, SPACE, RIGHT_PARENTHESIS,
+                                  LEFT_SQUARE_BRACKET, CIRCUMFLEX, ELEMENT, DASH, RIGHT_SQUARE_BRACKET,
+                                  LEFT_CURLY_BRACE, ELEMENT, COMMA, RIGHT_CURLY_BRACE, END]
+    assert stream.chars[2] == 'a' and stream.chars[8] == 'x'
+    assert len(stream) == 16
+
+
+def test_scan_matches_tokenize(lexer: Lexer):
+    re = r'(?<n>a\\b)+[0-9]{2}\s.|c$'
+    stream = lexer.tokenize(re)
+    tokens = lexer.scan(re)
+    assert [transform(token) for token in tokens] == [TOKEN_CLASSES[kind].__name__ for kind in stream.kinds]
+    assert [token.pos for token in tokens] == list(stream.positions)
@@ -0,0 +1,58 @@
+import pytest
+
+from regex.engine import RegexEngine, BACKTRACKING, AUTOMATON
+from regex.matcher import Match, CaptureSlots
+
+
+def test_lazy_match():
+    string = 'x' * 10 + 'abc'
+    match = Match(1, 10, 13, string, 'Group 1')
+    assert match.string is string
+    assert match.match == 'abc'
+    assert match.span() == (10, 13)
+    assert Match(0, 10, 12, 'zabc', 'Group 0', offset=9).match == 'ab'
+    with pytest.raises(AttributeError):
+        match.other = 1
+
+
+@pytest.mark.parametrize("engine", [BACKTRACKING, AUTOMATON])
+def test_index_only(engine: str):
+    reng = RegexEngine()
+    res, consumed, matches = reng.match('(?<d>[0-9]+)x', 'a12x 3x', True, True, engine=engine, index_only=True)
+    assert (res, consumed) == (True, 7)
+    assert [list(m) for m in matches] == [[(0, 1, 4), (1, 1, 3)], [(0, 5, 7), (1, 5, 6)]]
+    _, _, full = reng.match('(?<d>[0-9]+)x', 'a12x 3x', True, True, engine=engine)
+    assert [[(m.group_id, m.start_idx, m.end_idx) for m in found] for found in full] == [list(m) for m in matches]
+
+
+def test_index_only_large_regex():
+    # too large to be compiled, matched on the AST
+    reng = RegexEngine()
+    string = 'x' + 'abc' * 3 + 'x'
+    res, consumed, matches = reng.match('(abc){1,9000}', string, True, index_only=True)
+    assert (res, consumed) == (True, 10)
+    assert all(type(m) is tuple for m in matches[0])
+    _, _, full = reng.match('(abc){1,9000}', string, True)
+    assert [(m.group_id, m.start_idx, m.end_idx) for m in full[0]] == list(matches[0])
+
+
+def test_capture_slots():
+    captures = CaptureSlots(3)
+    captures.save(2, 1, 2, 'Group 2')
+    captures.save(1, 0, 3, 'Group 1')
+    captures.save(0, 0, 4, 'Group 0')
+    assert [m.span() for m in captures.to_matches('abcd')] == [(0, 4), (0, 3), (1, 2)]
+
+    # saving a group again replaces its capture and makes it the latest
+    captures.save(2, 2, 3, 'Group 2')
+    assert [m.group_id for m in captures.to_matches('abcd')] == [2, 0, 1]
+    captures.drop_latest()
+    assert [m.group_id for m in captures.to_matches('abcd')] == [0, 1]
+    captures.restore_last()
+    assert [(m.group_id, m.match) for m in captures.to_matches('abcd')] == [(2, 'b'), (0, 'abcd'), (1, 'abc')]
+
+    captures.clear()
+    assert len(captures.to_matches('abcd')) == 0
+    # the slots grow when a group id is out of range
+    captures.save(5, 1, 1, 'Group 5')
+    assert [m.span() for m in captures.to_matches('abcd')] == [(1, 1)]
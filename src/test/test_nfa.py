@@ -0,0 +1,108 @@
+import pytest
+
+from regex.engine import RegexEngine, AUTOMATON, BACKTRACKING
+from regex.treeparser import Parser
+from regex.nfa import Automaton, compile_program, MAX_PROGRAM_SIZE, SPLIT
+
+
+def summary(result):
+    return result[0], result[1], [[(m.group_id, m.name, m.start_idx, m.end_idx, m.match) for m in matches] for matches in result[2]]
+
+
+@pytest.fixture
+def reng():
+    return RegexEngine()
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+@pytest.mark.parametrize("re, string", [
+    ('(ab|a)bc', 'abc'),
+    ('a|ab', 'ab'),
+    ('(a)(b)', 'xab'),
+    ('((a)b)c', 'abc'),
+    ('a*ab', 'aaab'),
+    ('^abc$', 'abc'),
+    ('abc$', 'xabc'),
+    ('(?<x>a)b', 'ab'),
+    ('(a|b)+', 'abab'),
+    ('[a-c]+', 'xxabcz'),
+    ('[^a-c]+', 'abxyzc'),
+    ('x*', ''),
+    ('a', ''),
+    ('(a)|(b)', 'b'),
+    ('a{2,3}', 'aaaa'),
+    (r'\s+', 'a  b'),
+    ('.+', 'ab\ncd'),
+    ('(x(y)?)+z', 'xyxz'),
+    ('(GET|POST|PUT)+ /', 'xPUTGET /'),
+    ('(ab|a)(b?)', 'ab'),
+    ('(a|ab)(b?)', 'ab'),
+    ('(?:abc|ab|abd)(c*)', 'abcc'),
+    ('x(|a|ab)', 'xab'),
+])
+def test_same_result_as_backtracking(reng: RegexEngine, re: str, string: str):
+    for continue_after_match in (False, True):
+        expected = reng.match(re, string, True, continue_after_match, engine=BACKTRACKING)
+        result = reng.match(re, string, True, continue_after_match, engine=AUTOMATON)
+        assert summary(result) == summary(expected)
+
+
+def test_nested_quantifiers_linear(reng: RegexEngine):
+    assert reng.match('(a+)+b', 'a' * 5000 + 'c', engine=AUTOMATON) == (False, 0)
+    assert reng.match('(a+)+b', 'a' * 5000 + 'b', engine=AUTOMATON) == (True, 5001)
+
+
+def test_leftmost_longest(parser: Parser):
+    automaton = Automaton(parser.parse('abcd|bc|c'))
+    assert automaton.search_span('xabcd', 0) == (1, 5)
+    assert automaton.search_span('xabce', 0) == (2, 4)
+    assert automaton.search_span('xabce', 3) == (3, 4)
+
+
+def test_anchors(parser: Parser):
+    automaton = Automaton(parser.parse('^a'))
+    assert automaton.search_span('aa', 0) == (0, 1)
+    assert automaton.search_span('aa', 1) is None
+    automaton = Automaton(parser.parse('a$'))
+    assert automaton.search_span('aaa', 0) == (2, 3)
+
+
+def test_engine_per_instance():
+    reng = RegexEngine(engine=AUTOMATON)
+    res, consumed, matches = reng.match('(b+)c', 'abbbc', return_matches=True)
+    assert res and consumed == 5
+    assert [(m.group_id, m.match) for m in matches[0]] == [(0, 'bbbc'), (1, 'bbb')]
+
+
+def test_dfa_cache_reused(parser: Parser):
+    automaton = Automaton(parser.parse('[a-z]+@[a-z]+'))
+    automaton.search_span('mail me at someone@example', 0)
+    n_states = len(automaton.dfa.states)
+    automaton.search_span('mail me at someone@example', 0)
+    assert len(automaton.dfa.states) == n_states
+
+
+def test_fallback_to_backtracking(reng: RegexEngine, parser: Parser):
+    re = 'a{1,' + str(MAX_PROGRAM_SIZE) + '}'
+    with pytest.raises(Exception):
+        compile_program(parser.parse(re))
+    assert reng.match(re, 'baab', engine=AUTOMATON) == (True, 3)
+
+
+def test_literal_alternation_trie(parser: Parser):
+    words = ['word{}'.format(i) for i in range(5000)]
+    prog = compile_program(parser.parse('(' + '|'.join(words) + ')'))
+    # a chain of SPLITs would need one per word
+    assert prog.ops.count(SPLIT) < 1000
+    automaton = Automaton(parser.parse('|'.join(words)))
+    assert automaton.search_span('a word12 word4999', 0) == (2, 8)
+    assert automaton.search_span('a word12 word4999', 8) == (9, 17)
+
+
+def test_unknown_engine(reng: RegexEngine):
+    with pytest.raises(Exception):
+        reng.match('a', 'a', engine='unknown')
@@ -0,0 +1,92 @@
+import pytest
+
+from regex.engine import RegexEngine, BACKTRACKING, AUTOMATON
+from regex.treeparser import Parser
+from regex.analyzer import render
+from regex.optimizer import factor_prefixes, merge_single_chars, unwrap_groups, merge_literals, optimize, size
+# the engine imports the modules of regex as top-level modules, thus its
+# patterns must be built by them too
+import pattern
+import treeparser
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+@pytest.mark.parametrize("optimization, re, expected", [
+    (factor_prefixes, r'([0-9]a|[0-9]b|c)', r'([0-9](?:a|b)|c)'),
+    (factor_prefixes, r'(.x|.y|ab|ac)', r'(.(?:x|y)|a(?:b|c))'),
+    (factor_prefixes, r'(?:\sa|\sb)c', r'(?:\s(?:a|b))c'),
+    (factor_prefixes, r'(a.|b.)', r'(a.|b.)'),
+    # the alternations of strings are left to the trie of the compiler
+    (factor_prefixes, r'(ab|ac)', r'(ab|ac)'),
+    (merge_single_chars, r'(a|b|[0-9])', r'([0-9a-b])'),
+    (merge_single_chars, r'x(?:a|[^b])', r'x(?:a|[^b])'),
+    (merge_single_chars, r'(a|bc)', r'(a|bc)'),
+    (unwrap_groups, r'(?:ab)c', r'abc'),
+    (unwrap_groups, r'(?:a)*b', r'a*b'),
+    (unwrap_groups, r'(?:ab)*(a)', r'(?:ab)*(a)'),
+    (merge_literals, r'ab+cd.ef', r'ab+cd.ef'),
+    (merge_literals, r'(abc|d)e\sfg', r'(abc|d)e\sfg'),
+])
+def test_pass(parser: Parser, optimization, re: str, expected: str):
+    assert render(optimization(parser.parse(re))) == expected
+
+
+def test_merge_literals(parser: Parser):
+    ast = merge_literals(parser.parse(r'connection (refused|closed)!'))
+    children = list(ast.child.children)
+    assert [type(child).__name__ for child in children] == ['LiteralElement', 'OrNode', 'Element']
+    assert children[0].match == 'connection '
+    assert children[0].span == (0, 11)
+    assert [child.children[0].match for child in children[1].children] == ['refused', 'closed']
+
+
+def test_optimize(parser: Parser):
+    ast = optimize(parser.parse(r'(?:.x|.y|.z)c'))
+    assert render(ast) == r'.[x-z]c'
+    assert size(ast) < size(parser.parse(r'(?:.x|.y|.z)c'))
+    # no pass leaves the AST as the parser built it
+    assert render(optimize(parser.parse(r'(?:.x|.y|.z)c'), ())) == r'(?:.x|.y|.z)c'
+
+
+@pytest.mark.parametrize("re, string", [
+    (r'([0-9]a|[0-9]b|c)+', '1a2bc1b'),
+    (r'(?<head>.x|.y|ab)(a|b|[0-9])*', 'zyab01b'),
+    (r'(.(a)|.(b)|c)*d', 'xaybcd'),
+    (r'((?:a)*b|a(c))', 'aac'),
+    (r'(?:a|ab)(c|bcd)(d*)', 'abcd'),
+    (r'(ab)*abc(abd|abe)+', 'xababcabeabd'),
+])
+@pytest.mark.parametrize("engine", [BACKTRACKING, AUTOMATON])
+def test_same_matches(re: str, string: str, engine: str):
+    reng, parser = RegexEngine(), treeparser.Parser()
+
+    def matches(passes):
+        compiled = pattern.compile_pattern(parser, re, engine=engine, passes=passes)
+        result = reng.match(compiled, string, return_matches=True, continue_after_match=True)
+        return result[:2], [[(m.group_id, m.name, m.start_idx, m.end_idx) for m in ms] for ms in result[2]]
+
+    assert matches(pattern.PASSES) == matches(())
+
+
+@pytest.mark.parametrize("re, string", [
+    (r'[^a]b|[^a]', 'abxbx'),
+    (r'ab|[^a-b]bb|[^a-b]', 'abcbbcab'),
+    (r'x(?:[^a]b|([^a]))y', 'xcbyxcy'),
+    (r'(?:Ba+b[Ab]+$)(?:B{2}B){2,}', 'BaabAb'),
+    (r'(?:^ab)c|d(?:e$)', 'abcde'),
+])
+@pytest.mark.parametrize("engine", [BACKTRACKING, AUTOMATON])
+def test_render_optimized(re: str, string: str, engine: str):
+    reng, parser = RegexEngine(), treeparser.Parser()
+    rendered = render(pattern.compile_pattern(parser, re, engine=engine).ast)
+
+    def matches(re):
+        compiled = pattern.compile_pattern(parser, re, engine=engine, passes=())
+        result = reng.match(compiled, string, return_matches=True, continue_after_match=True)
+        return result[:2], [[(m.group_id, m.start_idx, m.end_idx) for m in ms] for ms in result[2]]
+
+    assert matches(rendered) == matches(re)
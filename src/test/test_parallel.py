@@ -0,0 +1,64 @@
+import pytest
+
+import regex.parallel as parallel
+from regex.parallel import find_spans, search_parallel, search_files
+from regex.engine import compile
+
+
+def pairs(array):
+    return [tuple(array[i:i + 2]) for i in range(0, len(array), 2)]
+
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    monkeypatch.setattr(parallel, "MIN_SHARD_SIZE", 4)
+
+
+def test_find_spans():
+    pattern = compile('a+|x*')
+    assert find_spans(pattern, 'baab') == [(0, 0), (1, 3), (3, 3), (4, 4)]
+    assert find_spans(pattern, 'baab', 1, 3) == [(1, 3)]
+
+
+@pytest.mark.parametrize("re, string", [
+    ('connection (refused|reset)', 'connection refused; connection reset; connection closed ' * 8),
+    ('[0-9]+', '123456789 12 3 45678 ' * 5),
+    ('a*', 'aaabaaaabbba' * 4),
+    ('(ab|b)c$', 'abcabc' * 5),
+    ('^ab', 'ababab' * 5),
+])
+def test_search_parallel(small_shards, re: str, string: str):
+    expected = find_spans(compile(re), string)
+    assert pairs(search_parallel(re, string, max_workers=3)) == expected
+    assert pairs(search_parallel(re, string, max_workers=1)) == expected
+
+
+def test_search_parallel_straddling_matches(small_shards):
+    # every match is longer than a shard
+    string = 'x' + 'a' * 13 + 'b' + 'a' * 9
+    assert pairs(search_parallel('a+', string, max_workers=2)) == [(1, 14), (15, 24)]
+
+
+@pytest.mark.parametrize("re", ['a+', 'a+b', '(ab|b)c$', 'x*'])
+def test_search_parallel_past_the_overlap(small_shards, monkeypatch, re: str):
+    # the matches go on past the characters sent after the shards
+    monkeypatch.setattr(parallel, "SHARD_OVERLAP", 2)
+    string = 'x' + 'a' * 13 + 'b' + 'a' * 9 + 'bc'
+    assert pairs(search_parallel(re, string, max_workers=2)) == find_spans(compile(re), string)
+
+
+def test_search_files(tmp_path):
+    paths = []
+    for i, text in enumerate(['no match', 'error 1\nerror 22', '', 'ERROR 3']):
+        path = tmp_path / "{}.log".format(i)
+        path.write_text(text)
+        paths.append(str(path))
+    records = search_files('error [0-9]+', paths, max_workers=2)
+    assert [tuple(records[i:i + 3]) for i in range(0, len(records), 3)] == [(1, 0, 7), (1, 8, 16)]
+    records = search_files('error [0-9]+', paths, max_workers=2, ignore_case=1)
+    assert [tuple(records[i:i + 3]) for i in range(0, len(records), 3)] == [(1, 0, 7), (1, 8, 16), (3, 0, 7)]
+
+
+def test_not_supported():
+    with pytest.raises(Exception):
+        search_parallel('(abc){1,9000}', 'abc')
@@ -0,0 +1,137 @@
+import threading
+import pytest
+
+from regex.engine import RegexEngine, Pattern, compile, cache_put, cache_info, purge, AUTOMATON, BACKTRACKING
+from regex.pattern import PatternCache
+
+
+@pytest.fixture
+def cache():
+    return PatternCache(maxsize=2)
+
+
+def test_compile_returns_cached_pattern():
+    pattern = compile('a+b')
+    assert isinstance(pattern, Pattern)
+    assert compile('a+b') is pattern
+    assert compile('a+b', engine=AUTOMATON) is not pattern
+
+
+def test_cache_counters(cache: PatternCache):
+    cache.get('a')
+    cache.get('b')
+    cache.get('a')
+    info = cache.info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (1, 2, 0, 2)
+
+    # 'b' is the least recently used pattern
+    cache.get('c')
+    cache.get('a')
+    cache.get('b')
+    info = cache.info()
+    assert (info.hits, info.misses, info.evictions, info.currsize) == (2, 4, 2, 2)
+
+
+def test_cache_resize(cache: PatternCache):
+    cache.get('a')
+    cache.get('b')
+    cache.resize(1)
+    assert cache.info().currsize == 1
+    assert cache.info().evictions == 1
+    cache.resize(0)
+    cache.get('a')
+    assert cache.info().currsize == 0
+    with pytest.raises(Exception):
+        cache.resize(-1)
+
+
+def test_cache_clear(cache: PatternCache):
+    cache.get('a')
+    cache.clear()
+    assert cache.info() == (0, 0, 0, 2, 0)
+
+
+def test_cache_threads():
+    cache = PatternCache(maxsize=8)
+    patterns = ['a{}b'.format(i) for i in range(16)]
+
+    def work():
+        for _ in range(20):
+            for re in patterns:
+                assert cache.get(re).re == re
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    info = cache.info()
+    assert info.hits + info.misses == 4 * 20 * 16
+    assert info.currsize == 8
+
+
+def test_match_compiled_pattern():
+    reng = RegexEngine()
+    pattern = compile('(a+)b')
+    res, consumed, matches = reng.match(pattern, 'xaab', return_matches=True)
+    assert res and consumed == 4
+    assert matches[0][1].match == 'aa'
+
+
+def test_pattern_engine():
+    pattern = compile('(a+)+b', engine=AUTOMATON)
+    assert pattern.get_automaton() is not None
+    reng = RegexEngine(engine=BACKTRACKING)
+    assert reng.match(pattern, 'a' * 100 + 'c') == (False, 0)
+
+
+def test_pattern_ignore_case():
+    reng = RegexEngine()
+    assert reng.match(compile('ABC', ignore_case=1), 'xabc') == (True, 4)
+    assert reng.match('ABC', 'xabc') == (False, 0)
+
+
+@pytest.mark.parametrize('engine', [BACKTRACKING, AUTOMATON])
+def test_ignore_case_spans_point_into_the_string(engine):
+    reng = RegexEngine(engine=engine)
+    # the decomposition of é would shift the indexes of a normalized string
+    string = 'é é ÉTÉ été'
+    res, consumed, matches = reng.match('été', string, return_matches=True, continue_after_match=True, ignore_case=2)
+    assert res and consumed == len(string)
+    assert [match[0].match for match in matches] == ['ÉTÉ', 'été']
+    assert [match[0].span() for match in matches] == [(4, 7), (8, 11)]
+
+
+@pytest.mark.parametrize('engine', [BACKTRACKING, AUTOMATON])
+def test_ignore_case_multi_character_folds(engine):
+    # the characters are compared one at a time, so a character folding to
+    # more than one character only matches the characters folding the same
+    # way, and not the sequence it folds to, as it did when the test string
+    # was normalized
+    reng = RegexEngine(engine=engine)
+    assert reng.match('ß', 'ẞ', ignore_case=2) == (True, 1)
+    assert reng.match('ﬁ', 'ﬁ', ignore_case=2) == (True, 1)
+    for re, string in [('ß', 'ss'), ('ss', 'ß'), ('ﬁ', 'fi'), ('fi', 'ﬁ')]:
+        assert reng.match(re, string, ignore_case=2) == (False, 0)
+
+
+def test_match_uses_cache():
+    reng = RegexEngine()
+    reng.match('cached+', 'cachedd')
+    hits = cache_info().hits
+    reng.match('cached+', 'cachedd')
+    assert cache_info().hits == hits + 1
+
+
+def test_cache_put():
+    pattern = compile('put+')
+    purge()
+    cache_put(pattern)
+    assert compile('put+') is pattern
+    assert cache_info().misses == 0
+
+
+def test_unknown_engine():
+    with pytest.raises(Exception):
+        compile('a', engine='unknown')
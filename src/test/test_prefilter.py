@@ -0,0 +1,99 @@
+import math
+import pytest
+
+from regex.engine import RegexEngine, AUTOMATON
+from regex.treeparser import Parser
+from regex.prefilter import Prefilter
+
+
+@pytest.fixture
+def parser():
+    return Parser()
+
+
+def prefilter(parser: Parser, re: str) -> Prefilter:
+    return Prefilter(parser.parse(re))
+
+
+def test_literal_prefix(parser: Parser):
+    assert prefilter(parser, 'connection refused').prefix == 'connection refused'
+    assert prefilter(parser, 'err(or)?: [0-9]+').prefix == 'err'
+    assert prefilter(parser, '^abc').prefix == 'abc'
+    assert prefilter(parser, '(ab){2}c').prefix == 'ababc'
+    assert prefilter(parser, 'get|post').prefix == ''
+
+
+def test_first_chars(parser: Parser):
+    assert prefilter(parser, '[0-9]+x').first_chars == frozenset('0123456789')
+    assert prefilter(parser, 'a?b').first_chars == frozenset('ab')
+    assert prefilter(parser, 'get|post').first_chars == frozenset('gp')
+    assert prefilter(parser, '.b').first_chars is None
+    assert prefilter(parser, '[^a]b').first_chars is None
+    # the empty string matches anywhere
+    assert prefilter(parser, 'a*').first_chars is None
+
+
+def test_required_substring(parser: Parser):
+    assert prefilter(parser, 'err(or)?: [0-9]+').required == 'err'
+    assert prefilter(parser, '[0-9]+ connection refused$').required == ' connection refused'
+    assert prefilter(parser, 'x(abc)+y').required == 'xabc'
+    assert prefilter(parser, 'a*').required == ''
+
+
+def test_next_candidate(parser: Parser):
+    pf = prefilter(parser, 'ab+')
+    assert pf.next_candidate('xxabab', 0) == 2
+    assert pf.next_candidate('xxabab', 3) == 4
+    assert pf.next_candidate('xxabab', 5) == -1
+    pf = prefilter(parser, '[xy]z')
+    assert pf.next_candidate('aaayx', 0) == 3
+    assert pf.next_candidate('aaa', 0) == -1
+    pf = prefilter(parser, '[a-j]z')
+    assert pf.next_candidate('zzzjz', 0) == 3
+
+
+def test_may_match(parser: Parser):
+    pf = prefilter(parser, '[0-9]+ refused')
+    assert not pf.may_match('connection closed')
+    assert pf.may_match('42 refused')
+    assert not pf.may_match('42 refused', 3)
+
+
+def test_anchored_start(parser: Parser):
+    pf = prefilter(parser, '^[a-z0-9]+$')
+    assert pf.anchored_start and pf.anchored_end
+    assert pf.next_candidate('abc', 0) == 0
+    assert pf.next_candidate('abc', 1) == -1
+    assert pf.next_candidate('-abc', 0) == -1
+    assert prefilter(parser, '^a|^b').anchored_start
+    assert not prefilter(parser, '^a|b').anchored_start
+    assert not prefilter(parser, '(^a)?b').anchored_start
+
+
+def test_anchored_end_bounded_width(parser: Parser):
+    pf = prefilter(parser, '[0-9]{2,4}$')
+    assert pf.anchored_end and (pf.min_len, pf.max_len) == (2, 4)
+    assert pf.next_candidate('abcdef12345', 0) == 7
+    assert pf.next_candidate('abcdef12345', 10) == -1
+    pf = prefilter(parser, 'ab$')
+    assert pf.next_candidate('abxxab', 0) == 4
+    assert pf.next_candidate('abxxabx', 0) == -1
+    assert prefilter(parser, '.+$').max_len == math.inf
+
+
+@pytest.mark.parametrize("re, string, expected", [
+    ('refused', 'connection refused', (True, 18)),
+    ('ab+', 'aaaabbbc', (True, 7)),
+    ('[0-9]+x', 'a1b22x', (True, 6)),
+    ('(abc|abd)e', 'abcabde', (True, 7)),
+    ('refused', 'connection closed', (False, 0)),
+    ('^ab', 'xab', (False, 0)),
+    ('^[a-z0-9]+$', 'user42', (True, 6)),
+    ('^[a-z0-9]+$', 'user-42', (False, 0)),
+    ('[0-9]{2,4}$', 'abc12345', (True, 8)),
+    ('(ab|b)c$', 'abcabc', (True, 6)),
+])
+def test_same_results(re: str, string: str, expected):
+    reng = RegexEngine()
+    assert reng.match(re, string) == expected
+    assert reng.match(re, string, engine=AUTOMATON) == expected
@@ -0,0 +1,34 @@
+import pytest
+
+from regex.engine import RegexEngine
+
+
+def test_profile_counts():
+    report = RegexEngine().profile(r'(a|aa)*[bc]', 'a' * 30)
+    assert not report.result
+    assert report.retries == 30
+    spans = report.by_span()
+    # the alternation does all the backtracking
+    assert spans[(0, 7)]['pushes'] == spans[(0, 7)]['pops'] > 0
+    assert spans[(7, 11)]['calls'] == 31
+    assert report.hottest(1)[0].source == '(a|aa)*'
+    assert report.total('steps') == sum(counts['steps'] for counts in spans.values())
+
+
+def test_profile_match():
+    reng = RegexEngine()
+    report = reng.profile(r'x(?<n>[0-9]+)y', 'x1y x22y', continue_after_match=True)
+    assert (report.result, report.consumed) == reng.match(r'x(?<n>[0-9]+)y', 'x1y x22y', continue_after_match=True)
+    assert report.by_span()[(1, 13)]['saves'] >= 4
+    assert 'x(?<n>[0-9]+)y' in str(report)
+
+
+def test_profile_skipped_by_prefilter():
+    report = RegexEngine().profile('(a|b)*c', 'abab')
+    assert not report.result
+    assert report.retries == 0 and report.total('steps') == 0
+
+
+def test_profile_large_regex():
+    with pytest.raises(Exception):
+        RegexEngine().profile('(abc){1,9000}', 'abc')
@@ -0,0 +1,58 @@
+import struct
+import pytest
+
+from regex.engine import RegexEngine, compile, cache_info, purge, AUTOMATON, BACKTRACKING
+from regex.serialize import dumps, loads, save, load, PatternStore, MAGIC, FORMAT_VERSION
+
+REGEXES = [
+    r'(?<ip>[0-9]{1,3}(\.[0-9]{1,3}){3}) \- (GET|POST) /[a-z]+',
+    r'^a|b$',
+    r'.\s[^A-Z一-鿿]*x{2,}',
+    r'(?:ab)*c?',
+]
+STRINGS = ['10.0.0.1 - GET /index', 'ab', 'x bx 水 xxx', 'ababc', 'HÉLLO 10.0.0.1 - post /A']
+
+
+def assert_same(pattern, loaded):
+    reng = RegexEngine()
+    assert (loaded.re, loaded.ignore_case, loaded.engine) == (pattern.re, pattern.ignore_case, pattern.engine)
+    for string in STRINGS:
+        expected = reng.match(pattern, string, True, True, index_only=True)
+        assert reng.match(loaded, string, True, True, index_only=True) == expected
+
+
+def test_round_trip():
+    patterns = [compile(re, ignore_case, engine) for re in REGEXES for ignore_case, engine in [(0, None), (1, AUTOMATON), (2, BACKTRACKING)]]
+    data = dumps(patterns)
+    loaded = loads(data)
+    assert len(loaded) == len(patterns)
+    for pattern, copy in zip(patterns, loaded):
+        assert_same(pattern, copy)
+    assert dumps(loaded) == data
+
+
+def test_pattern_store(tmp_path):
+    path = str(tmp_path / 'rules.pyrx')
+    patterns = [compile(re) for re in REGEXES]
+    save(patterns, path)
+    with PatternStore(path) as store:
+        assert len(store) == len(REGEXES)
+        assert_same(patterns[2], store[2])
+        assert store[2] is store[2]
+        assert [pattern.re for pattern in store] == REGEXES
+
+
+def test_load_fills_the_cache(tmp_path):
+    path = str(tmp_path / 'rules.pyrx')
+    save([compile(re) for re in REGEXES], path)
+    purge()
+    loaded = load(path)
+    assert compile(REGEXES[0]) is loaded[0]
+    assert cache_info().misses == 0
+
+
+def test_bad_files():
+    with pytest.raises(Exception, match='Not a pattern file'):
+        loads(b'not a pattern file')
+    with pytest.raises(Exception, match='Unsupported pattern file version'):
+        loads(struct.pack('<8sII', MAGIC, FORMAT_VERSION + 1, 0))
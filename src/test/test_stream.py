@@ -0,0 +1,65 @@
+import io
+import itertools
+import pytest
+
+from regex.engine import RegexEngine, compile, AUTOMATON
+from regex.stream import finditer_stream, read_chunks
+
+
+def spans(results):
+    return [[(m.group_id, m.start_idx, m.end_idx, m.match) for m in matches] for matches in results]
+
+
+def test_read_chunks():
+    assert list(read_chunks('abc')) == ['abc']
+    assert list(read_chunks(io.StringIO('abcde'), chunk_size=2)) == ['ab', 'cd', 'e']
+    assert list(read_chunks(['a', '', 'b'])) == ['a', 'b']
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 100])
+def test_matches_across_chunks(chunk_size: int):
+    text = 'GET /a 200\nPOST /bc 404\nGET /def 500\n'
+    chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
+    result = spans(finditer_stream(r'(GET|POST) (/[a-z]+)', iter(chunks)))
+    assert result == [
+        [(0, 0, 6, 'GET /a'), (2, 4, 6, '/a'), (1, 0, 3, 'GET')],
+        [(0, 11, 19, 'POST /bc'), (2, 16, 19, '/bc'), (1, 11, 15, 'POST')],
+        [(0, 24, 32, 'GET /def'), (2, 28, 32, '/def'), (1, 24, 27, 'GET')],
+    ]
+
+
+def test_same_matches_as_engine():
+    text = 'aab ab b aaab'
+    reng = RegexEngine(engine=AUTOMATON)
+    _, _, expected = reng.match('a*b', text, return_matches=True, continue_after_match=True)
+    result = finditer_stream('a*b', io.StringIO(text), chunk_size=2)
+    assert spans(result) == spans(expected)
+
+
+def test_anchors():
+    assert spans(finditer_stream('^ab|c$', ['a', 'bab', 'c'])) == [[(0, 0, 2, 'ab')], [(0, 4, 5, 'c')]]
+    assert spans(finditer_stream('c$', ['cc', 'c', 'x'])) == []
+
+
+def test_empty_matches():
+    assert spans(finditer_stream('x*', ['ab', 'x'])) == [[(0, 0, 0, '')], [(0, 1, 1, '')], [(0, 2, 3, 'x')], [(0, 3, 3, '')]]
+
+
+def test_without_groups():
+    result = finditer_stream(compile('(a)(b)'), ['xa', 'bx'], return_groups=False)
+    assert spans(result) == [[(0, 1, 3, 'ab')]]
+
+
+def test_ignore_case():
+    chunks = ['GET /Index, get /', 'home']
+    expected = [[(0, 0, 10, 'GET /Index')], [(0, 12, 21, 'get /home')]]
+    assert spans(finditer_stream(r'get /[a-z]+', chunks, False, ignore_case=1)) == expected
+    assert spans(finditer_stream(compile(r'get /[a-z]+', 1), chunks, False)) == expected
+    assert spans(finditer_stream(r'get /[a-z]+', chunks, False)) == [[(0, 12, 21, 'get /home')]]
+
+
+def test_is_lazy():
+    # an endless stream: the matches must come out while it is being read
+    chunks = itertools.cycle(['no match here, ', 'error 42, ', 'ok'])
+    first = itertools.islice(finditer_stream(r'error [0-9]+', chunks), 3)
+    assert [matches[0].match for matches in first] == ['error 42'] * 3
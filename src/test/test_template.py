@@ -0,0 +1,25 @@
+import pytest
+
+from regex.template import Template, group_names
+from regex.treeparser import Parser
+
+
+def test_group_names():
+    ast = Parser().parse('(a)(?:b)(?<name>c|d)')
+    assert group_names(ast) == {0: 'Group 0', 1: 'Group 1', 3: 'name'}
+
+
+def test_parse_template():
+    ast = Parser().parse('(a)(?:b)(?<name>c)')
+    template = Template(r'<\1\g<name>\g<0>\n\\\q>', ast)
+    assert template.parts == ['<', 1, 3, 0, '\n\\\\q>']
+    assert template.uses_groups
+    assert not Template(r'[\g<0>]', ast).uses_groups
+    # the group ids are made of ASCII digits only
+    assert Template('\\\u0663', ast).parts == ['\\\u0663']
+
+
+@pytest.mark.parametrize('repl', [r'\2', r'\0', '\\g<\u0663>', r'\g<other>', r'\g<name', 'a\\'])
+def test_invalid_template(repl):
+    with pytest.raises(Exception):
+        Template(repl, Parser().parse('(a)(?:b)(?<name>c)'))
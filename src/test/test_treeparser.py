@@ -0,0 +1,59 @@
+import logging
+import pytest
+
+from regex.treeparser import Parser
+from regex.engine import RegexEngine, compile, BACKTRACKING, AUTOMATON
+from regex.analyzer import check, render
+from regex.serialize import dumps, loads
+
+
+def test_parse_is_quiet_by_default(caplog):
+    caplog.set_level(logging.DEBUG)
+    Parser().parse(r'(a|b){1,9}[a-z]')
+    assert caplog.records == []
+
+
+def test_trace_mode(caplog):
+    caplog.set_level(logging.DEBUG)
+    Parser(trace=True).parse(r'(?<name>a)[^a-c]')
+    messages = [record.getMessage() for record in caplog.records]
+    assert "Parsing RE_SEQ..." in messages
+    assert "Named group detected: name" in messages
+    assert "Range detected: a-c" in messages
+    assert "Match intervals: [(97, 99)] with negative logic." in messages
+
+
+def test_spans():
+    re = r'^(?<x>a|b\.c)+[a-z]{2,3}x$'
+    ast = Parser().parse(re)
+    group = ast.child
+    assert ast.span == group.span == (0, len(re))
+    assert [re[slice(*child.span)] for child in group.children] == ['^', '(?<x>a|b\\.c)+', '[a-z]{2,3}', 'x', '$']
+    alternation = group.children[1]
+    assert [re[slice(*child.span)] for child in alternation.children] == ['a', 'b\\.c']
+
+
+def test_flat_alternation():
+    words = ['w{}x'.format(i) for i in range(5000)]
+    ast = Parser().parse('(' + '|'.join(words) + ')')
+    alternation = ast.child.children[0]
+    assert len(alternation.children) == 5000
+    assert all(branch.group_id == 1 and branch.is_capturing() for branch in alternation.children)
+    assert ast.groups_count == 2
+
+
+def test_deep_nesting():
+    re = '(' * 5000 + 'a' + ')' * 5000
+    pattern = compile(re)
+    assert pattern.ast.groups_count == 5001
+    reng = RegexEngine()
+    for engine in (BACKTRACKING, AUTOMATON):
+        res, consumed, matches = reng.match(pattern, 'xa', True, engine=engine)
+        assert (res, consumed) == (True, 2)
+        assert len(matches[0]) == 5001
+    assert reng.match('(' * 500 + 'a' + ')' * 500, 'xa') == (True, 2)
+    assert check(re).is_safe()
+    assert render(pattern.ast) == re
+    assert reng.match(loads(dumps([pattern]))[0], 'xa') == (True, 2)
+    with pytest.raises(Exception, match="Missing closing group parenthesis"):
+        Parser().parse('(' * 5000 + 'a' + ')' * 4999)
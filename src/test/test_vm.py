@@ -0,0 +1,134 @@
+import math
+import pytest
+
+from regex.engine import RegexEngine, BACKTRACKING, AUTOMATON, MatchLimits, MatchLimitExceeded
+from regex.treeparser import Parser
+from regex.nfa import compile_program
+from regex.vm import BacktrackingVM, StepCounters, KEPT_MEMO_SIZE
+
+
+def vm(re: str) -> BacktrackingVM:
+    return BacktrackingVM(compile_program(Parser().parse(re)))
+
+
+def test_search_slots():
+    assert vm('b+').search_slots('abbbc') == [1, 4]
+    assert vm('(a|ab)(c|bcd)').search_slots('abcd') == [0, 4, 0, 1, 1, 4]
+    assert vm('x').search_slots('abc') is None
+    assert vm('a*').search_slots('bbb', 3) == [3, 3]
+
+
+def test_leftmost_longest():
+    res, consumed, matches = vm('(a|ab)(c|bcd)(d*)').search('xabcd')
+    assert (res, consumed) == (True, 5)
+    assert [(m.group_id, m.match) for m in matches] == [(0, 'abcd'), (2, 'bcd'), (3, ''), (1, 'a')]
+
+
+@pytest.mark.parametrize("re, string", [
+    ('(a|b)*c', 'ab' * 50000 + 'c'),
+    ('(x+x+)+y', 'x' * 3000),
+    ('(a*)*b', 'a' * 3000),
+])
+def test_no_recursion_limit(re: str, string: str):
+    reng = RegexEngine()
+    assert reng.match(re, string, engine=BACKTRACKING) == reng.match(re, string, engine=AUTOMATON)
+
+
+def test_deep_nesting():
+    re = '(' * 60 + 'a' + ')' * 60 + 'b'
+    res, consumed, matches = RegexEngine().match(re, 'xab', return_matches=True)
+    assert (res, consumed) == (True, 3)
+    assert len(matches[0]) == 61
+
+
+@pytest.mark.parametrize("re, string", [
+    ('(ab|a)(bc|c)?', 'abc'),
+    ('^(a|b)+$', 'abab'),
+    ('(?<y>[0-9]{4})\\-(?<m>[0-9]{2})', 'on 2023-04-01'),
+    ('$', 'abc'),
+    ('a{2,3}', 'aaaaaaa'),
+])
+def test_same_as_automaton(re: str, string: str):
+    reng = RegexEngine()
+    for continue_after_match in (False, True):
+        expected = reng.match(re, string, True, continue_after_match, engine=AUTOMATON)
+        result = reng.match(re, string, True, continue_after_match, engine=BACKTRACKING)
+        assert result[:2] == expected[:2]
+        assert [[(m.group_id, m.start_idx, m.end_idx) for m in found] for found in result[2]] == \
+            [[(m.group_id, m.start_idx, m.end_idx) for m in found] for found in expected[2]]
+
+
+@pytest.mark.parametrize("re, string, expected", [
+    ('(a*)*b', 'a' * 300 + 'b', [0, 301]),
+    ('(a*)*b', 'c' * 300, None),
+    ('(x?)*y', 'x' * 200 + '!y', [201, 202]),
+    ('(a|aa)*c', 'a' * 300 + 'bc', [301, 302]),
+])
+def test_memo_window(monkeypatch, re: str, string: str, expected):
+    # the memo records only a few string indexes past the one tried
+    monkeypatch.setattr('regex.vm.MAX_MEMO_SIZE', 64)
+    machine = vm(re)
+    for _ in range(2):
+        slots = machine.search_slots(string)
+        assert (slots[:2] if slots else None) == expected
+
+
+def test_memo_size():
+    # the memo grows with the part of the string explored
+    machine = vm('.b')
+    assert machine.search_slots('ab' + 'x' * 100000) == [0, 2]
+    assert len(machine.__memos__[0].slots) <= 4 * len(machine.prog)
+    # and is trimmed when the search ends
+    machine = vm('[a-z]*[0-9]')
+    assert machine.search_slots('ab' * 20000) is None
+    assert len(machine.__memos__[0].slots) <= KEPT_MEMO_SIZE
+    assert machine.search_slots('ab' * 20000 + '1') == [0, 40001]
+
+
+def test_step_budget():
+    reng = RegexEngine()
+    string = 'ab' * 1000 + 'c'
+    assert reng.match('(a|b)*c', string, max_steps=100000) == (True, 2001)
+    with pytest.raises(MatchLimitExceeded) as e:
+        reng.match('(a|b)*c', string, max_steps=100)
+    assert e.value.steps == 101
+    # the budget is shared by all the searches of the call
+    with pytest.raises(MatchLimitExceeded):
+        reng.match('ab', string, continue_after_match=True, max_steps=1000)
+    # the automaton ignores the limits
+    assert reng.match('(a|b)*c', string, max_steps=100, engine=AUTOMATON) == (True, 2001)
+
+
+def test_timeout():
+    reng = RegexEngine()
+    with pytest.raises(MatchLimitExceeded) as e:
+        reng.match('(a|b)*c', 'ab' * 1000 + 'c', timeout=0)
+    assert e.value.steps > 0
+    assert reng.match('(x+x+)+y', 'x' * 50 + 'y', timeout=10) == (True, 51)
+
+
+def test_limits_of_the_ast_matcher():
+    # too large to be compiled, matched on the AST
+    reng = RegexEngine()
+    with pytest.raises(MatchLimitExceeded):
+        reng.match('(abc){1,9000}', 'abc' * 50, max_steps=20)
+    assert reng.match('(abc){1,9000}', 'abc' * 50, max_steps=100000) == (True, 150)
+
+
+def test_match_limits():
+    limits = MatchLimits(max_steps=10)
+    assert limits.next_check() == 11
+    assert limits.check(10) == 11
+    with pytest.raises(MatchLimitExceeded):
+        limits.check(11)
+    assert MatchLimits().next_check() == math.inf
+
+
+def test_counting_loop():
+    # the loop run without counters has no code counting the steps
+    assert 'step_counts' not in BacktrackingVM.__search_plain__.__code__.co_varnames
+    assert 'step_counts' in BacktrackingVM.__search_counting__.__code__.co_varnames
+    machine = vm('(a|b)*c')
+    counters = StepCounters(len(machine.prog))
+    assert machine.search_slots('abx abc', 0, None, counters)[:2] == machine.search_slots('abx abc')[:2] == [4, 7]
+    assert counters.retries == 5 and sum(counters.steps) > 0